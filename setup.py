@@ -62,6 +62,7 @@ setup(
         "psycopg2-binary>=2.9.9",
         "stripe>=5.0.0",
         "pinecone-client>=3.0.0",
+        "numpy>=1.26.0",
         "boto3>=1.34.0",
         "PyPDF2>=3.0.1",
         "pytesseract>=0.3.10",
@@ -88,6 +89,9 @@ setup(
             "mypy>=1.5.0",
             "isort>=5.12.0",
         ],
+        "local-vectors": [
+            "hnswlib>=0.8.0",
+        ],
         "docs": [
             "sphinx>=7.1.0",
             "sphinx-rtd-theme>=1.3.0",
@@ -2,12 +2,15 @@ import os
 import warnings
 
 # Standard library imports
+import concurrent.futures
 import json
 import logging
 import random
+import re
 import secrets
 import smtplib
 import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -19,16 +22,17 @@ import psycopg2
 import requests
 import stripe
 from dotenv import load_dotenv
-from flask import (Flask, flash, get_flashed_messages, jsonify, redirect,
-                   request, session, url_for)
+from flask import (Flask, Response, flash, get_flashed_messages, jsonify, redirect,
+                   request, send_file, session, stream_with_context, url_for)
 from flask_cors import CORS
 from openai import OpenAI
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from werkzeug.security import check_password_hash, generate_password_hash
 
 # Local imports
 # Removed: enhanced_matching_system (deprecated ML matching system)
 from core.payment import SubscriptionManager
+from pagination import decode_page_cursor, encode_page_cursor
 
 # Load environment variables
 load_dotenv()
@@ -102,6 +106,229 @@ def get_db_connection():
     return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
 
 
+# ============================================================================
+# PAGINATION HELPERS
+# ============================================================================
+
+def get_page_size(default: int = 25, maximum: int = 100) -> int:
+    """Read the per_page query parameter, clamped to [1, maximum]"""
+    per_page = request.args.get('per_page', default, type=int) or default
+    return max(1, min(per_page, maximum))
+
+
+# ============================================================================
+# ONE-TIME DATA BACKFILLS
+# ============================================================================
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def backfill_completed(cursor, name: str) -> bool:
+    """Whether a named backfill has already run to completion"""
+    cursor.execute('SELECT 1 FROM schema_backfills WHERE name = %s', (name,))
+    return cursor.fetchone() is not None
+
+
+def mark_backfill_completed(cursor, name: str):
+    """Record a backfill as done so it is skipped on later startups"""
+    cursor.execute('''
+        INSERT INTO schema_backfills (name) VALUES (%s)
+        ON CONFLICT (name) DO NOTHING
+    ''', (name,))
+
+
+def calculate_average_compatibility(compatibility_results: Dict) -> float:
+    """Average compatibility score across members - handles both old and new structures"""
+    scores = []
+    for m in compatibility_results.get('members', []):
+        if 'analysis' in m:
+            # New structure
+            scores.append(m.get('analysis', {}).get('compatibility_score', 0))
+        else:
+            # Old structure
+            scores.append(m.get('compatibility_score', 0))
+
+    try:
+        return sum(float(score or 0) for score in scores) / len(scores) if scores else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def applicant_match_rows(applicant_id: int, org_id: int, compatibility_results: Dict) -> List[tuple]:
+    """applicant_matches rows for one applicant's results (handles old and new result structures)"""
+    rows = []
+    for member_result in compatibility_results.get('members', []):
+        member_id = member_result.get('id')
+        if not member_id:
+            continue
+
+        analysis = member_result.get('analysis', member_result)
+        try:
+            score = float(analysis.get('compatibility_score', 0) or 0)
+        except (TypeError, ValueError):
+            score = 0
+
+        rows.append((
+            applicant_id, org_id, member_id, score,
+            analysis.get('summary', ''),
+            json.dumps(analysis.get('strengths', [])),
+            json.dumps(analysis.get('challenges', []))
+        ))
+    return rows
+
+
+def backfill_applicant_matches(cursor) -> Dict[str, int]:
+    """
+    Write applicant_matches rows for applicants created before the table existed
+
+    Applicants whose compatibility_results can't be parsed or written are
+    skipped one by one; matches with members who no longer exist are dropped.
+    """
+    counts = {'applicants': 0, 'matches': 0, 'skipped': 0}
+    last_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, organization_id, compatibility_results, created_at
+            FROM applicants
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        ''', (last_id, BACKFILL_BATCH_SIZE))
+        applicants = cursor.fetchall()
+        if not applicants:
+            return counts
+        last_id = applicants[-1]['id']
+
+        parsed = []
+        for applicant in applicants:
+            try:
+                results = json.loads(applicant['compatibility_results'] or '{}')
+                members = results.get('members', []) if isinstance(results, dict) else None
+                if not isinstance(members, list):
+                    raise ValueError('members is not a list')
+                rows = applicant_match_rows(applicant['id'], applicant['organization_id'], results)
+                rows = [(row[0], row[1], int(row[2])) + row[3:] + (applicant['created_at'],) for row in rows]
+            except (TypeError, ValueError, AttributeError):
+                counts['skipped'] += 1
+                continue
+            parsed.append(rows)
+
+        member_ids = list({row[2] for rows in parsed for row in rows})
+        cursor.execute('SELECT id FROM users WHERE id = ANY(%s)', (member_ids,))
+        existing = {row['id'] for row in cursor.fetchall()}
+
+        for rows in parsed:
+            rows = [row for row in rows if row[2] in existing]
+            if not rows:
+                continue
+            cursor.execute('SAVEPOINT backfill_applicant')
+            try:
+                execute_values(cursor, '''
+                    INSERT INTO applicant_matches (
+                        applicant_id, organization_id, member_id, score, summary,
+                        strengths_json, challenges_json, created_at
+                    )
+                    VALUES %s
+                    ON CONFLICT (applicant_id, member_id) DO NOTHING
+                ''', rows)
+                cursor.execute('RELEASE SAVEPOINT backfill_applicant')
+                counts['applicants'] += 1
+                counts['matches'] += len(rows)
+            except psycopg2.Error:
+                cursor.execute('ROLLBACK TO SAVEPOINT backfill_applicant')
+                counts['skipped'] += 1
+
+
+def backfill_applicant_avg_scores(cursor) -> int:
+    """
+    Set avg_score from compatibility_results for applicants that predate the column
+
+    Reads the stored results rather than applicant_matches, which lacks members
+    who have since left; unparseable results score 0.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, compatibility_results
+            FROM applicants
+            WHERE id > %s AND avg_score IS NULL
+            ORDER BY id
+            LIMIT %s
+        ''', (last_id, BACKFILL_BATCH_SIZE))
+        applicants = cursor.fetchall()
+        if not applicants:
+            return updated
+        last_id = applicants[-1]['id']
+
+        scores = []
+        for applicant in applicants:
+            try:
+                score = calculate_average_compatibility(json.loads(applicant['compatibility_results'] or '{}'))
+            except (TypeError, ValueError, AttributeError):
+                score = 0
+            scores.append((applicant['id'], score))
+
+        execute_values(cursor, '''
+            UPDATE applicants a SET avg_score = v.avg_score
+            FROM (VALUES %s) AS v(id, avg_score)
+            WHERE a.id = v.id
+        ''', scores, template='(%s, %s::real)')
+        updated += len(scores)
+
+
+# ============================================================================
+# BACKGROUND JOB HEARTBEATS
+# ============================================================================
+
+JOB_HEARTBEAT_SECONDS = 30
+STALE_JOB_SECONDS = 300  # a queued/running job silent this long lost its worker
+
+
+@contextmanager
+def job_heartbeat(job_id: str):
+    """Touch processing_jobs.heartbeat_at from a side thread while a background job runs"""
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                conn = get_db_connection()
+                try:
+                    conn.cursor().execute(
+                        'UPDATE processing_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE job_id = %s', (job_id,)
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"Heartbeat for job {job_id} failed: {e}")
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+
+
+def fail_stale_jobs(cursor, org_id: int, job_type: str) -> int:
+    """
+    Mark queued/running jobs whose worker stopped heartbeating as failed
+
+    Jobs run in daemon threads, so a restart or crash leaves them 'running'
+    forever; call this before checking whether a job is already in progress.
+    """
+    cursor.execute('''
+        UPDATE processing_jobs
+        SET status = 'failed', error_message = 'Worker stopped before the job finished',
+            completed_at = CURRENT_TIMESTAMP
+        WHERE organization_id = %s AND job_type = %s AND status IN ('queued', 'running')
+          AND COALESCE(heartbeat_at, started_at, created_at) < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+    ''', (org_id, job_type, STALE_JOB_SECONDS))
+    return cursor.rowcount
+
+
 # ============================================================================
 # USER AUTHENTICATION SYSTEM + ANONYMIZATION + COMPLIANCE
 # ============================================================================
@@ -661,6 +888,52 @@ class UserAuthSystem:
             )
         ''')
 
+        # Applicant matches - one row per applicant/member pair, denormalized from
+        # applicants.compatibility_results so dashboards can filter by member
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS applicant_matches (
+                id SERIAL PRIMARY KEY,
+                applicant_id INTEGER NOT NULL,
+                organization_id INTEGER NOT NULL,
+                member_id INTEGER NOT NULL,
+                score REAL DEFAULT 0,
+                summary TEXT,
+                strengths_json TEXT,
+                challenges_json TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (applicant_id) REFERENCES applicants (id) ON DELETE CASCADE,
+                FOREIGN KEY (organization_id) REFERENCES organizations (id) ON DELETE CASCADE,
+                FOREIGN KEY (member_id) REFERENCES users (id) ON DELETE CASCADE,
+                UNIQUE(applicant_id, member_id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicant_matches_org_member_score
+            ON applicant_matches(organization_id, member_id, score DESC, applicant_id DESC)
+        ''')
+
+        # Backfills that run once; completed ones are recorded here
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_backfills (
+                name TEXT PRIMARY KEY,
+                completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Backfill applicant_matches for applicants created before the table existed
+        if not backfill_completed(cursor, 'applicant_matches'):
+            cursor.execute('SAVEPOINT backfill_applicant_matches')
+            try:
+                counts = backfill_applicant_matches(cursor)
+                mark_backfill_completed(cursor, 'applicant_matches')
+                cursor.execute('RELEASE SAVEPOINT backfill_applicant_matches')
+                print(f"✓ Backfilled {counts['matches']} applicant matches "
+                      f"for {counts['applicants']} applicants ({counts['skipped']} skipped)")
+            except psycopg2.Error as e:
+                cursor.execute('ROLLBACK TO SAVEPOINT backfill_applicant_matches')
+                print(f"Applicant matches backfill skipped: {e}")
+
         # Migration: Add first_session_insights_json column to applicants table
         cursor.execute('''
             DO $$
@@ -675,6 +948,24 @@ class UserAuthSystem:
             END $$;
         ''')
 
+        # Applicants dashboard: precomputed average score plus indexes for each sort order
+        cursor.execute('ALTER TABLE applicants ADD COLUMN IF NOT EXISTS avg_score REAL')
+        backfill_applicant_avg_scores(cursor)
+        # Listings select avg_score raw so the score sort can use idx_applicants_org_score
+        cursor.execute('ALTER TABLE applicants ALTER COLUMN avg_score SET DEFAULT 0')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_org_created
+            ON applicants(organization_id, created_at DESC, id DESC)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_org_score
+            ON applicants(organization_id, avg_score DESC, id DESC)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_org_status
+            ON applicants(organization_id, status, created_at DESC, id DESC)
+        ''')
+
         # Events table - stores upcoming events for matching
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS events (
@@ -733,7 +1024,7 @@ class UserAuthSystem:
                 storage_url TEXT NOT NULL,
                 upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 uploaded_by INTEGER NOT NULL,
-                processing_status TEXT DEFAULT 'pending' CHECK (processing_status IN ('pending', 'processing', 'completed', 'failed')),
+                processing_status TEXT DEFAULT 'pending' CHECK (processing_status IN ('awaiting_upload', 'pending', 'processing', 'completed', 'failed')),
                 metadata_json TEXT,
                 is_deleted BOOLEAN DEFAULT FALSE,
                 deleted_at TIMESTAMP,
@@ -748,6 +1039,94 @@ class UserAuthSystem:
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(processing_status)
         ''')
+        # Keyset pagination of an org's documents, newest first
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_documents_org_upload
+            ON documents(organization_id, is_deleted, upload_date DESC, id DESC)
+        ''')
+
+        # Content hash of the uploaded bytes - identical re-uploads are skipped
+        cursor.execute('''
+            ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_org_content_hash
+            ON documents(organization_id, content_hash)
+            WHERE is_deleted = FALSE AND content_hash IS NOT NULL
+        ''')
+
+        # Chunk-index range of the document's vectors, so re-embedding removes dropped chunks
+        cursor.execute('''
+            ALTER TABLE documents ADD COLUMN IF NOT EXISTS vector_chunk_count INTEGER
+        ''')
+        # Set before a document's vectors are written; bulk re-embedding catches up on these
+        cursor.execute('''
+            ALTER TABLE documents ADD COLUMN IF NOT EXISTS vectors_updated_at TIMESTAMP
+        ''')
+        # Also set by the database when processing completes, since the processing
+        # tasks outside this app write live vectors without touching the column
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION set_vectors_updated_at() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.processing_status = 'completed' AND OLD.processing_status IS DISTINCT FROM 'completed' THEN
+                    NEW.vectors_updated_at := CURRENT_TIMESTAMP;
+                END IF;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql;
+        ''')
+        cursor.execute('''
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_documents_vectors_updated_at') THEN
+                    CREATE TRIGGER trg_documents_vectors_updated_at
+                    BEFORE UPDATE OF processing_status ON documents
+                    FOR EACH ROW EXECUTE FUNCTION set_vectors_updated_at();
+                END IF;
+            END $$;
+        ''')
+
+        # Direct-to-storage uploads create the document before its bytes arrive
+        cursor.execute('''
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                              WHERE conname = 'documents_processing_status_check'
+                              AND pg_get_constraintdef(oid) LIKE '%awaiting_upload%') THEN
+                    ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_processing_status_check;
+                    ALTER TABLE documents ADD CONSTRAINT documents_processing_status_check
+                        CHECK (processing_status IN ('awaiting_upload', 'pending', 'processing', 'completed', 'failed'));
+                END IF;
+            END $$;
+        ''')
+
+        # Upload intents - presigned uploads waiting for their completion call
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upload_intents (
+                id SERIAL PRIMARY KEY,
+                document_id INTEGER NOT NULL UNIQUE,
+                organization_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                storage_key TEXT NOT NULL,
+                multipart_upload_id TEXT,
+                expected_size BIGINT NOT NULL,
+                content_type TEXT NOT NULL,
+                expires_at TIMESTAMP NOT NULL,
+                completed_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE,
+                FOREIGN KEY (organization_id) REFERENCES organizations (id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_upload_intents_pending
+            ON upload_intents(organization_id, expires_at) WHERE completed_at IS NULL
+        ''')
+        # Client-declared hash, checked against the stored bytes after completion
+        cursor.execute('ALTER TABLE upload_intents ADD COLUMN IF NOT EXISTS declared_content_hash VARCHAR(64)')
+        cursor.execute('ALTER TABLE upload_intents ADD COLUMN IF NOT EXISTS abandoned_at TIMESTAMP')
+        # Claim taken by a completion in progress (see complete_upload_intent)
+        cursor.execute('ALTER TABLE upload_intents ADD COLUMN IF NOT EXISTS completing_at TIMESTAMP')
 
         # Document chunks - stores text chunks with embedding references
         cursor.execute('''
@@ -768,6 +1147,77 @@ class UserAuthSystem:
             CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON document_chunks(document_id)
         ''')
 
+        # Full-text search over chunks for lexical/hybrid search. The 'simple' config
+        # keeps identifiers and names intact (no stemming or stop words).
+        cursor.execute('''
+            ALTER TABLE document_chunks
+            ADD COLUMN IF NOT EXISTS chunk_tsv tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple', chunk_text)) STORED
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chunks_tsv ON document_chunks USING GIN (chunk_tsv)
+        ''')
+
+        # Per-chunk text hash so unchanged chunks of a re-uploaded document reuse their embedding
+        cursor.execute('''
+            ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)
+        ''')
+        # Hashed on insert by the database, so writers outside this app (processing
+        # tasks) never leave NULL hashes behind
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION set_chunk_content_hash() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' AND NEW.content_hash IS NOT NULL THEN
+                    RETURN NEW;
+                END IF;
+                NEW.content_hash := encode(sha256(convert_to(NEW.chunk_text, 'UTF8')), 'hex');
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql;
+        ''')
+        cursor.execute('''
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_chunks_content_hash') THEN
+                    CREATE TRIGGER trg_chunks_content_hash
+                    BEFORE INSERT OR UPDATE OF chunk_text ON document_chunks
+                    FOR EACH ROW EXECUTE FUNCTION set_chunk_content_hash();
+                END IF;
+            END $$;
+        ''')
+        if not backfill_completed(cursor, 'chunk_content_hash'):
+            cursor.execute('''
+                UPDATE document_chunks
+                SET content_hash = encode(sha256(convert_to(chunk_text, 'UTF8')), 'hex')
+                WHERE content_hash IS NULL
+            ''')
+            mark_backfill_completed(cursor, 'chunk_content_hash')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chunks_content_hash ON document_chunks(content_hash)
+        ''')
+
+        # Re-chunked text staged by a bulk re-embedding job until it swaps in
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS document_chunks_shadow (
+                id SERIAL PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                organization_id INTEGER NOT NULL,
+                document_id INTEGER NOT NULL,
+                chunk_text TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                token_count INTEGER,
+                embedding_id TEXT,
+                metadata_json TEXT,
+                content_hash VARCHAR(64),
+                FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chunks_shadow_job_doc ON document_chunks_shadow(job_id, document_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chunks_shadow_org ON document_chunks_shadow(organization_id)
+        ''')
+
         # Document classifications - auto-classification results
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS document_classifications (
@@ -863,6 +1313,61 @@ class UserAuthSystem:
         except psycopg2.Error as e:
             print(f"Migration note: {e}")
 
+        # Materialized smart-folder counts (see smart_folders.py). Triggers bump the
+        # org's version on any document or classification change; reads refresh
+        # the counts when version > refreshed_version.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS folder_counts (
+                organization_id INTEGER NOT NULL,
+                view_type TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                document_count INTEGER NOT NULL,
+                PRIMARY KEY (organization_id, view_type, folder),
+                FOREIGN KEY (organization_id) REFERENCES organizations (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS folder_count_state (
+                organization_id INTEGER PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                refreshed_version BIGINT,
+                refreshed_at TIMESTAMP,
+                FOREIGN KEY (organization_id) REFERENCES organizations (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION bump_folder_count_version() RETURNS trigger AS $$
+            DECLARE
+                org_id INTEGER;
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    org_id := OLD.organization_id;
+                ELSE
+                    org_id := NEW.organization_id;
+                END IF;
+                IF org_id IS NOT NULL THEN
+                    INSERT INTO folder_count_state (organization_id, version) VALUES (org_id, 1)
+                    ON CONFLICT (organization_id) DO UPDATE SET version = folder_count_state.version + 1;
+                END IF;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql;
+        ''')
+        cursor.execute('''
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_classifications_folder_counts') THEN
+                    CREATE TRIGGER trg_classifications_folder_counts
+                    AFTER INSERT OR UPDATE OR DELETE ON document_classifications
+                    FOR EACH ROW EXECUTE FUNCTION bump_folder_count_version();
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_documents_folder_counts') THEN
+                    CREATE TRIGGER trg_documents_folder_counts
+                    AFTER INSERT OR DELETE OR UPDATE OF is_deleted, organization_id ON documents
+                    FOR EACH ROW EXECUTE FUNCTION bump_folder_count_version();
+                END IF;
+            END $$;
+        ''')
+
         # Employee embeddings - for semantic search
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS employee_embeddings (
@@ -952,6 +1457,9 @@ class UserAuthSystem:
             )
         ''')
 
+        # Background jobs touch heartbeat_at while their worker is alive (see fail_stale_jobs)
+        cursor.execute('ALTER TABLE processing_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP')
+
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_jobs_job_id ON processing_jobs(job_id)
         ''')
@@ -977,6 +1485,16 @@ class UserAuthSystem:
             CREATE INDEX IF NOT EXISTS idx_embedding_usage_org_date ON embedding_usage(organization_id, date)
         ''')
 
+        # Query embedding cache hits (embedding calls avoided) per org and day
+        cursor.execute('ALTER TABLE embedding_usage ADD COLUMN IF NOT EXISTS cache_hits INTEGER DEFAULT 0')
+
+        # Per-organization vector layout (shortened / quantized embeddings, local store only)
+        cursor.execute('ALTER TABLE organizations ADD COLUMN IF NOT EXISTS vector_dimensions INTEGER')
+        cursor.execute("ALTER TABLE organizations ADD COLUMN IF NOT EXISTS vector_quantization TEXT DEFAULT 'float32'")
+        cursor.execute('ALTER TABLE organizations ADD COLUMN IF NOT EXISTS vector_rerank BOOLEAN DEFAULT FALSE')
+        # Re-rank keeps a float32 copy next to the compact matrix, so it is opt-in
+        cursor.execute('ALTER TABLE organizations ALTER COLUMN vector_rerank SET DEFAULT FALSE')
+
         # ============================================================================
         # SPRINT 2: Additional Performance Indexes
         # ============================================================================
@@ -990,6 +1508,22 @@ class UserAuthSystem:
             CREATE INDEX IF NOT EXISTS idx_employee_embeddings_updated ON employee_embeddings(last_updated)
         ''')
 
+        # Pending employee embedding refreshes (profile or membership changed), debounced
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS employee_embedding_refresh (
+                organization_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                force BOOLEAN DEFAULT FALSE,
+                requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (organization_id, user_id),
+                FOREIGN KEY (organization_id) REFERENCES organizations (id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_employee_refresh_requested ON employee_embedding_refresh(requested_at)
+        ''')
+
         # Chat conversations indexes
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_conversations_user ON chat_conversations(user_id)
@@ -1004,6 +1538,75 @@ class UserAuthSystem:
             CREATE INDEX IF NOT EXISTS idx_messages_conversation ON chat_messages(conversation_id)
         ''')
 
+        # Id-ordered reads of a conversation (history window, message pages)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON chat_messages(conversation_id, id)
+        ''')
+
+        # Rolling summary of the messages older than the verbatim history window
+        cursor.execute('''
+            ALTER TABLE chat_conversations ADD COLUMN IF NOT EXISTS history_summary TEXT
+        ''')
+        cursor.execute('''
+            ALTER TABLE chat_conversations ADD COLUMN IF NOT EXISTS summarized_through_message_id INTEGER DEFAULT 0
+        ''')
+        cursor.execute('''
+            ALTER TABLE chat_conversations ADD COLUMN IF NOT EXISTS summary_updated_at TIMESTAMP
+        ''')
+
+        # Denormalized list columns, kept current by the transactions that insert messages
+        cursor.execute('''
+            ALTER TABLE chat_conversations ADD COLUMN IF NOT EXISTS last_message_preview TEXT
+        ''')
+        cursor.execute('''
+            ALTER TABLE chat_conversations ADD COLUMN IF NOT EXISTS message_count INTEGER
+        ''')
+        cursor.execute('''
+            UPDATE chat_conversations cc
+            SET message_count = stats.message_count,
+                last_message_preview = stats.last_message_preview
+            FROM (
+                SELECT
+                    c.id,
+                    (SELECT COUNT(*) FROM chat_messages m WHERE m.conversation_id = c.id) AS message_count,
+                    (SELECT LEFT(m.content, 200) FROM chat_messages m
+                     WHERE m.conversation_id = c.id ORDER BY m.id DESC LIMIT 1) AS last_message_preview
+                FROM chat_conversations c
+                WHERE c.message_count IS NULL
+            ) stats
+            WHERE cc.id = stats.id
+        ''')
+        cursor.execute('''
+            ALTER TABLE chat_conversations ALTER COLUMN message_count SET DEFAULT 0
+        ''')
+
+        # The sidebar keyset (last_message_at, id) needs a value on every row:
+        # backfill legacy NULLs from the latest message, then forbid them
+        cursor.execute('''
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM information_schema.columns
+                          WHERE table_name = 'chat_conversations'
+                          AND column_name = 'last_message_at'
+                          AND is_nullable = 'YES') THEN
+                    UPDATE chat_conversations c
+                    SET last_message_at = COALESCE(
+                        (SELECT MAX(m.timestamp) FROM chat_messages m WHERE m.conversation_id = c.id),
+                        c.created_at,
+                        CURRENT_TIMESTAMP
+                    )
+                    WHERE c.last_message_at IS NULL;
+                    ALTER TABLE chat_conversations ALTER COLUMN last_message_at SET NOT NULL;
+                END IF;
+            END $$;
+        ''')
+
+        # Conversation sidebar: one index scan per page, newest first
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_conversations_list
+            ON chat_conversations(organization_id, user_id, is_archived, last_message_at DESC, id DESC)
+        ''')
+
         # Processing jobs indexes
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_jobs_org_status ON processing_jobs(organization_id, status)
@@ -1319,9 +1922,14 @@ class UserAuthSystem:
                 SET profile_completed = TRUE, profile_date = CURRENT_TIMESTAMP
                 WHERE id = %s
             ''', (user_id,))
+
+            # Re-embed the user in every organization if the profile changed
+            from employee_refresh import queue_employee_refresh
+            queue_employee_refresh(cursor, user_id=user_id)
             
             conn.commit()
             conn.close()
+            schedule_employee_refresh()
             print(f"✅ Profile saved successfully for user {user_id}")
             return True
             
@@ -6980,8 +7588,12 @@ def create_organization():
                 VALUES (%s, %s, 'owner')
             ''', (org_id, user_id))
 
+            from employee_refresh import queue_employee_refresh
+            queue_employee_refresh(cursor, user_id=user_id, org_id=org_id)
+
             conn.commit()
             conn.close()
+            schedule_employee_refresh()
 
             flash(f'Organization "{org_name}" created successfully!', 'success')
             return redirect(f'/organization/{org_id}')
@@ -7237,8 +7849,12 @@ def join_organization(invite_token):
             VALUES (%s, %s, 'member')
         ''', (org['id'], user_id))
 
+        from employee_refresh import queue_employee_refresh
+        queue_employee_refresh(cursor, user_id=user_id, org_id=org['id'])
+
         conn.commit()
         conn.close()
+        schedule_employee_refresh()
 
         # Clear pending invite from session
         session.pop('pending_org_invite', None)
@@ -7288,8 +7904,13 @@ def leave_organization(org_id):
             WHERE organization_id = %s AND user_id = %s
         ''', (org_id, user_id))
 
+        # Drops the user's vector from the organization's employee search
+        from employee_refresh import queue_employee_refresh
+        queue_employee_refresh(cursor, user_id=user_id, org_id=org_id)
+
         conn.commit()
         conn.close()
+        schedule_employee_refresh()
 
         flash('Successfully left the organization', 'success')
         return redirect('/dashboard')
@@ -7510,6 +8131,27 @@ def organization_embed_settings(org_id):
         return redirect('/dashboard')
 
 
+# Applicants dashboard sort orders: (ORDER BY, keyset condition, cursor fields).
+# Each is backed by one of the idx_applicants_org_* indexes.
+APPLICANT_SORT_ORDERS = {
+    'date': (
+        'created_at DESC, id DESC',
+        'AND (created_at, id) < (%s, %s)',
+        ('created_at', 'id')
+    ),
+    'score': (
+        'avg_score DESC, id DESC',
+        'AND (avg_score, id) < (%s::real, %s)',
+        ('avg_score', 'id')
+    ),
+    'status': (
+        'status ASC, created_at DESC, id DESC',
+        'AND (status > %s OR (status = %s AND (created_at, id) < (%s, %s)))',
+        ('status', 'created_at', 'id')
+    ),
+}
+
+
 @app.route('/organization/<int:org_id>/applicants')
 @login_required
 def organization_applicants(org_id):
@@ -7536,42 +8178,46 @@ def organization_applicants(org_id):
             flash('Organization not found or you do not have access', 'error')
             return redirect('/dashboard')
 
-        # Get all applicants for this organization
-        cursor.execute('''
-            SELECT
-                id, full_name, email, linkedin_url,
-                compatibility_results, behavioral_fit_analysis,
-                status, created_at, application_token
+        # One page of applicants - list projection only, the large JSON columns
+        # are loaded by view_applicant when an applicant is opened
+        sort = request.args.get('sort', 'date')
+        if sort not in APPLICANT_SORT_ORDERS:
+            sort = 'date'
+        order_by, keyset_clause, cursor_fields = APPLICANT_SORT_ORDERS[sort]
+
+        per_page = get_page_size()
+        after = decode_page_cursor(request.args.get('cursor'))
+        params = [org_id]
+        if after and len(after) == len(cursor_fields):
+            # The status order compares the status value twice
+            params.extend([after[0]] + after if sort == 'status' else after)
+        else:
+            keyset_clause = ''
+        params.append(per_page + 1)
+
+        cursor.execute(f'''
+            SELECT
+                id, full_name, email, linkedin_url,
+                status, created_at, avg_score
             FROM applicants
             WHERE organization_id = %s
-            ORDER BY created_at DESC
-        ''', (org_id,))
+            {keyset_clause}
+            ORDER BY {order_by}
+            LIMIT %s
+        ''', params)
 
         applicants = cursor.fetchall()
 
-        # Parse compatibility results for each applicant
-        for applicant in applicants:
-            if applicant['compatibility_results']:
-                try:
-                    applicant['compatibility_data'] = json.loads(applicant['compatibility_results'])
-                    # Calculate average score - handle both old and new structures
-                    scores = []
-                    for m in applicant['compatibility_data'].get('members', []):
-                        if 'analysis' in m:
-                            # New structure
-                            scores.append(m.get('analysis', {}).get('compatibility_score', 0))
-                        else:
-                            # Old structure
-                            scores.append(m.get('compatibility_score', 0))
-                    applicant['avg_score'] = sum(scores) / len(scores) if scores else 0
-                except:
-                    applicant['compatibility_data'] = {}
-                    applicant['avg_score'] = 0
+        next_cursor = None
+        if len(applicants) > per_page:
+            applicants = applicants[:per_page]
+            last = applicants[-1]
+            next_cursor = encode_page_cursor(*[last[field] for field in cursor_fields])
 
         conn.close()
 
         # Render applicants dashboard
-        content = render_applicants_dashboard(org, applicants, user_info)
+        content = render_applicants_dashboard(org, applicants, user_info, sort, next_cursor)
         return render_template_with_header(f"Applicants - {org['name']}", content, user_info)
 
     except Exception as e:
@@ -7717,95 +8363,86 @@ def organization_patients(org_id):
             flash('Organization not found or you do not have access', 'error')
             return redirect('/dashboard')
 
-        # Get all patients (applicants) for this organization with their match feedback
-        cursor.execute('''
+        # One page of this therapist's matched patients, best matches first, with feedback joined in
+        per_page = get_page_size()
+        after = decode_page_cursor(request.args.get('cursor'))
+        keyset_clause = ''
+        params = [org_id, user_id]
+        if after and len(after) == 2:
+            keyset_clause = 'AND (am.score, am.applicant_id) < (%s::real, %s)'
+            params.extend(after)
+        params.append(per_page + 1)
+
+        cursor.execute(f'''
             SELECT
                 a.id, a.full_name, a.email, a.linkedin_url,
-                a.compatibility_results, a.behavioral_fit_analysis,
                 a.status, a.created_at, a.application_token, a.onboarding_data,
-                a.first_session_insights_json
-            FROM applicants a
-            WHERE a.organization_id = %s
-            ORDER BY a.created_at DESC
-        ''', (org_id,))
-
-        all_patients = cursor.fetchall()
-
-        # Filter patients to only show those matched with the current therapist
-        patients = []
-        for patient in all_patients:
-            if patient['compatibility_results']:
-                try:
-                    patient['compatibility_data'] = json.loads(patient['compatibility_results'])
-
-                    # Find if this therapist is matched with this patient
-                    therapist_match = None
-                    for member in patient['compatibility_data'].get('members', []):
-                        member_id = member.get('id')
-                        if member_id == user_id:
-                            # This therapist is matched with this patient
-                            therapist_match = member
-
-                            # Get feedback
-                            cursor.execute('''
-                                SELECT feedback
-                                FROM match_feedback
-                                WHERE applicant_id = %s AND matched_member_id = %s AND organization_id = %s
-                            ''', (patient['id'], member_id, org_id))
-
-                            feedback_result = cursor.fetchone()
-                            member['feedback'] = feedback_result['feedback'] if feedback_result else None
-                            break
-
-                    # Only include this patient if they're matched with this therapist
-                    if therapist_match:
-                        # Extract match details
-                        if 'analysis' in therapist_match:
-                            patient['match_score'] = therapist_match.get('analysis', {}).get('compatibility_score', 0)
-                            patient['match_summary'] = therapist_match.get('analysis', {}).get('summary', '')
-                            patient['match_strengths'] = therapist_match.get('analysis', {}).get('strengths', [])
-                            patient['match_challenges'] = therapist_match.get('analysis', {}).get('challenges', [])
-                        else:
-                            patient['match_score'] = therapist_match.get('compatibility_score', 0)
-                            patient['match_summary'] = therapist_match.get('summary', '')
-                            patient['match_strengths'] = therapist_match.get('strengths', [])
-                            patient['match_challenges'] = therapist_match.get('challenges', [])
-
-                        patient['therapist_match'] = therapist_match
-
-                        # Load pre-generated first session insights from database
-                        if org.get('use_case') == 'therapy_matching':
-                            if patient.get('first_session_insights_json'):
-                                try:
-                                    insights_map = json.loads(patient['first_session_insights_json'])
-                                    patient['first_session_insights'] = insights_map.get(str(user_id), 'Insights not available for this match.')
-                                except:
-                                    patient['first_session_insights'] = 'Insights not available.'
-                            else:
-                                # Fallback: generate if not saved (for old records)
-                                cursor.execute('SELECT profile_data FROM user_profiles WHERE user_id = %s', (user_id,))
-                                profile_result = cursor.fetchone()
-                                therapist_profile = {}
-                                if profile_result and profile_result.get('profile_data'):
-                                    try:
-                                        therapist_profile = json.loads(profile_result['profile_data'])
-                                    except:
-                                        pass
-                                patient['first_session_insights'] = generate_first_session_insights(
-                                    patient, therapist_match, therapist_profile
-                                )
-
-                        patients.append(patient)
+                a.first_session_insights_json,
+                am.member_id, am.score, am.summary, am.strengths_json, am.challenges_json,
+                mf.feedback
+            FROM applicant_matches am
+            INNER JOIN applicants a ON a.id = am.applicant_id
+            LEFT JOIN match_feedback mf
+                ON mf.applicant_id = am.applicant_id
+                AND mf.matched_member_id = am.member_id
+                AND mf.organization_id = am.organization_id
+            WHERE am.organization_id = %s AND am.member_id = %s
+            {keyset_clause}
+            ORDER BY am.score DESC, am.applicant_id DESC
+            LIMIT %s
+        ''', params)
+
+        patients = cursor.fetchall()
+
+        next_cursor = None
+        if len(patients) > per_page:
+            patients = patients[:per_page]
+            next_cursor = encode_page_cursor(patients[-1]['score'], patients[-1]['id'])
+
+        therapist_profile = None
+        for patient in patients:
+            patient['match_score'] = patient['score'] or 0
+            patient['match_summary'] = patient['summary'] or ''
+            patient['match_strengths'] = json.loads(patient['strengths_json']) if patient['strengths_json'] else []
+            patient['match_challenges'] = json.loads(patient['challenges_json']) if patient['challenges_json'] else []
+            patient['therapist_match'] = {
+                'id': patient['member_id'],
+                'analysis': {
+                    'compatibility_score': patient['match_score'],
+                    'summary': patient['match_summary'],
+                    'strengths': patient['match_strengths'],
+                    'challenges': patient['match_challenges']
+                },
+                'feedback': patient['feedback']
+            }
 
-                except Exception as e:
-                    print(f"Error parsing patient compatibility data: {e}")
-                    import traceback
-                    traceback.print_exc()
+            # Load pre-generated first session insights from database
+            if org.get('use_case') == 'therapy_matching':
+                if patient.get('first_session_insights_json'):
+                    try:
+                        insights_map = json.loads(patient['first_session_insights_json'])
+                        patient['first_session_insights'] = insights_map.get(str(user_id), 'Insights not available for this match.')
+                    except:
+                        patient['first_session_insights'] = 'Insights not available.'
+                else:
+                    # Fallback: generate if not saved (for old records)
+                    if therapist_profile is None:
+                        cursor.execute('SELECT profile_data FROM user_profiles WHERE user_id = %s', (user_id,))
+                        profile_result = cursor.fetchone()
+                        therapist_profile = {}
+                        if profile_result and profile_result.get('profile_data'):
+                            try:
+                                therapist_profile = json.loads(profile_result['profile_data'])
+                            except:
+                                pass
+                    patient['first_session_insights'] = generate_first_session_insights(
+                        patient, patient['therapist_match'], therapist_profile
+                    )
 
         conn.close()
 
         # Render patients dashboard
-        content = render_patients_dashboard(org, patients, user_info, user_id)
+        content = render_patients_dashboard(org, patients, user_info, user_id, next_cursor)
         return render_template_with_header(f"Patients - {org['name']}", content, user_info)
 
     except Exception as e:
@@ -8212,6 +8849,14 @@ def embed_transcribe_audio(embed_token):
         }), 500
 
 
+# Shared pool for the independent post-match LLM stages of embed submissions
+# (behavioral fit analysis, first session insights)
+embed_llm_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('EMBED_LLM_WORKERS', 8)),
+    thread_name_prefix='embed-llm'
+)
+
+
 @app.route('/embed/<embed_token>/process', methods=['POST'])
 def embed_process(embed_token):
     """Process embed widget submission and return results"""
@@ -8339,26 +8984,40 @@ def embed_process(embed_token):
             WHERE id = %s
         ''', (json.dumps(results), session_id))
 
-        # Increment simulation count for all organization members
-        for member in members:
-            member_id = member.get('id')
-            if member_id:
-                cursor.execute('''
-                    UPDATE users
-                    SET free_matches_used = COALESCE(free_matches_used, 0) + 1,
-                        last_free_match_date = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                ''', (member_id,))
-                print(f"Incremented simulation count for user {member_id}")
+        # Increment simulation count for all organization members in one statement
+        updated_count = subscription_manager.increment_free_matches(
+            [member.get('id') for member in members], cursor=cursor
+        )
+        print(f"Incremented simulation count for {updated_count} members")
 
         # If in party mode (applicant assessment), also create an applicant record
         applicant_id = None
         if config['mode'] == 'party' and onboarding_data.get('full_name') and onboarding_data.get('email'):
-            # Generate behavioral fit analysis
-            behavioral_fit = generate_behavioral_fit_analysis(onboarding_data, results, members)
+            # Create applicant record first so each LLM stage can be persisted as it completes
+            application_token = secrets.token_urlsafe(32)
+            cursor.execute('''
+                INSERT INTO applicants (
+                    organization_id, embed_session_id, full_name, email, linkedin_url,
+                    application_token, onboarding_data, compatibility_results, avg_score
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            ''', (
+                config['org_id'], session_id, onboarding_data['full_name'],
+                onboarding_data['email'], onboarding_data.get('linkedin_url', ''),
+                application_token, json.dumps(onboarding_data), json.dumps(results),
+                calculate_average_compatibility(results)
+            ))
+            applicant_id = cursor.fetchone()['id']
+            save_applicant_matches(cursor, applicant_id, config['org_id'], results)
+            conn.commit()
+
+            # Behavioral fit and first session insights are independent - run them concurrently
+            stage_futures = {
+                embed_llm_executor.submit(generate_behavioral_fit_analysis, onboarding_data, results, members): 'behavioral_fit'
+            }
 
             # Generate first session insights for top 3 matches (if therapy matching)
-            first_session_insights = {}
             if config.get('use_case') == 'therapy_matching' and results.get('members'):
                 # Sort members by compatibility score
                 sorted_members = sorted(
@@ -8367,46 +9026,49 @@ def embed_process(embed_token):
                     reverse=True
                 )
 
-                # Generate insights for top 3
+                # Therapist profiles were already loaded with the member query above
+                profiles_by_member = {member['id']: member.get('profile_data') for member in members}
+                patient_data = {
+                    'full_name': onboarding_data.get('full_name'),
+                    'onboarding_data': onboarding_data
+                }
+
                 for member_result in sorted_members[:3]:
                     member_id = member_result.get('id')
                     if member_id:
-                        # Get therapist profile
-                        cursor.execute('SELECT profile_data FROM user_profiles WHERE user_id = %s', (member_id,))
-                        profile_result = cursor.fetchone()
                         therapist_profile = {}
-                        if profile_result and profile_result.get('profile_data'):
+                        if profiles_by_member.get(member_id):
                             try:
-                                therapist_profile = json.loads(profile_result['profile_data'])
+                                therapist_profile = json.loads(profiles_by_member[member_id])
                             except:
                                 pass
 
-                        # Generate insights
-                        patient_data = {
-                            'full_name': onboarding_data.get('full_name'),
-                            'onboarding_data': onboarding_data
-                        }
-                        insights = generate_first_session_insights(patient_data, member_result, therapist_profile)
-                        first_session_insights[str(member_id)] = insights
-                        print(f"Generated first session insights for therapist {member_id}")
+                        future = embed_llm_executor.submit(
+                            generate_first_session_insights, patient_data, member_result, therapist_profile
+                        )
+                        stage_futures[future] = str(member_id)
 
-            # Create applicant record
-            application_token = secrets.token_urlsafe(32)
-            cursor.execute('''
-                INSERT INTO applicants (
-                    organization_id, embed_session_id, full_name, email, linkedin_url,
-                    application_token, onboarding_data, compatibility_results, behavioral_fit_analysis,
-                    first_session_insights_json
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            ''', (
-                config['org_id'], session_id, onboarding_data['full_name'],
-                onboarding_data['email'], onboarding_data.get('linkedin_url', ''),
-                application_token, json.dumps(onboarding_data), json.dumps(results),
-                behavioral_fit, json.dumps(first_session_insights) if first_session_insights else None
-            ))
-            applicant_id = cursor.fetchone()['id']
+            # Persist each stage as soon as it completes
+            first_session_insights = {}
+            for future in concurrent.futures.as_completed(stage_futures):
+                stage = stage_futures[future]
+                try:
+                    output = future.result()
+                except Exception as e:
+                    print(f"Error in embed LLM stage {stage}: {e}")
+                    continue
+
+                if stage == 'behavioral_fit':
+                    cursor.execute('''
+                        UPDATE applicants SET behavioral_fit_analysis = %s WHERE id = %s
+                    ''', (output, applicant_id))
+                else:
+                    first_session_insights[stage] = output
+                    cursor.execute('''
+                        UPDATE applicants SET first_session_insights_json = %s WHERE id = %s
+                    ''', (json.dumps(first_session_insights), applicant_id))
+                    print(f"Generated first session insights for therapist {stage}")
+                conn.commit()
 
         conn.commit()
         conn.close()
@@ -8425,6 +9087,27 @@ def embed_process(embed_token):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def save_applicant_matches(cursor, applicant_id: int, org_id: int, compatibility_results: Dict) -> int:
+    """Write one applicant_matches row per matched member (handles old and new result structures)"""
+    rows = applicant_match_rows(applicant_id, org_id, compatibility_results)
+
+    if rows:
+        execute_values(cursor, '''
+            INSERT INTO applicant_matches (
+                applicant_id, organization_id, member_id, score, summary,
+                strengths_json, challenges_json
+            )
+            VALUES %s
+            ON CONFLICT (applicant_id, member_id) DO UPDATE
+            SET score = EXCLUDED.score,
+                summary = EXCLUDED.summary,
+                strengths_json = EXCLUDED.strengths_json,
+                challenges_json = EXCLUDED.challenges_json
+        ''', rows)
+
+    return len(rows)
+
+
 def generate_behavioral_fit_analysis(user_data: Dict, compatibility_results: Dict, members: List[Dict]) -> str:
     """Generate comprehensive behavioral fit analysis for applicant"""
     client = OpenAI(api_key=API_KEY)
@@ -8848,13 +9531,14 @@ Return your analysis as JSON with this structure:
     return {'members': member_results}
 
 
-def render_applicants_dashboard(org: Dict, applicants: List[Dict], user_info: Dict) -> str:
-    """Render the applicants dashboard for an organization"""
+def render_applicants_dashboard(org: Dict, applicants: List[Dict], user_info: Dict,
+                                sort: str = 'date', next_cursor: Optional[str] = None) -> str:
+    """Render one page of the applicants dashboard for an organization"""
 
     applicants_html = ''
     if applicants:
         for applicant in applicants:
-            avg_score = applicant.get('avg_score', 0)
+            avg_score = applicant.get('avg_score') or 0
             status_color = {
                 'pending': '#fbbf24',
                 'reviewing': '#3b82f6',
@@ -8904,7 +9588,27 @@ def render_applicants_dashboard(org: Dict, applicants: List[Dict], user_info: Di
                 </div>
             </div>
             '''
-    else:
+    sort_links_html = ''
+    for sort_key, sort_label in [('date', 'Date'), ('score', 'Score'), ('status', 'Status')]:
+        is_active = sort_key == sort
+        sort_links_html += f'''
+            <a href="/organization/{org['id']}/applicants?sort={sort_key}"
+               style="padding: 0.375rem 0.875rem; border-radius: 8px; text-decoration: none; border: 1px solid {'black' if is_active else '#e5e7eb'}; background: {'black' if is_active else 'white'}; color: {'white' if is_active else 'black'};">
+                {sort_label}
+            </a>'''
+
+    next_page_html = ''
+    if next_cursor:
+        next_page_html = f'''
+        <div style="text-align: center; margin-top: 1rem;">
+            <a href="/organization/{org['id']}/applicants?sort={sort}&cursor={next_cursor}"
+               style="display: inline-block; padding: 0.75rem 1.5rem; background: white; border: 2px solid black; color: black; text-decoration: none; border-radius: 8px; font-family: 'Satoshi', sans-serif; font-weight: 600;">
+                More applicants →
+            </a>
+        </div>
+        '''
+
+    if not applicants:
         applicants_html = f'''
         <div style="text-align: center; padding: 4rem 2rem; background: #f9fafb; border-radius: 12px; border: 2px dashed #d1d5db;">
             <p style="font-family: 'Satoshi', sans-serif; font-size: 1.125rem; color: #6b7280; margin-bottom: 1rem;">
@@ -8939,14 +9643,21 @@ def render_applicants_dashboard(org: Dict, applicants: List[Dict], user_info: Di
             </div>
         </div>
 
+        <div style="display: flex; gap: 0.5rem; align-items: center; margin-bottom: 1.5rem; font-family: 'Satoshi', sans-serif; font-size: 0.875rem;">
+            <span style="color: #6b7280;">Sort by:</span>
+            {sort_links_html}
+        </div>
+
         {applicants_html}
+        {next_page_html}
     </div>
     '''
 
     return content
 
 
-def render_patients_dashboard(org: Dict, patients: List[Dict], user_info: Dict, current_user_id: int = None) -> str:
+def render_patients_dashboard(org: Dict, patients: List[Dict], user_info: Dict, current_user_id: int = None,
+                              next_cursor: Optional[str] = None) -> str:
     """Render the patients dashboard for therapy matching organizations with personalized insights"""
 
     # Ensure current_user_id is set
@@ -9046,6 +9757,16 @@ def render_patients_dashboard(org: Dict, patients: List[Dict], user_info: Dict,
         </div>
         '''
 
+    if next_cursor:
+        patients_html += f'''
+        <div style="text-align: center; margin-top: 1rem;">
+            <a href="/organization/{org['id']}/patients?cursor={next_cursor}"
+               style="display: inline-block; padding: 0.75rem 1.5rem; background: white; border: 2px solid black; color: black; text-decoration: none; border-radius: 8px; font-family: 'Satoshi', sans-serif; font-weight: 600;">
+                More patients →
+            </a>
+        </div>
+        '''
+
     content = f'''
     <div style="max-width: 1200px; margin: 0 auto; padding: 2rem;">
         <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 2rem;">
@@ -11275,6 +11996,9 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
             }}
         }}
 
+        // Query parameter that selects one folder in each smart-folder view
+        const KB_FOLDER_PARAMS = {{team: 'team', project: 'project', type: 'doc_type', date: 'time_period', person: 'person'}};
+
         // Knowledge Base Functions
         async function loadKBFolders() {{
             const viewType = document.getElementById('kbFolderView').value;
@@ -11282,6 +12006,7 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
             container.innerHTML = '<div style="text-align: center; padding: 3rem; color: #666;">Loading...</div>';
 
             try {{
+                // Folder names and counts only; documents are loaded when a folder is opened
                 const response = await fetch(`/api/folders/by-${{viewType}}?org_id=${{orgId}}`);
                 const data = await response.json();
 
@@ -11294,67 +12019,22 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
                 data.folders.forEach(folder => {{
                     const folderDiv = document.createElement('div');
                     folderDiv.style.marginBottom = '3rem';
+                    folderDiv.dataset.viewType = viewType;
+                    folderDiv.dataset.folder = folder.name;
                     folderDiv.innerHTML = `
                         <div onclick="toggleKBFolder(this)" style="display: flex; align-items: center; gap: 1rem; padding: 1rem; background: #f9f9f9; border-radius: 8px; cursor: pointer; transition: all 0.2s;">
                             <span style="font-size: 1.5rem;">📁</span>
                             <span style="font-size: 1.2rem; font-weight: 600; flex: 1;">${{folder.name || 'Uncategorized'}}</span>
                             <span style="background: #e0e0e0; padding: 0.25rem 0.75rem; border-radius: 12px; font-size: 0.85rem;">${{folder.document_count}} docs</span>
-                            <span style="font-size: 1.2rem; transition: transform 0.2s;">▼</span>
+                            <span style="font-size: 1.2rem; transition: transform 0.2s; transform: rotate(-90deg);">▼</span>
                         </div>
-                        <div class="kb-folder-docs" style="display: grid; grid-template-columns: repeat(auto-fill, minmax(280px, 1fr)); gap: 1.5rem; padding-left: 3rem; margin-top: 1rem;">
+                        <div class="kb-folder-docs" style="display: none; grid-template-columns: repeat(auto-fill, minmax(280px, 1fr)); gap: 1.5rem; padding-left: 3rem; margin-top: 1rem;">
+                        </div>
+                        <div class="kb-folder-more" style="display: none; padding-left: 3rem; margin-top: 1rem;">
+                            <button onclick="loadKBFolderPage(this.closest('[data-folder]'))" style="padding: 0.5rem 1.25rem; border: 1px solid #e0e0e0; background: white; border-radius: 8px; cursor: pointer;">Load more</button>
                         </div>
                     `;
                     container.appendChild(folderDiv);
-
-                    // Load documents for this folder
-                    const docsContainer = folderDiv.querySelector('.kb-folder-docs');
-                    if (folder.documents && folder.documents.length > 0) {{
-                        folder.documents.forEach(doc => {{
-                            const statusIcon = {{
-                                'pending': '⏳',
-                                'processing': '🔄',
-                                'completed': '✅',
-                                'failed': '❌'
-                            }}[doc.processing_status] || '📄';
-
-                            const docCard = document.createElement('div');
-                            docCard.style.cssText = 'background: white; border: 1px solid #e0e0e0; border-radius: 8px; padding: 1.5rem; cursor: pointer; transition: all 0.3s;';
-                            docCard.onmouseover = () => docCard.style.transform = 'translateY(-2px)';
-                            docCard.onmouseout = () => docCard.style.transform = 'translateY(0)';
-                            const fileSizeMB = doc.file_size ? (doc.file_size / (1024*1024)).toFixed(2) : '?';
-
-                            docCard.innerHTML = `
-                                <div style="position: relative;">
-                                    <button onclick="event.stopPropagation(); deleteDocument(${{doc.id}})" style="position: absolute; top: -0.5rem; right: -0.5rem; background: #ef4444; color: white; border: none; width: 24px; height: 24px; border-radius: 50%; cursor: pointer; font-size: 0.8rem; display: flex; align-items: center; justify-content: center; opacity: 0; transition: opacity 0.2s;" class="delete-doc-btn">×</button>
-                                    <div style="font-size: 2rem; margin-bottom: 0.5rem;">${{statusIcon}}</div>
-                                    <div style="font-weight: 600; margin-bottom: 0.5rem; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;" title="${{doc.filename}}">${{doc.filename}}</div>
-                                    <div style="font-size: 0.85rem; color: #666; display: flex; gap: 0.5rem; margin-bottom: 0.5rem;">
-                                        <span>${{doc.file_type ? doc.file_type.toUpperCase() : 'FILE'}}</span>
-                                        <span>${{fileSizeMB}} MB</span>
-                                    </div>
-                                    <div style="font-size: 0.85rem; color: #666;">
-                                        <span>${{new Date(doc.upload_date).toLocaleDateString()}}</span>
-                                    </div>
-                                </div>
-                            `;
-                            docCard.onclick = () => window.location.href = `/api/documents/${{doc.id}}/download`;
-
-                            // Show delete button on hover
-                            docCard.onmouseover = () => {{
-                                docCard.style.transform = 'translateY(-2px)';
-                                const deleteBtn = docCard.querySelector('.delete-doc-btn');
-                                if (deleteBtn) deleteBtn.style.opacity = '1';
-                            }};
-                            docCard.onmouseout = () => {{
-                                docCard.style.transform = 'translateY(0)';
-                                const deleteBtn = docCard.querySelector('.delete-doc-btn');
-                                if (deleteBtn) deleteBtn.style.opacity = '0';
-                            }};
-                            docsContainer.appendChild(docCard);
-                        }});
-                    }} else {{
-                        docsContainer.innerHTML = '<p style="padding: 1rem; color: #999;">No documents</p>';
-                    }}
                 }});
             }} catch (error) {{
                 console.error('Error loading folders:', error);
@@ -11362,6 +12042,77 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
             }}
         }}
 
+        // Append the next page of a folder's documents
+        async function loadKBFolderPage(folderDiv) {{
+            const docsContainer = folderDiv.querySelector('.kb-folder-docs');
+            const moreDiv = folderDiv.querySelector('.kb-folder-more');
+            const params = new URLSearchParams({{org_id: orgId, limit: 50}});
+            params.set(KB_FOLDER_PARAMS[folderDiv.dataset.viewType], folderDiv.dataset.folder);
+            if (folderDiv.dataset.nextCursor) {{
+                params.set('cursor', folderDiv.dataset.nextCursor);
+            }}
+
+            try {{
+                const response = await fetch(`/api/folders/by-${{folderDiv.dataset.viewType}}?${{params}}`);
+                const data = await response.json();
+                if (data.error) {{
+                    docsContainer.innerHTML = '<p style="padding: 1rem; color: #999;">Error loading documents</p>';
+                    return;
+                }}
+
+                if (!folderDiv.dataset.nextCursor && data.documents.length === 0) {{
+                    docsContainer.innerHTML = '<p style="padding: 1rem; color: #999;">No documents</p>';
+                }}
+
+                data.documents.forEach(doc => {{
+                    const statusIcon = {{
+                        'pending': '⏳',
+                        'processing': '🔄',
+                        'completed': '✅',
+                        'failed': '❌'
+                    }}[doc.processing_status] || '📄';
+
+                    const docCard = document.createElement('div');
+                    docCard.style.cssText = 'background: white; border: 1px solid #e0e0e0; border-radius: 8px; padding: 1.5rem; cursor: pointer; transition: all 0.3s;';
+                    const fileSizeMB = doc.file_size ? (doc.file_size / (1024*1024)).toFixed(2) : '?';
+
+                    docCard.innerHTML = `
+                        <div style="position: relative;">
+                            <button onclick="event.stopPropagation(); deleteDocument(${{doc.id}})" style="position: absolute; top: -0.5rem; right: -0.5rem; background: #ef4444; color: white; border: none; width: 24px; height: 24px; border-radius: 50%; cursor: pointer; font-size: 0.8rem; display: flex; align-items: center; justify-content: center; opacity: 0; transition: opacity 0.2s;" class="delete-doc-btn">×</button>
+                            <div style="font-size: 2rem; margin-bottom: 0.5rem;">${{statusIcon}}</div>
+                            <div style="font-weight: 600; margin-bottom: 0.5rem; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;" title="${{doc.filename}}">${{doc.filename}}</div>
+                            <div style="font-size: 0.85rem; color: #666; display: flex; gap: 0.5rem; margin-bottom: 0.5rem;">
+                                <span>${{doc.file_type ? doc.file_type.toUpperCase() : 'FILE'}}</span>
+                                <span>${{fileSizeMB}} MB</span>
+                            </div>
+                            <div style="font-size: 0.85rem; color: #666;">
+                                <span>${{new Date(doc.upload_date).toLocaleDateString()}}</span>
+                            </div>
+                        </div>
+                    `;
+                    docCard.onclick = () => window.location.href = `/api/documents/${{doc.id}}/download`;
+
+                    // Show delete button on hover
+                    docCard.onmouseover = () => {{
+                        docCard.style.transform = 'translateY(-2px)';
+                        const deleteBtn = docCard.querySelector('.delete-doc-btn');
+                        if (deleteBtn) deleteBtn.style.opacity = '1';
+                    }};
+                    docCard.onmouseout = () => {{
+                        docCard.style.transform = 'translateY(0)';
+                        const deleteBtn = docCard.querySelector('.delete-doc-btn');
+                        if (deleteBtn) deleteBtn.style.opacity = '0';
+                    }};
+                    docsContainer.appendChild(docCard);
+                }});
+
+                folderDiv.dataset.nextCursor = data.next_cursor || '';
+                moreDiv.style.display = data.next_cursor ? 'block' : 'none';
+            }} catch (error) {{
+                console.error('Error loading folder documents:', error);
+            }}
+        }}
+
         function toggleKBFolder(header) {{
             const folder = header.parentElement;
             const docs = folder.querySelector('.kb-folder-docs');
@@ -11370,8 +12121,15 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
             if (docs.style.display === 'none') {{
                 docs.style.display = 'grid';
                 arrow.style.transform = 'rotate(0deg)';
+                if (!folder.dataset.loaded) {{
+                    folder.dataset.loaded = '1';
+                    loadKBFolderPage(folder);
+                }} else if (folder.dataset.nextCursor) {{
+                    folder.querySelector('.kb-folder-more').style.display = 'block';
+                }}
             }} else {{
                 docs.style.display = 'none';
+                folder.querySelector('.kb-folder-more').style.display = 'none';
                 arrow.style.transform = 'rotate(-90deg)';
             }}
         }}
@@ -11546,6 +12304,7 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
         // Global chat state
         let currentConversationId = null;
         let conversations = [];
+        let conversationsCursor = null;
 
         // Switch between Documents and Chat views
         function switchKBView(view) {{
@@ -11584,16 +12343,36 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
             }}
         }}
 
-        // Load all conversations
+        // Load the first page of conversations
         async function loadConversations() {{
             try {{
                 const response = await fetch(`/api/chat/conversations?org_id=${{orgId}}`);
                 const data = await response.json();
                 conversations = data.conversations || [];
+                conversationsCursor = data.next_cursor;
+
+                renderConversationsList();
+            }} catch (error) {{
+                console.error('Error loading conversations:', error);
+            }}
+        }}
+
+        // Append the next page of conversations
+        async function loadMoreConversations(button) {{
+            button.disabled = true;
+            button.textContent = 'Loading...';
+
+            try {{
+                const response = await fetch(`/api/chat/conversations?org_id=${{orgId}}&cursor=${{encodeURIComponent(conversationsCursor)}}`);
+                const data = await response.json();
+                conversations = conversations.concat(data.conversations || []);
+                conversationsCursor = data.next_cursor;
 
                 renderConversationsList();
             }} catch (error) {{
                 console.error('Error loading conversations:', error);
+                button.disabled = false;
+                button.textContent = 'Load more';
             }}
         }}
 
@@ -11621,7 +12400,11 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
                         ${{conv.last_message_preview || 'No messages yet'}}
                     </div>
                 </div>
-            `).join('');
+            `).join('') + (conversationsCursor ? `
+                <div style="text-align: center; margin-top: 0.5rem;">
+                    <button class="btn btn-secondary" onclick="loadMoreConversations(this)">Load more</button>
+                </div>
+            ` : '');
         }}
 
         // Create new conversation
@@ -11661,14 +12444,46 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
                 const response = await fetch(`/api/chat/${{conversationId}}/messages`);
                 const data = await response.json();
 
-                renderMessages(data.messages || []);
+                renderMessages(data.messages || [], data.next_cursor);
             }} catch (error) {{
                 console.error('Error loading conversation:', error);
             }}
         }}
 
+        // Load the page of messages before the oldest one shown
+        async function loadEarlierMessages(button) {{
+            const conversationId = currentConversationId;
+            button.disabled = true;
+            button.textContent = 'Loading...';
+
+            try {{
+                const response = await fetch(`/api/chat/${{conversationId}}/messages?before=${{button.dataset.cursor}}`);
+                const data = await response.json();
+                if (conversationId !== currentConversationId) return;
+
+                const container = document.getElementById('messagesArea');
+                const previousHeight = container.scrollHeight;
+                button.remove();
+                container.insertAdjacentHTML('afterbegin', loadEarlierButton(data.next_cursor) + (data.messages || []).map(renderMessage).join(''));
+                // Keep the message that was on top in view
+                container.scrollTop += container.scrollHeight - previousHeight;
+            }} catch (error) {{
+                console.error('Error loading earlier messages:', error);
+                button.disabled = false;
+                button.textContent = 'Load earlier messages';
+            }}
+        }}
+
+        function loadEarlierButton(cursor) {{
+            return cursor ? `
+                <div style="text-align: center; margin-bottom: 1.5rem;">
+                    <button class="btn btn-secondary" data-cursor="${{cursor}}" onclick="loadEarlierMessages(this)">Load earlier messages</button>
+                </div>
+            ` : '';
+        }}
+
         // Render messages
-        function renderMessages(messages) {{
+        function renderMessages(messages, nextCursor) {{
             const container = document.getElementById('messagesArea');
 
             if (messages.length === 0) {{
@@ -11676,58 +12491,60 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
                 return;
             }}
 
-            container.innerHTML = messages.map(msg => {{
-                if (msg.role === 'user') {{
-                    return `
-                        <div class="message user-message" style="margin-bottom: 1.5rem;">
-                            <div style="background: #f0f0f0; padding: 1rem; border-radius: 8px; max-width: 70%; margin-left: auto;">
-                                ${{escapeHtml(msg.content)}}
-                            </div>
+            container.innerHTML = loadEarlierButton(nextCursor) + messages.map(renderMessage).join('');
+
+            // Scroll to bottom
+            container.scrollTop = container.scrollHeight;
+        }}
+
+        function renderMessage(msg) {{
+            if (msg.role === 'user') {{
+                return `
+                    <div class="message user-message" style="margin-bottom: 1.5rem;">
+                        <div style="background: #f0f0f0; padding: 1rem; border-radius: 8px; max-width: 70%; margin-left: auto;">
+                            ${{escapeHtml(msg.content)}}
                         </div>
-                    `;
-                }} else {{
-                    const reasoning = msg.reasoning && msg.reasoning.steps ? `
-                        <details style="margin-top: 1rem; font-size: 0.875rem; color: #666;">
-                            <summary style="cursor: pointer; font-weight: 600;"> How I figured this out</summary>
-                            <div style="margin-top: 0.5rem; padding: 0.75rem; background: #f8f9fa; border-radius: 6px;">
-                                ${{msg.reasoning.steps.map(step => `<div style="margin-bottom: 0.25rem;">✓ ${{step}}</div>`).join('')}}
-                            </div>
-                        </details>
-                    ` : '';
-
-                    const hasSources = msg.sources && (msg.sources.documents.length > 0 || msg.sources.employees.length > 0);
-                    const sources = hasSources ? `
-                        <details style="margin-top: 1rem; font-size: 0.875rem;">
-                            <summary style="cursor: pointer; font-weight: 600;"> Sources</summary>
-                            <div style="margin-top: 0.5rem; padding: 0.75rem; background: #fafafa; border-radius: 6px;">
-                                ${{msg.sources.documents.map(doc => `
-                                    <div style="margin-bottom: 0.5rem; padding: 0.5rem; border-left: 2px solid #ccc; padding-left: 0.75rem;">
-                                        <strong>${{doc.filename}}</strong> ${{doc.page ? `(page ${{doc.page}})` : ''}}
-                                    </div>
-                                `).join('')}}
-                                ${{msg.sources.employees.map(emp => `
-                                    <div style="margin-bottom: 0.5rem; padding: 0.5rem; border-left: 2px solid #ccc; padding-left: 0.75rem;">
-                                        <strong>${{emp.name}}</strong> - ${{emp.title}}
-                                    </div>
-                                `).join('')}}
-                            </div>
-                        </details>
-                    ` : '';
+                    </div>
+                `;
+            }} else {{
+                const reasoning = msg.reasoning && msg.reasoning.steps ? `
+                    <details style="margin-top: 1rem; font-size: 0.875rem; color: #666;">
+                        <summary style="cursor: pointer; font-weight: 600;"> How I figured this out</summary>
+                        <div style="margin-top: 0.5rem; padding: 0.75rem; background: #f8f9fa; border-radius: 6px;">
+                            ${{msg.reasoning.steps.map(step => `<div style="margin-bottom: 0.25rem;">✓ ${{step}}</div>`).join('')}}
+                        </div>
+                    </details>
+                ` : '';
 
-                    return `
-                        <div class="message assistant-message" style="margin-bottom: 1.5rem;">
-                            <div style="padding: 1rem; border-left: 3px solid black; max-width: 85%;">
-                                <div style="margin-bottom: 0.5rem;">${{escapeHtml(msg.content)}}</div>
-                                ${{reasoning}}
-                                ${{sources}}
-                            </div>
+                const hasSources = msg.sources && (msg.sources.documents.length > 0 || msg.sources.employees.length > 0);
+                const sources = hasSources ? `
+                    <details style="margin-top: 1rem; font-size: 0.875rem;">
+                        <summary style="cursor: pointer; font-weight: 600;"> Sources</summary>
+                        <div style="margin-top: 0.5rem; padding: 0.75rem; background: #fafafa; border-radius: 6px;">
+                            ${{msg.sources.documents.map(doc => `
+                                <div style="margin-bottom: 0.5rem; padding: 0.5rem; border-left: 2px solid #ccc; padding-left: 0.75rem;">
+                                    <strong>${{doc.filename}}</strong> ${{doc.page ? `(page ${{doc.page}})` : ''}}
+                                </div>
+                            `).join('')}}
+                            ${{msg.sources.employees.map(emp => `
+                                <div style="margin-bottom: 0.5rem; padding: 0.5rem; border-left: 2px solid #ccc; padding-left: 0.75rem;">
+                                    <strong>${{emp.name}}</strong> - ${{emp.title}}
+                                </div>
+                            `).join('')}}
                         </div>
-                    `;
-                }}
-            }}).join('');
+                    </details>
+                ` : '';
 
-            // Scroll to bottom
-            container.scrollTop = container.scrollHeight;
+                return `
+                    <div class="message assistant-message" style="margin-bottom: 1.5rem;">
+                        <div style="padding: 1rem; border-left: 3px solid black; max-width: 85%;">
+                            <div style="margin-bottom: 0.5rem;">${{escapeHtml(msg.content)}}</div>
+                            ${{reasoning}}
+                            ${{sources}}
+                        </div>
+                    </div>
+                `;
+            }}
         }}
 
         // Send message
@@ -11771,6 +12588,12 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
             input.value = '';
 
             try {{
+                if (useRag) {{
+                    await streamChatAnswer(message, messagesArea);
+                    await loadConversations();
+                    return;
+                }}
+
                 const response = await fetch(`/api/chat/${{currentConversationId}}/messages`, {{
                     method: 'POST',
                     headers: {{ 'Content-Type': 'application/json' }},
@@ -11844,6 +12667,82 @@ def render_organization_view(org_info: Dict, members: List[Dict], simulations: L
             }}
         }}
 
+        // Stream a RAG answer: sources arrive first, then the answer token by token
+        async function streamChatAnswer(message, messagesArea) {{
+            const response = await fetch(`/api/chat/${{currentConversationId}}/messages/stream`, {{
+                method: 'POST',
+                headers: {{ 'Content-Type': 'application/json' }},
+                body: JSON.stringify({{ message: message }})
+            }});
+
+            if (!response.ok) {{
+                const data = await response.json();
+                throw new Error(data.error || 'Failed to send message');
+            }}
+
+            const messageDiv = document.createElement('div');
+            messageDiv.className = 'message assistant-message';
+            messageDiv.style.marginBottom = '1.5rem';
+            messageDiv.innerHTML = `
+                <div style="padding: 1rem; border-left: 3px solid black; max-width: 85%;">
+                    <div class="answer-text" style="white-space: pre-wrap;"></div>
+                    <div class="answer-sources"></div>
+                </div>
+            `;
+            messagesArea.appendChild(messageDiv);
+            const answerText = messageDiv.querySelector('.answer-text');
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {{
+                const {{ value, done }} = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, {{ stream: true }});
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {{
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let eventType = 'message';
+                    let payload = '';
+                    frame.split('\\n').forEach(line => {{
+                        if (line.startsWith('event: ')) eventType = line.slice(7);
+                        else if (line.startsWith('data: ')) payload += line.slice(6);
+                    }});
+                    const data = payload ? JSON.parse(payload) : {{}};
+
+                    if (eventType === 'sources' && (data.documents.length > 0 || data.employees.length > 0)) {{
+                        messageDiv.querySelector('.answer-sources').innerHTML = `
+                            <details style="margin-top: 1rem; font-size: 0.875rem;">
+                                <summary style="cursor: pointer; font-weight: 600;"> Sources</summary>
+                                <div style="margin-top: 0.5rem; padding: 0.75rem; background: #fafafa; border-radius: 6px;">
+                                    ${{data.documents.map(doc => `
+                                        <div style="margin-bottom: 0.5rem; padding: 0.5rem; border-left: 2px solid #ccc; padding-left: 0.75rem;">
+                                            <strong>${{escapeHtml(doc.filename)}}</strong> ${{doc.page ? `(page ${{doc.page}})` : ''}}
+                                        </div>
+                                    `).join('')}}
+                                    ${{data.employees.map(emp => `
+                                        <div style="margin-bottom: 0.5rem; padding: 0.5rem; border-left: 2px solid #ccc; padding-left: 0.75rem;">
+                                            <strong>${{escapeHtml(emp.name || '')}}</strong> - ${{escapeHtml(emp.title || '')}}
+                                        </div>
+                                    `).join('')}}
+                                </div>
+                            </details>
+                        `;
+                    }} else if (eventType === 'token') {{
+                        answerText.textContent += data.text;
+                        messagesArea.scrollTop = messagesArea.scrollHeight;
+                    }} else if (eventType === 'error') {{
+                        throw new Error(data.error);
+                    }}
+                }}
+            }}
+        }}
+
         // Example question shortcuts
         function askExample(question) {{
             document.getElementById('messageInput').value = question;
@@ -16509,6 +17408,8 @@ def secure_stripe_webhook():
 @login_required
 def organization_documents(org_id):
     """Documents page for non-therapy organizations"""
+    from document_listing import list_documents_page
+
     user_id = session['user_id']
     user_info = user_auth.get_user_info(user_id)
 
@@ -16537,20 +17438,13 @@ def organization_documents(org_id):
 
         org_name = membership['name']
 
-        # Get all documents for this org
-        cursor.execute('''
-            SELECT d.*, u.first_name, u.last_name
-            FROM documents d
-            JOIN users u ON d.uploaded_by = u.id
-            WHERE d.organization_id = %s AND d.is_deleted = FALSE
-            ORDER BY d.upload_date DESC
-        ''', (org_id,))
-
-        documents = cursor.fetchall()
+        # First page only; the rest is fetched from /api/documents on demand
+        page = list_documents_page(cursor, org_id, fields=DOCUMENT_CARD_FIELDS,
+                                   decrypt=data_encryption.decrypt_sensitive_data)
         conn.close()
 
         # Render documents page
-        content = render_documents_page(org_id, org_name, documents, user_info)
+        content = render_documents_page(org_id, org_name, page['documents'], user_info, page['next_cursor'])
         return render_template_with_header(f"{org_name} - Documents", content, user_info)
 
     except Exception as e:
@@ -16561,8 +17455,13 @@ def organization_documents(org_id):
         return redirect(f'/organization/{org_id}')
 
 
-def render_documents_page(org_id: int, org_name: str, documents: List[Dict], user_info: Dict) -> str:
-    """Render the documents management page"""
+# Fields rendered on a documents page card
+DOCUMENT_CARD_FIELDS = ['id', 'filename', 'file_type', 'file_size', 'upload_date', 'uploaded_by', 'processing_status']
+
+
+def render_documents_page(org_id: int, org_name: str, documents: List[Dict], user_info: Dict,
+                          next_cursor: Optional[str] = None) -> str:
+    """Render the documents management page with its first page of documents"""
 
     # Build documents HTML
     docs_html = ''
@@ -16575,8 +17474,8 @@ def render_documents_page(org_id: int, org_name: str, documents: List[Dict], use
                 'failed': '❌'
             }.get(doc['processing_status'], '❓')
 
-            file_size_mb = doc['file_size'] / (1024 * 1024)
-            upload_date = doc['upload_date'].strftime('%b %d, %Y %I:%M %p') if doc['upload_date'] else 'Unknown'
+            file_size_mb = (doc['file_size'] or 0) / (1024 * 1024)
+            upload_date = datetime.fromisoformat(doc['upload_date']).strftime('%b %d, %Y %I:%M %p') if doc['upload_date'] else 'Unknown'
 
             docs_html += f'''
                 <div class="doc-card">
@@ -16587,7 +17486,7 @@ def render_documents_page(org_id: int, org_name: str, documents: List[Dict], use
                     <div class="doc-meta">
                         <span>{doc['file_type'].upper()}</span>
                         <span>{file_size_mb:.2f} MB</span>
-                        <span>{doc['first_name']} {doc['last_name']}</span>
+                        <span>{doc['uploaded_by']}</span>
                     </div>
                     <div class="doc-date">{upload_date}</div>
                     <div class="doc-status">{doc['processing_status'].title()}</div>
@@ -16713,6 +17612,21 @@ def render_documents_page(org_id: int, org_name: str, documents: List[Dict], use
         .back-link:hover {{
             color: #000;
         }}
+        .load-more {{
+            text-align: center;
+            margin-top: 2rem;
+        }}
+        .load-more-btn {{
+            background: white;
+            border: 1px solid #e0e0e0;
+            padding: 0.75rem 2rem;
+            border-radius: 8px;
+            font-size: 1rem;
+            cursor: pointer;
+        }}
+        .load-more-btn:hover {{
+            border-color: #000;
+        }}
         #uploadProgress {{
             margin-top: 1rem;
             display: none;
@@ -16759,9 +17673,12 @@ def render_documents_page(org_id: int, org_name: str, documents: List[Dict], use
             </div>
         </div>
 
-        <div class="docs-grid">
+        <div class="docs-grid" id="docsGrid">
             {docs_html}
         </div>
+        <div class="load-more" id="loadMore" style="display: {'block' if next_cursor else 'none'};">
+            <button class="load-more-btn" type="button" onclick="loadMoreDocuments()">Load more</button>
+        </div>
     </div>
 
     <script>
@@ -16834,22 +17751,78 @@ def render_documents_page(org_id: int, org_name: str, documents: List[Dict], use
 
         console.log('Event listener attached to file input');
 
-        // Drag and drop support
-        const uploadSection = document.querySelector('.upload-section');
+        // Later pages of documents, rendered like the server-side cards
+        let nextCursor = {json.dumps(next_cursor)};
 
-        uploadSection.addEventListener('dragover', (e) => {{
-            e.preventDefault();
-            uploadSection.style.borderColor = '#000';
-            uploadSection.style.background = '#f9f9f9';
-        }});
+        async function loadMoreDocuments() {{
+            if (!nextCursor) return;
+            const params = new URLSearchParams({{
+                org_id: '{org_id}',
+                cursor: nextCursor,
+                fields: '{','.join(DOCUMENT_CARD_FIELDS)}'
+            }});
 
-        uploadSection.addEventListener('dragleave', () => {{
-            uploadSection.style.borderColor = '#ccc';
-            uploadSection.style.background = 'white';
-        }});
+            try {{
+                const response = await fetch(`/api/documents?${{params}}`);
+                const data = await response.json();
+                if (data.error) {{
+                    console.error('Error loading documents:', data.error);
+                    return;
+                }}
 
-        uploadSection.addEventListener('drop', (e) => {{
-            e.preventDefault();
+                const grid = document.getElementById('docsGrid');
+                data.documents.forEach(doc => {{
+                    const statusIcon = {{
+                        'pending': '⏳',
+                        'processing': '🔄',
+                        'completed': '✅',
+                        'failed': '❌'
+                    }}[doc.processing_status] || '❓';
+                    const fileSizeMB = ((doc.file_size || 0) / (1024 * 1024)).toFixed(2);
+                    const uploadDate = doc.upload_date ? new Date(doc.upload_date).toLocaleString() : 'Unknown';
+                    const status = doc.processing_status ? doc.processing_status.charAt(0).toUpperCase() + doc.processing_status.slice(1) : '';
+
+                    const card = document.createElement('div');
+                    card.className = 'doc-card';
+                    card.innerHTML = `
+                        <div class="doc-header">
+                            <span class="doc-icon">${{statusIcon}}</span>
+                            <span class="doc-filename">${{doc.filename}}</span>
+                        </div>
+                        <div class="doc-meta">
+                            <span>${{(doc.file_type || '').toUpperCase()}}</span>
+                            <span>${{fileSizeMB}} MB</span>
+                            <span>${{doc.uploaded_by}}</span>
+                        </div>
+                        <div class="doc-date">${{uploadDate}}</div>
+                        <div class="doc-status">${{status}}</div>
+                    `;
+                    grid.appendChild(card);
+                }});
+
+                nextCursor = data.next_cursor;
+                document.getElementById('loadMore').style.display = nextCursor ? 'block' : 'none';
+            }} catch (error) {{
+                console.error('Error loading documents:', error);
+            }}
+        }}
+
+        // Drag and drop support
+        const uploadSection = document.querySelector('.upload-section');
+
+        uploadSection.addEventListener('dragover', (e) => {{
+            e.preventDefault();
+            uploadSection.style.borderColor = '#000';
+            uploadSection.style.background = '#f9f9f9';
+        }});
+
+        uploadSection.addEventListener('dragleave', () => {{
+            uploadSection.style.borderColor = '#ccc';
+            uploadSection.style.background = 'white';
+        }});
+
+        uploadSection.addEventListener('drop', (e) => {{
+            e.preventDefault();
             uploadSection.style.borderColor = '#ccc';
             uploadSection.style.background = 'white';
 
@@ -16878,7 +17851,8 @@ def upload_documents():
     Upload multiple documents to organization knowledge base
     Max 10 files, 50MB each, supports: PDF, DOCX, TXT, MD, CSV
     """
-    from storage_manager import StorageManager
+    from document_dedup import find_duplicate_document, hash_stream
+    from object_storage import create_storage
     from tasks import process_document_task
     import secrets
 
@@ -16923,9 +17897,9 @@ def upload_documents():
         conn.close()
         return jsonify({'error': 'Maximum 10 files allowed per upload'}), 400
 
-    # Initialize storage manager
+    # Initialize storage (the processing task reads the stored file, so S3 only)
     try:
-        storage = StorageManager()
+        storage = create_storage(shared=True)
     except Exception as e:
         conn.close()
         return jsonify({
@@ -16934,6 +17908,7 @@ def upload_documents():
         }), 500
 
     uploaded_documents = []
+    duplicate_documents = []
     failed_files = []
 
     for file in files:
@@ -16945,20 +17920,52 @@ def upload_documents():
                 failed_files.append({'filename': file.filename, 'error': error_msg})
                 continue
 
-            # Get actual file size by seeking to end
-            file.seek(0, 2)  # Seek to end of file
-            file_size = file.tell()
-            file.seek(0)  # Reset to beginning
+            # Size and content hash in one pass over the upload
+            content_hash, file_size = hash_stream(file.stream)
+
+            # Identical content already in the org - no storage, OCR or embedding work
+            existing = find_duplicate_document(cursor, org_id, content_hash)
+            if existing and existing['processing_status'] == 'failed':
+                # Let a failed document be retried by uploading it again
+                cursor.execute('''
+                    UPDATE documents SET is_deleted = TRUE, deleted_at = CURRENT_TIMESTAMP WHERE id = %s
+                ''', (existing['id'],))
+                conn.commit()
+                existing = None
+
+            if existing:
+                duplicate_documents.append({
+                    'doc_id': existing['id'],
+                    'filename': file.filename,
+                    'existing_filename': existing['filename'],
+                    'status': existing['processing_status']
+                })
+                continue
 
-            # Create document record
+            # Create document record (a concurrent upload of the same content wins the unique index)
             cursor.execute('''
-                INSERT INTO documents (organization_id, filename, file_type, file_size, uploaded_by, storage_url, processing_status)
-                VALUES (%s, %s, %s, %s, %s, %s, 'pending')
+                INSERT INTO documents (organization_id, filename, file_type, file_size, uploaded_by,
+                                       storage_url, processing_status, content_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, 'pending', %s)
+                ON CONFLICT (organization_id, content_hash)
+                    WHERE is_deleted = FALSE AND content_hash IS NOT NULL
+                DO NOTHING
                 RETURNING id
-            ''', (org_id, file.filename, file_type, file_size, user_id, 'pending'))
+            ''', (org_id, file.filename, file_type, file_size, user_id, 'pending', content_hash))
 
-            doc_id = cursor.fetchone()['id']
+            inserted = cursor.fetchone()
             conn.commit()
+            if not inserted:
+                existing = find_duplicate_document(cursor, org_id, content_hash)
+                duplicate_documents.append({
+                    'doc_id': existing['id'] if existing else None,
+                    'filename': file.filename,
+                    'existing_filename': existing['filename'] if existing else None,
+                    'status': existing['processing_status'] if existing else 'pending'
+                })
+                continue
+
+            doc_id = inserted['id']
 
             # Upload to DigitalOcean Spaces
             storage_url = storage.upload_file(file, org_id, doc_id, file.filename)
@@ -17004,18 +18011,628 @@ def upload_documents():
 
     conn.close()
 
+    if uploaded_documents:
+        invalidate_search_cache(org_id)
+
+    message = f'{len(uploaded_documents)} files uploaded successfully'
+    if duplicate_documents:
+        message += f', {len(duplicate_documents)} already in the knowledge base'
+
     return jsonify({
-        'success': len(uploaded_documents) > 0,
+        'success': len(uploaded_documents) + len(duplicate_documents) > 0,
         'uploaded': uploaded_documents,
+        'duplicates': duplicate_documents,
         'failed': failed_files,
-        'message': f'{len(uploaded_documents)} files uploaded successfully'
+        'message': message
+    })
+
+
+@app.route('/api/documents/upload/stream', methods=['POST'])
+@login_required
+def upload_documents_stream():
+    """
+    Streaming variant of upload_documents for large batches
+
+    The multipart body is parsed incrementally: each file is sized, hashed and
+    type-sniffed while it is written to object storage as a multipart upload,
+    so nothing is spooled to disk. org_id is passed in the query string so
+    access is checked before the body is read. All document rows and jobs of
+    the batch are written in one transaction.
+    """
+    from document_dedup import find_duplicate_document
+    from object_storage import create_storage
+    from streaming_upload import stream_multipart_files
+    from tasks import process_document_task
+    from werkzeug.utils import secure_filename
+
+    user_id = session['user_id']
+
+    try:
+        org_id = int(request.args.get('org_id', ''))
+    except ValueError:
+        return jsonify({'error': 'organization_id required'}), 400
+
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({'error': 'Expected a multipart/form-data body'}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT o.use_case FROM organization_members om
+        JOIN organizations o ON om.organization_id = o.id
+        WHERE om.organization_id = %s AND om.user_id = %s AND om.is_active = TRUE
+    ''', (org_id, user_id))
+    membership = cursor.fetchone()
+
+    if not membership:
+        conn.close()
+        return jsonify({'error': 'Not a member of this organization'}), 403
+
+    if membership['use_case'] == 'therapy_matching':
+        conn.close()
+        return jsonify({'error': 'Document upload not available for therapy organizations'}), 403
+
+    try:
+        storage = create_storage(shared=True)
+    except Exception as e:
+        conn.close()
+        return jsonify({
+            'error': f'Storage configuration error: {str(e)}',
+            'message': 'Please configure DigitalOcean Spaces credentials in .env file'
+        }), 500
+
+    batch_token = secrets.token_hex(8)
+    opened_writers = []
+
+    def open_writer(filename, content_type):
+        # Indexed per file: two parts with the same filename must not share an object
+        key = f"documents/org_{org_id}/{batch_token}/{len(opened_writers)}_{secure_filename(filename) or 'upload'}"
+        opened_writers.append(key)
+        return storage.open_writer(key, content_type)
+
+    # The connection sits idle while the body streams; nothing is held open in a transaction
+    streamed_files, failed_files = stream_multipart_files(request.stream, boundary, open_writer)
+
+    # Same content twice in one batch: keep the first copy
+    new_files, duplicate_documents, seen_hashes = [], [], set()
+    for f in streamed_files:
+        if f['content_hash'] in seen_hashes:
+            storage.delete(f['storage_key'])
+            duplicate_documents.append({'doc_id': None, 'filename': f['filename'], 'status': 'pending'})
+            continue
+        seen_hashes.add(f['content_hash'])
+        new_files.append(f)
+
+    uploaded_documents = []
+    try:
+        if new_files:
+            # Failed documents with the same content are replaced rather than reported as duplicates
+            cursor.execute('''
+                UPDATE documents SET is_deleted = TRUE, deleted_at = CURRENT_TIMESTAMP
+                WHERE organization_id = %s AND content_hash = ANY(%s)
+                  AND processing_status = 'failed' AND is_deleted = FALSE
+            ''', (org_id, [f['content_hash'] for f in new_files]))
+
+            inserted = execute_values(cursor, '''
+                INSERT INTO documents (organization_id, filename, file_type, file_size, uploaded_by,
+                                       storage_url, processing_status, content_hash)
+                VALUES %s
+                ON CONFLICT (organization_id, content_hash)
+                    WHERE is_deleted = FALSE AND content_hash IS NOT NULL
+                DO NOTHING
+                RETURNING id, content_hash
+            ''', [
+                (org_id, f['filename'], f['file_type'], f['file_size'], user_id,
+                 f['storage_url'], 'pending', f['content_hash'])
+                for f in new_files
+            ], fetch=True)
+            doc_ids = {row['content_hash']: row['id'] for row in inserted}
+
+            jobs = []
+            for f in new_files:
+                doc_id = doc_ids.get(f['content_hash'])
+                if doc_id is None:
+                    # Already in the knowledge base - drop the copy we just stored
+                    storage.delete(f['storage_key'])
+                    existing = find_duplicate_document(cursor, org_id, f['content_hash'])
+                    duplicate_documents.append({
+                        'doc_id': existing['id'] if existing else None,
+                        'filename': f['filename'],
+                        'existing_filename': existing['filename'] if existing else None,
+                        'status': existing['processing_status'] if existing else 'pending'
+                    })
+                    continue
+
+                job_id = f"process_doc_{doc_id}_{secrets.token_hex(8)}"
+                jobs.append((org_id, 'document_upload', job_id, 'queued'))
+                uploaded_documents.append({
+                    'doc_id': doc_id,
+                    'filename': f['filename'],
+                    'file_type': f['file_type'],
+                    'status': 'pending',
+                    'job_id': job_id
+                })
+
+            if jobs:
+                execute_values(cursor, '''
+                    INSERT INTO processing_jobs (organization_id, job_type, job_id, status) VALUES %s
+                ''', jobs)
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        for f in new_files:
+            try:
+                storage.delete(f['storage_key'])
+            except Exception as delete_error:
+                print(f"Error removing {f['storage_key']} after failed upload: {delete_error}")
+        print(f"Error recording streamed upload: {e}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+    conn.close()
+
+    # Queue processing only once the rows are committed and visible to workers
+    for doc in uploaded_documents:
+        try:
+            process_document_task.apply_async(args=[doc['doc_id'], org_id], task_id=doc['job_id'])
+        except Exception as task_error:
+            print(f"❌ Error queueing task for document {doc['doc_id']}: {task_error}")
+
+    if uploaded_documents:
+        invalidate_search_cache(org_id)
+
+    message = f'{len(uploaded_documents)} files uploaded successfully'
+    if duplicate_documents:
+        message += f', {len(duplicate_documents)} already in the knowledge base'
+
+    return jsonify({
+        'success': len(uploaded_documents) + len(duplicate_documents) > 0,
+        'uploaded': uploaded_documents,
+        'duplicates': duplicate_documents,
+        'failed': failed_files,
+        'message': message
+    })
+
+
+# Direct-to-storage uploads: files above the threshold get presigned multipart part URLs
+PRESIGNED_UPLOAD_EXPIRY = 3600
+MULTIPART_UPLOAD_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_UPLOAD_PART_SIZE = 8 * 1024 * 1024
+UPLOAD_COMPLETION_LEASE = 300  # seconds a completion claims its intent
+
+
+@app.route('/api/documents/upload-intents', methods=['POST'])
+@login_required
+def create_upload_intents():
+    """
+    Create documents for a direct-to-storage upload and return presigned URLs
+
+    The browser PUTs each file (or each part) straight to object storage, then
+    calls /api/documents/upload-intents/<intent_id>/complete. No file bytes pass
+    through the web workers.
+
+    Request body:
+    {
+        "org_id": 123,
+        "files": [
+            {"filename": "deck.pdf", "size": 1048576, "content_hash": "<sha256 hex, optional>"}
+        ]
+    }
+    """
+    from document_dedup import find_duplicate_document
+    from object_storage import create_storage
+    from streaming_upload import ALLOWED_FILE_TYPES, MAX_FILE_SIZE, MAX_FILES
+    from werkzeug.utils import secure_filename
+
+    user_id = session['user_id']
+    data = request.json or {}
+    org_id = data.get('org_id')
+    files = data.get('files') or []
+
+    if not org_id:
+        return jsonify({'error': 'organization_id required'}), 400
+
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+
+    if len(files) > MAX_FILES:
+        return jsonify({'error': f'Maximum {MAX_FILES} files allowed per upload'}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT o.use_case FROM organization_members om
+        JOIN organizations o ON om.organization_id = o.id
+        WHERE om.organization_id = %s AND om.user_id = %s AND om.is_active = TRUE
+    ''', (org_id, user_id))
+    membership = cursor.fetchone()
+
+    if not membership:
+        conn.close()
+        return jsonify({'error': 'Not a member of this organization'}), 403
+
+    if membership['use_case'] == 'therapy_matching':
+        conn.close()
+        return jsonify({'error': 'Document upload not available for therapy organizations'}), 403
+
+    try:
+        storage = create_storage(shared=True)
+    except Exception as e:
+        conn.close()
+        return jsonify({
+            'error': f'Storage configuration error: {str(e)}',
+            'message': 'Please configure DigitalOcean Spaces credentials in .env file'
+        }), 500
+
+    intents, duplicate_documents, failed_files = [], [], []
+    expires_at = datetime.now() + timedelta(seconds=PRESIGNED_UPLOAD_EXPIRY)
+    batch_token = secrets.token_hex(8)
+
+    try:
+        # Abandoned intents of this org no longer show up as documents; their
+        # storage is released once this transaction commits
+        cursor.execute('''
+            UPDATE upload_intents
+            SET completed_at = CURRENT_TIMESTAMP, abandoned_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id FROM upload_intents
+                WHERE organization_id = %s AND completed_at IS NULL AND expires_at < CURRENT_TIMESTAMP
+                  AND (completing_at IS NULL OR completing_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING document_id, storage_key, multipart_upload_id
+        ''', (org_id, UPLOAD_COMPLETION_LEASE))
+        abandoned = cursor.fetchall()
+        if abandoned:
+            cursor.execute('''
+                UPDATE documents SET is_deleted = TRUE, deleted_at = CURRENT_TIMESTAMP
+                WHERE id = ANY(%s) AND is_deleted = FALSE
+            ''', ([row['document_id'] for row in abandoned],))
+
+        for item in files:
+            filename = str(item.get('filename') or '')
+            file_type = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+            size = item.get('size')
+            content_hash = item.get('content_hash')
+
+            if file_type not in ALLOWED_FILE_TYPES:
+                failed_files.append({'filename': filename, 'error': f"Unsupported file type. Allowed: {', '.join(ALLOWED_FILE_TYPES)}"})
+                continue
+            if not isinstance(size, int) or size <= 0 or size > MAX_FILE_SIZE:
+                failed_files.append({'filename': filename, 'error': f'File size must be between 1 byte and {MAX_FILE_SIZE // (1024 * 1024)}MB'})
+                continue
+            if content_hash is not None and not re.fullmatch(r'[0-9a-f]{64}', str(content_hash)):
+                failed_files.append({'filename': filename, 'error': 'content_hash must be a lowercase hex SHA-256'})
+                continue
+
+            if content_hash:
+                existing = find_duplicate_document(cursor, org_id, content_hash)
+                if existing and existing['processing_status'] == 'failed':
+                    cursor.execute('''
+                        UPDATE documents SET is_deleted = TRUE, deleted_at = CURRENT_TIMESTAMP WHERE id = %s
+                    ''', (existing['id'],))
+                    existing = None
+                if existing:
+                    duplicate_documents.append({
+                        'doc_id': existing['id'],
+                        'filename': filename,
+                        'existing_filename': existing['filename'],
+                        'status': existing['processing_status']
+                    })
+                    continue
+
+            content_type = ALLOWED_FILE_TYPES[file_type]
+            key = f"documents/org_{org_id}/{batch_token}/{len(intents)}_{secure_filename(filename) or 'upload'}"
+
+            # The content hash is only set on the document once the stored bytes have been hashed
+            cursor.execute('''
+                INSERT INTO documents (organization_id, filename, file_type, file_size, uploaded_by,
+                                       storage_url, processing_status)
+                VALUES (%s, %s, %s, %s, %s, %s, 'awaiting_upload')
+                RETURNING id
+            ''', (org_id, filename, file_type, size, user_id, storage.url_for(key)))
+            inserted = cursor.fetchone()
+
+            intent = {
+                'doc_id': inserted['id'],
+                'filename': filename,
+                'method': 'PUT',
+                'headers': {'Content-Type': content_type},
+                'expires_at': expires_at.isoformat()
+            }
+            multipart_upload_id = None
+            if size > MULTIPART_UPLOAD_THRESHOLD:
+                part_count = -(-size // MULTIPART_UPLOAD_PART_SIZE)
+                multipart_upload_id, part_urls = storage.create_presigned_multipart(
+                    key, content_type, part_count, PRESIGNED_UPLOAD_EXPIRY,
+                    max_part_size=MULTIPART_UPLOAD_PART_SIZE
+                )
+                intent['part_size'] = MULTIPART_UPLOAD_PART_SIZE
+                intent['part_urls'] = part_urls
+            else:
+                intent['url'] = storage.presigned_put_url(key, content_type, PRESIGNED_UPLOAD_EXPIRY, max_size=size)
+
+            cursor.execute('''
+                INSERT INTO upload_intents (document_id, organization_id, user_id, storage_key,
+                                            multipart_upload_id, expected_size, content_type, expires_at,
+                                            declared_content_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            ''', (inserted['id'], org_id, user_id, key, multipart_upload_id, size, content_type, expires_at,
+                  content_hash))
+            intent['intent_id'] = cursor.fetchone()['id']
+            intents.append(intent)
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        print(f"Error creating upload intents: {e}")
+        return jsonify({'error': f'Failed to prepare upload: {str(e)}'}), 500
+
+    conn.close()
+
+    for row in abandoned:
+        try:
+            if row['multipart_upload_id']:
+                storage.abort_multipart(row['storage_key'], row['multipart_upload_id'])
+            storage.delete(row['storage_key'])
+        except Exception as e:
+            print(f"Error removing abandoned upload {row['storage_key']}: {e}")
+
+    return jsonify({
+        'success': len(intents) + len(duplicate_documents) > 0,
+        'intents': intents,
+        'duplicates': duplicate_documents,
+        'failed': failed_files
     })
 
 
-@app.route('/api/documents', methods=['GET'])
-@login_required
-def list_documents():
-    """List all documents for an organization"""
+@app.route('/api/documents/upload-intents/<int:intent_id>/complete', methods=['POST'])
+@login_required
+def complete_upload_intent(intent_id):
+    """
+    Finish a direct-to-storage upload and queue the document for processing
+
+    Only cheap checks run here (size and file signature); the intent is
+    claimed for UPLOAD_COMPLETION_LEASE seconds instead of being locked while
+    storage is called. Hashing the stored object - which downloads it - runs
+    in verify_uploaded_document after the response: a declared content_hash
+    that doesn't match rejects the upload, and content already in the
+    knowledge base marks it as a duplicate. Follow the outcome with
+    GET /api/jobs/<job_id>/status.
+
+    Request body (multipart uploads only):
+    {
+        "parts": [{"PartNumber": 1, "ETag": "\"...\""}, ...]
+    }
+    """
+    from object_storage import create_storage
+    from streaming_upload import UploadRejected, sniff_file_type
+
+    user_id = session['user_id']
+    data = request.json or {}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT ui.*, d.filename, d.organization_id AS org_id
+        FROM upload_intents ui
+        JOIN documents d ON d.id = ui.document_id
+        JOIN organization_members om ON om.organization_id = ui.organization_id
+        WHERE ui.id = %s AND ui.user_id = %s AND om.user_id = %s AND om.is_active = TRUE
+          AND d.is_deleted = FALSE
+    ''', (intent_id, user_id, user_id))
+    intent = cursor.fetchone()
+
+    if not intent:
+        conn.close()
+        return jsonify({'error': 'Upload not found or access denied'}), 404
+
+    if intent['completed_at']:
+        conn.close()
+        return jsonify({'error': 'Upload already completed'}), 409
+
+    if intent['expires_at'] < datetime.now():
+        conn.close()
+        return jsonify({'error': 'Upload expired, please upload the file again'}), 410
+
+    # Claim the intent so concurrent completions run one at a time, without holding a row lock
+    cursor.execute('''
+        UPDATE upload_intents SET completing_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND completed_at IS NULL
+          AND (completing_at IS NULL OR completing_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+    ''', (intent_id, UPLOAD_COMPLETION_LEASE))
+    claimed = cursor.rowcount == 1
+    conn.commit()
+    if not claimed:
+        conn.close()
+        return jsonify({'error': 'Upload is already being completed'}), 409
+
+    def release_claim():
+        cursor.execute('UPDATE upload_intents SET completing_at = NULL WHERE id = %s', (intent_id,))
+        conn.commit()
+        conn.close()
+
+    key = intent['storage_key']
+    try:
+        storage = create_storage(shared=True)
+        if intent['multipart_upload_id']:
+            parts = data.get('parts') or []
+            if not parts:
+                release_claim()
+                return jsonify({'error': 'parts required to complete a multipart upload'}), 400
+            storage.complete_multipart(key, intent['multipart_upload_id'], [
+                {'PartNumber': int(p['PartNumber']), 'ETag': str(p['ETag'])} for p in parts
+            ])
+
+        size = storage.object_size(key)
+        if size is None:
+            release_claim()
+            return jsonify({'error': 'Uploaded file not found in storage'}), 400
+
+        if size != intent['expected_size']:
+            raise UploadRejected(f"Uploaded size {size} does not match declared size {intent['expected_size']}")
+        sniff_file_type(intent['filename'], storage.read_head(key))
+
+    except UploadRejected as e:
+        # The document can't be trusted - remove it so the file can be uploaded again
+        try:
+            storage.delete(key)
+        except Exception as delete_error:
+            print(f"Error removing rejected upload {key}: {delete_error}")
+        cursor.execute('''
+            UPDATE documents SET is_deleted = TRUE, deleted_at = CURRENT_TIMESTAMP WHERE id = %s
+        ''', (intent['document_id'],))
+        cursor.execute('''
+            UPDATE upload_intents SET completed_at = CURRENT_TIMESTAMP WHERE id = %s
+        ''', (intent_id,))
+        conn.commit()
+        conn.close()
+        return jsonify({'error': str(e)}), 400
+
+    except Exception as e:
+        print(f"Error verifying upload {intent_id}: {e}")
+        release_claim()
+        return jsonify({'error': f'Failed to verify upload: {str(e)}'}), 500
+
+    doc_id = intent['document_id']
+    org_id = intent['org_id']
+    job_id = f"process_doc_{doc_id}_{secrets.token_hex(8)}"
+
+    cursor.execute('''
+        UPDATE documents SET processing_status = 'pending', file_size = %s WHERE id = %s
+    ''', (size, doc_id))
+    cursor.execute('''
+        INSERT INTO processing_jobs (organization_id, job_type, job_id, status)
+        VALUES (%s, 'document_upload', %s, 'queued')
+    ''', (org_id, job_id))
+    cursor.execute('''
+        UPDATE upload_intents SET completed_at = CURRENT_TIMESTAMP WHERE id = %s
+    ''', (intent_id,))
+    conn.commit()
+    conn.close()
+
+    thread = threading.Thread(target=verify_uploaded_document,
+                              args=(doc_id, org_id, key, intent['declared_content_hash'], job_id))
+    thread.daemon = True
+    thread.start()
+
+    return jsonify({
+        'success': True,
+        'doc_id': doc_id,
+        'filename': intent['filename'],
+        'status': 'pending',
+        'job_id': job_id
+    })
+
+
+def verify_uploaded_document(doc_id, org_id, key, declared_content_hash, job_id):
+    """
+    Background job: hash a completed direct upload, then queue its processing
+
+    A hash that doesn't match the declared one fails the job and removes the
+    document; content the organization already has completes the job with
+    the existing document as duplicate_of.
+    """
+    from document_dedup import find_duplicate_document
+    from object_storage import create_storage
+    from tasks import process_document_task
+
+    storage = create_storage()
+    conn = None
+    try:
+        # Hashed before a connection is opened, so no transaction spans the download
+        content_hash = storage.content_hash(key)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        def discard(status, result, error_message=None):
+            cursor.execute('''
+                UPDATE documents SET is_deleted = TRUE, deleted_at = CURRENT_TIMESTAMP WHERE id = %s
+            ''', (doc_id,))
+            cursor.execute('''
+                UPDATE processing_jobs
+                SET status = %s, progress = 100, result_json = %s, error_message = %s, completed_at = CURRENT_TIMESTAMP
+                WHERE job_id = %s
+            ''', (status, json.dumps(result), error_message, job_id))
+            conn.commit()
+            try:
+                storage.delete(key)
+            except Exception as delete_error:
+                print(f"Error removing discarded upload {key}: {delete_error}")
+
+        if declared_content_hash and declared_content_hash != content_hash:
+            discard('failed', {'doc_id': doc_id}, 'Uploaded file does not match the declared content_hash')
+            return
+
+        existing = find_duplicate_document(cursor, org_id, content_hash)
+        if existing and existing['processing_status'] == 'failed':
+            cursor.execute('''
+                UPDATE documents SET is_deleted = TRUE, deleted_at = CURRENT_TIMESTAMP WHERE id = %s
+            ''', (existing['id'],))
+            existing = None
+        if existing:
+            discard('completed', {'doc_id': doc_id, 'duplicate_of': existing['id']})
+            return
+
+        try:
+            cursor.execute('SAVEPOINT set_content_hash')
+            cursor.execute('''
+                UPDATE documents SET content_hash = %s WHERE id = %s
+            ''', (content_hash, doc_id))
+            cursor.execute('RELEASE SAVEPOINT set_content_hash')
+        except psycopg2.IntegrityError:
+            # The same content was completed concurrently under another intent
+            cursor.execute('ROLLBACK TO SAVEPOINT set_content_hash')
+            existing = find_duplicate_document(cursor, org_id, content_hash)
+            discard('completed', {'doc_id': doc_id, 'duplicate_of': existing['id'] if existing else None})
+            return
+        conn.commit()
+
+        process_document_task.apply_async(args=[doc_id, org_id], task_id=job_id)
+
+    except Exception as e:
+        print(f"❌ Error verifying upload of document {doc_id}: {e}")
+        if conn is None:
+            conn = get_db_connection()
+        conn.rollback()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE documents SET processing_status = 'failed' WHERE id = %s
+        ''', (doc_id,))
+        cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'failed', error_message = %s, completed_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (str(e), job_id))
+        conn.commit()
+    finally:
+        if conn is not None:
+            conn.close()
+        invalidate_search_cache(org_id)
+
+
+@app.route('/api/documents', methods=['GET'])
+@login_required
+def list_documents():
+    """
+    List an organization's documents, one page at a time (newest first)
+
+    Query params:
+        org_id: Organization ID (required)
+        status, file_type: Comma-separated values to filter on
+        uploaded_by: Uploader user ID
+        date_from, date_to: ISO dates bounding upload_date (date_to exclusive)
+        fields: Comma-separated fields to return (default: all)
+        limit: Page size (default 50, max 200)
+        cursor: next_cursor from the previous page
+    """
+    from document_listing import DEFAULT_PAGE_SIZE, list_documents_page, parse_document_filters, parse_fields
+
     user_id = session['user_id']
     org_id = request.args.get('org_id')
 
@@ -17027,11 +18644,17 @@ def list_documents():
     except:
         return jsonify({'error': 'Invalid organization_id'}), 400
 
+    try:
+        filters = parse_document_filters(request.args)
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
     # Verify user is member
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT * FROM organization_members
+        SELECT 1 FROM organization_members
         WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
     ''', (org_id, user_id))
 
@@ -17039,29 +18662,21 @@ def list_documents():
         conn.close()
         return jsonify({'error': 'Not a member of this organization'}), 403
 
-    # Get documents
-    cursor.execute('''
-        SELECT d.*, u.first_name, u.last_name
-        FROM documents d
-        JOIN users u ON d.uploaded_by = u.id
-        WHERE d.organization_id = %s AND d.is_deleted = FALSE
-        ORDER BY d.upload_date DESC
-    ''', (org_id,))
-
-    documents = cursor.fetchall()
+    try:
+        page = list_documents_page(
+            cursor, org_id, filters, fields,
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            page_cursor=request.args.get('cursor'),
+            decrypt=data_encryption.decrypt_sensitive_data
+        )
+    except ValueError:
+        conn.close()
+        return jsonify({'error': 'Invalid cursor'}), 400
     conn.close()
 
     return jsonify({
-        'documents': [{
-            'id': doc['id'],
-            'filename': doc['filename'],
-            'file_type': doc['file_type'],
-            'file_size': doc['file_size'],
-            'upload_date': doc['upload_date'].isoformat() if doc['upload_date'] else None,
-            'uploaded_by': f"{doc['first_name']} {doc['last_name']}",
-            'processing_status': doc['processing_status'],
-            'metadata': json.loads(doc['metadata_json']) if doc['metadata_json'] else {}
-        } for doc in documents]
+        'documents': page['documents'],
+        'next_cursor': page['next_cursor']
     })
 
 
@@ -17129,7 +18744,7 @@ def get_document(doc_id):
 @login_required
 def download_document(doc_id):
     """Generate presigned download URL for document"""
-    from storage_manager import StorageManager
+    from object_storage import create_storage
 
     user_id = session['user_id']
 
@@ -17162,8 +18777,8 @@ def download_document(doc_id):
 
     # Generate presigned URL
     try:
-        storage = StorageManager()
-        download_url = storage.generate_download_url(doc['storage_url'], expires_in=3600)
+        storage = create_storage()
+        download_url = storage.generate_download_url(doc['storage_url'], expires_in=3600, filename=doc['filename'])
 
         return jsonify({
             'download_url': download_url,
@@ -17174,12 +18789,82 @@ def download_document(doc_id):
         return jsonify({'error': f'Failed to generate download URL: {str(e)}'}), 500
 
 
+# ============================================================================
+# LOCAL STORAGE ENDPOINTS (filesystem backend stand-ins for presigned S3 URLs)
+# ============================================================================
+
+@app.route('/api/storage/objects/<token>', methods=['PUT'])
+def storage_put_object(token):
+    """
+    Target of presigned PUT / multipart part URLs issued by FilesystemStorage
+
+    Like an S3 presigned URL the signed token is the credential, so no session
+    is required. Returns the object or part ETag.
+    """
+    from object_storage import FilesystemStorage, UploadTooLarge, create_storage
+
+    storage = create_storage()
+    if not isinstance(storage, FilesystemStorage):
+        return jsonify({'error': 'Not found'}), 404
+
+    payload = storage.verify_token(token, 'put') or storage.verify_token(token, 'part')
+    if not payload:
+        return jsonify({'error': 'Invalid or expired upload URL'}), 403
+
+    # The signed size is the cap; the stream is also counted for chunked bodies
+    max_size = payload.get('max_size')
+    if max_size is not None and request.content_length and request.content_length > max_size:
+        return jsonify({'error': f'Upload exceeds the {max_size} bytes allowed by this URL'}), 413
+
+    try:
+        etag = storage.receive_upload(payload, request.stream)
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
+    response = app.response_class(status=200)
+    response.headers['ETag'] = f'"{etag}"'
+    return response
+
+
+@app.route('/api/storage/download/<token>', methods=['GET'])
+def storage_download_object(token):
+    """
+    Serve a document from FilesystemStorage via a signed download URL
+
+    With STORAGE_ACCEL_REDIRECT_PREFIX set, nginx sends the file (X-Accel-Redirect);
+    otherwise the WSGI server's sendfile path is used.
+    """
+    from object_storage import FilesystemStorage, content_disposition, create_storage
+
+    storage = create_storage()
+    if not isinstance(storage, FilesystemStorage):
+        return jsonify({'error': 'Not found'}), 404
+
+    payload = storage.verify_token(token, 'get')
+    if not payload:
+        return jsonify({'error': 'Invalid or expired download URL'}), 403
+
+    path = storage.key_path(payload['key'])
+    if not os.path.exists(path):
+        return jsonify({'error': 'File not found'}), 404
+
+    filename = payload.get('filename') or os.path.basename(path)
+    if storage.accel_redirect_prefix:
+        response = app.response_class(status=200)
+        response.headers['X-Accel-Redirect'] = f"{storage.accel_redirect_prefix.rstrip('/')}/keys/{payload['key']}"
+        response.headers['Content-Disposition'] = content_disposition(filename)
+        response.headers['Content-Type'] = 'application/octet-stream'
+        return response
+
+    return send_file(path, as_attachment=True, download_name=filename, conditional=True)
+
+
 @app.route('/api/documents/<int:doc_id>', methods=['DELETE'])
 @login_required
 def delete_document(doc_id):
     """Soft delete a document"""
-    from storage_manager import StorageManager
-
     user_id = session['user_id']
 
     conn = get_db_connection()
@@ -17213,13 +18898,15 @@ def delete_document(doc_id):
 
     # Optionally delete from storage (can be done in background)
     # try:
-    #     storage = StorageManager()
-    #     storage.delete_file(doc['storage_url'])
+    #     storage = create_storage()
+    #     storage.delete(storage.key_from_url(doc['storage_url']))
     # except Exception as e:
     #     print(f"Error deleting from storage: {e}")
 
     conn.close()
 
+    invalidate_search_cache(doc['organization_id'])
+
     return jsonify({'success': True, 'message': 'Document deleted successfully'})
 
 
@@ -17256,10 +18943,300 @@ def get_job_status(job_id):
     })
 
 
+# ============================================================================
+# KNOWLEDGE PLATFORM SERVICES
+# ============================================================================
+
+KNOWLEDGE_INDEX_NAME = "flock-knowledge-base"
+QUERY_EMBEDDING_MODEL = "text-embedding-3-large"
+
+_service_registry = None
+
+
+def get_service_registry():
+    """Process-wide, fork-aware owner of the knowledge-base services"""
+    global _service_registry
+    if _service_registry is None:
+        from service_registry import ServiceRegistry
+
+        def build_query_embedding_cache(services):
+            from embedding_cache import QueryEmbeddingCache
+            return QueryEmbeddingCache(get_db_connection)
+
+        def build_search_result_cache(services):
+            from search_cache import SearchResultCache
+            return SearchResultCache()
+
+        def build_vector_store(services):
+            from local_vector_store import create_vector_store
+            return create_vector_store(index_name=KNOWLEDGE_INDEX_NAME)
+
+        def build_embedding_service(services):
+            from embedding_cache import CachedEmbeddingService
+            from embedding_service import EmbeddingService
+            return CachedEmbeddingService(EmbeddingService(model=QUERY_EMBEDDING_MODEL),
+                                          services.get('query_embedding_cache'))
+
+        def build_rag_pipeline(services):
+            from rag_pipeline import RAGPipeline
+            return RAGPipeline(services.get('vector_store'), services.get('embedding_service'))
+
+        def build_orchestrator(services):
+            from chat_agents import MasterOrchestrator
+            return MasterOrchestrator(services.get('vector_store'), services.get('embedding_service'))
+
+        def build_chat_context(services):
+            from conversation_context import ChatContextWindow
+            return ChatContextWindow(get_db_connection)
+
+        def build_chat_answer_stream(services):
+            from chat_streaming import ChatAnswerStream
+            return ChatAnswerStream(get_db_connection, services.get('vector_store'), services.get('embedding_service'),
+                                    context_window=services.get('chat_context'), enrich_employees=enrich_employee_hits)
+
+        registry = ServiceRegistry()
+        registry.register('query_embedding_cache', build_query_embedding_cache)
+        registry.register('search_result_cache', build_search_result_cache)
+        registry.register('vector_store', build_vector_store)
+        registry.register('embedding_service', build_embedding_service)
+        registry.register('rag_pipeline', build_rag_pipeline)
+        registry.register('orchestrator', build_orchestrator)
+        registry.register('chat_context', build_chat_context)
+        registry.register('chat_answer_stream', build_chat_answer_stream)
+        _service_registry = registry
+    return _service_registry
+
+
+def get_vector_store():
+    return get_service_registry().get('vector_store')
+
+
+def get_embedding_service():
+    return get_service_registry().get('embedding_service')
+
+
+def get_query_embedding_cache():
+    """Process-wide cache of query embeddings (LRU + Redis), shared by search and chat"""
+    return get_service_registry().get('query_embedding_cache')
+
+
+def get_search_result_cache():
+    """Process-wide cache of search responses, invalidated per organization"""
+    return get_service_registry().get('search_result_cache')
+
+
+def invalidate_search_cache(org_id):
+    """
+    Bump the organization's corpus generation so cached searches are recomputed.
+    Call after any change to an organization's documents or their chunks.
+    """
+    try:
+        get_search_result_cache().bump_generation(org_id)
+    except Exception as e:
+        print(f"Failed to invalidate search cache for org {org_id}: {e}")
+
+
+def warm_up_services():
+    """
+    Build the knowledge-base services in the background at worker start, and
+    schedule the employee refresh for requests left queued by a restart
+    """
+    get_service_registry().warm_up_async()
+    schedule_employee_refresh()
+
+
+_employee_refresher = None
+
+
+def get_employee_refresher():
+    """Process-wide debounced refresher for employee embeddings"""
+    global _employee_refresher
+    if _employee_refresher is None:
+        from employee_refresh import EmployeeEmbeddingRefresher
+        _employee_refresher = EmployeeEmbeddingRefresher(get_db_connection)
+    return _employee_refresher
+
+
+def schedule_employee_refresh():
+    """
+    Start the debounced refresh after committing queue_employee_refresh() rows.
+    Call after profile saves and organization membership changes.
+    """
+    try:
+        get_employee_refresher().schedule()
+    except Exception as e:
+        print(f"Failed to schedule employee embedding refresh: {e}")
+
+
 # ============================================================================
 # SPRINT 2: SEARCH API ENDPOINTS
 # ============================================================================
 
+SEARCH_MODES = ('semantic', 'lexical', 'hybrid')
+
+# Reciprocal rank fusion constant (standard value from Cormack et al.)
+RRF_K = 60
+
+
+def is_keyword_query(query: str) -> bool:
+    """
+    Heuristic for queries that lexical search answers on its own: quoted phrases
+    and short queries containing identifiers (project codes, ticket numbers)
+    """
+    stripped = query.strip()
+    if len(stripped) > 1 and stripped[0] == stripped[-1] == '"':
+        return True
+
+    terms = stripped.split()
+    if len(terms) > 3:
+        return False
+    return any(any(ch.isdigit() for ch in term) or ('-' in term or '_' in term) or
+               (term.isupper() and len(term) > 1) for term in terms)
+
+
+def lexical_search_chunks(cursor, org_id: int, query: str, top_k: int,
+                          doc_type: Optional[str] = None) -> List[Dict]:
+    """
+    Rank document chunks with Postgres full-text search
+
+    ts_rank_cd with length normalization (flag 1) gives BM25-like behaviour:
+    term proximity and frequency count, long chunks are damped.
+    """
+    params = [query, org_id]
+    type_filter = ''
+    if doc_type:
+        type_filter = 'AND d.file_type = %s'
+        params.append(doc_type)
+    params.append(top_k)
+
+    cursor.execute(f'''
+        SELECT
+            dc.document_id, dc.chunk_index, dc.chunk_text,
+            d.filename, d.file_type, d.upload_date,
+            ts_rank_cd(dc.chunk_tsv, q, 1) AS rank
+        FROM document_chunks dc
+        INNER JOIN documents d ON d.id = dc.document_id,
+        websearch_to_tsquery('simple', %s) q
+        WHERE d.organization_id = %s
+          AND d.is_deleted = FALSE
+          AND dc.chunk_tsv @@ q
+          {type_filter}
+        ORDER BY rank DESC
+        LIMIT %s
+    ''', params)
+
+    return [{
+        'doc_id': row['document_id'],
+        'filename': row['filename'],
+        'file_type': row['file_type'],
+        'upload_date': row['upload_date'].isoformat() if row['upload_date'] else None,
+        'snippet': row['chunk_text'][:300],
+        'score': float(row['rank']),
+        'chunk_index': row['chunk_index']
+    } for row in cursor.fetchall()]
+
+
+def enrich_document_hits(cursor, results: List[Dict]) -> List[Dict]:
+    """
+    Attach document details to vector hits with one query, keeping score order
+
+    Hits on soft-deleted documents are dropped. Snippets come from the vector
+    metadata, falling back to a single bulk read of document_chunks.
+    """
+    hits = [r for r in results if r['metadata'].get('doc_id')]
+    if not hits:
+        return []
+
+    doc_ids = list({int(r['metadata']['doc_id']) for r in hits})
+    cursor.execute('''
+        SELECT id, filename, file_type, upload_date
+        FROM documents
+        WHERE id = ANY(%s) AND is_deleted = FALSE
+    ''', (doc_ids,))
+    docs = {doc['id']: doc for doc in cursor.fetchall()}
+
+    missing_text = [
+        (int(r['metadata']['doc_id']), int(r['metadata'].get('chunk_index', 0)))
+        for r in hits
+        if int(r['metadata']['doc_id']) in docs and not r['metadata'].get('text')
+    ]
+    chunk_snippets = {}
+    if missing_text:
+        cursor.execute('''
+            SELECT document_id, chunk_index, LEFT(chunk_text, 300) AS snippet
+            FROM document_chunks
+            WHERE (document_id, chunk_index) IN (
+                SELECT * FROM unnest(%s::int[], %s::int[])
+            )
+        ''', ([d for d, _ in missing_text], [c for _, c in missing_text]))
+        chunk_snippets = {(row['document_id'], row['chunk_index']): row['snippet'] for row in cursor.fetchall()}
+
+    enriched_results = []
+    for result in hits:
+        doc = docs.get(int(result['metadata']['doc_id']))
+        if not doc:
+            continue
+        chunk_index = result['metadata'].get('chunk_index', 0)
+        snippet = result['metadata'].get('text') or chunk_snippets.get((doc['id'], int(chunk_index)), '')
+        enriched_results.append({
+            'doc_id': doc['id'],
+            'filename': doc['filename'],
+            'file_type': doc['file_type'],
+            'upload_date': doc['upload_date'].isoformat() if doc['upload_date'] else None,
+            'snippet': snippet[:300],
+            'score': result['score'],
+            'chunk_index': chunk_index
+        })
+
+    return enriched_results
+
+
+def enrich_employee_hits(cursor, results: List[Dict]) -> List[Dict]:
+    """Attach user and profile details to employee vector hits with one query, keeping score order"""
+    hits = [r for r in results if r['metadata'].get('user_id')]
+    if not hits:
+        return []
+
+    cursor.execute('''
+        SELECT u.id, u.full_name, u.email,
+               up.current_position, up.specialties, up.bio, up.years_experience
+        FROM users u
+        LEFT JOIN user_profiles up ON u.id = up.user_id
+        WHERE u.id = ANY(%s)
+    ''', (list({int(r['metadata']['user_id']) for r in hits}),))
+    employees = {employee['id']: employee for employee in cursor.fetchall()}
+
+    enriched_results = []
+    for result in hits:
+        employee = employees.get(int(result['metadata']['user_id']))
+        if employee:
+            enriched_results.append({
+                'user_id': employee['id'],
+                'name': employee['full_name'],
+                'email': employee['email'],
+                'title': employee.get('current_position', ''),
+                'specialties': employee.get('specialties', ''),
+                'bio': employee.get('bio', '')[:200] if employee.get('bio') else '',
+                'experience': employee.get('years_experience', 0),
+                'relevance_score': result['score']
+            })
+
+    return enriched_results
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], top_k: int) -> List[Dict]:
+    """Merge ranked result lists by summing 1 / (RRF_K + rank) per (doc_id, chunk_index)"""
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            key = (result['doc_id'], result['chunk_index'])
+            if key not in fused:
+                fused[key] = dict(result, score=0.0)
+            fused[key]['score'] += 1.0 / (RRF_K + rank)
+
+    return sorted(fused.values(), key=lambda r: r['score'], reverse=True)[:top_k]
+
+
 @app.route('/api/documents/search', methods=['POST'])
 @login_required
 def search_documents():
@@ -17272,8 +19249,12 @@ def search_documents():
         "org_id": 123,
         "top_k": 10,  # optional, default 10
         "doc_type": "pdf",  # optional filter
-        "min_score": 0.7  # optional, default 0.7
+        "min_score": 0.7,  # optional, default 0.7 (semantic results only)
+        "mode": "hybrid"  # optional: semantic (default), lexical, or hybrid
     }
+
+    Hybrid mode fuses lexical and semantic rankings with reciprocal rank fusion;
+    keyword-like queries with lexical hits skip the embedding call entirely.
     """
     user_id = session['user_id']
     data = request.json
@@ -17286,6 +19267,7 @@ def search_documents():
     top_k = data.get('top_k', 10)
     doc_type = data.get('doc_type')
     min_score = data.get('min_score', 0.7)
+    mode = data.get('mode', 'semantic')
 
     # Validate inputs
     if not query or not query.strip():
@@ -17294,6 +19276,9 @@ def search_documents():
     if top_k < 1 or top_k > 100:
         return jsonify({'error': 'top_k must be between 1 and 100'}), 400
 
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(SEARCH_MODES)}"}), 400
+
     # Verify user has access to organization
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -17307,59 +19292,62 @@ def search_documents():
         conn.close()
         return jsonify({'error': 'Access denied to organization'}), 403
 
-    try:
-        # Import services (lazy import to avoid circular dependencies)
-        from embedding_service import EmbeddingService
-        from vector_store import VectorStore
+    # Key (and corpus generation) taken before searching, so results of a search
+    # that overlaps a corpus change are never stored under the newer generation
+    search_cache = get_search_result_cache()
+    cache_key = search_cache.key(org_id, query, top_k=top_k, doc_type=doc_type, min_score=min_score, mode=mode)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        conn.close()
+        return jsonify(dict(cached, query=query))
 
-        # Generate query embedding
-        print(f"Generating embedding for search query: {query[:100]}...")
-        embedding_service = EmbeddingService(model="text-embedding-3-large")
-        query_embedding = embedding_service.generate_single_embedding(query, org_id)
+    try:
+        lexical_results = []
+        if mode in ('lexical', 'hybrid'):
+            lexical_results = lexical_search_chunks(cursor, org_id, query, top_k, doc_type)
 
-        # Search in vector store
-        print(f"Searching documents for org {org_id}")
-        vector_store = VectorStore(index_name="flock-knowledge-base")
-        results = vector_store.search_documents(
-            org_id=org_id,
-            query_embedding=query_embedding,
-            top_k=top_k,
-            doc_type=doc_type,
-            min_score=min_score
+        # Keyword-like queries with lexical hits don't need an embedding
+        enriched_results = []
+        run_semantic = mode == 'semantic' or (
+            mode == 'hybrid' and not (lexical_results and is_keyword_query(query))
         )
 
-        # Enrich results with document information from database
-        enriched_results = []
-        for result in results:
-            # Extract doc_id from vector metadata
-            doc_id = result['metadata'].get('doc_id')
-            if doc_id:
-                cursor.execute('''
-                    SELECT id, filename, file_type, upload_date, metadata_json
-                    FROM documents
-                    WHERE id = %s AND is_deleted = FALSE
-                ''', (doc_id,))
-
-                doc = cursor.fetchone()
-                if doc:
-                    enriched_results.append({
-                        'doc_id': doc['id'],
-                        'filename': doc['filename'],
-                        'file_type': doc['file_type'],
-                        'upload_date': doc['upload_date'].isoformat() if doc['upload_date'] else None,
-                        'snippet': result['metadata'].get('text', '')[:300],
-                        'score': result['score'],
-                        'chunk_index': result['metadata'].get('chunk_index', 0)
-                    })
+        if run_semantic:
+            # Generate query embedding (cached for repeated queries)
+            print(f"Generating embedding for search query: {query[:100]}...")
+            query_embedding = get_embedding_service().generate_single_embedding(query, org_id)
+
+            # Search in vector store
+            print(f"Searching documents for org {org_id}")
+            results = get_vector_store().search_documents(
+                org_id=org_id,
+                query_embedding=query_embedding,
+                top_k=top_k,
+                doc_type=doc_type,
+                min_score=min_score
+            )
+
+            # Enrich results with document information from database
+            enriched_results = enrich_document_hits(cursor, results)
 
         conn.close()
 
-        return jsonify({
+        if mode == 'semantic':
+            final_results = enriched_results
+        elif not run_semantic or mode == 'lexical':
+            final_results = lexical_results
+        else:
+            final_results = reciprocal_rank_fusion([enriched_results, lexical_results], top_k)
+
+        response = {
             'success': True,
             'query': query,
-            'results_count': len(enriched_results),
-            'results': enriched_results
-        })
+            'mode': mode,
+            'results_count': len(final_results),
+            'results': final_results
+        }
+        search_cache.set(cache_key, response)
+        return jsonify(response)
 
     except Exception as e:
         conn.close()
@@ -17411,49 +19399,20 @@ def search_employees():
         return jsonify({'error': 'Access denied to organization'}), 403
 
     try:
-        # Import services
-        from embedding_service import EmbeddingService
-        from vector_store import VectorStore
-
-        # Generate query embedding
+        # Generate query embedding (cached for repeated queries)
         print(f"Generating embedding for employee search: {query[:100]}...")
-        embedding_service = EmbeddingService(model="text-embedding-3-large")
-        query_embedding = embedding_service.generate_single_embedding(query, org_id)
+        query_embedding = get_embedding_service().generate_single_embedding(query, org_id)
 
         # Search in vector store
         print(f"Searching employees for org {org_id}")
-        vector_store = VectorStore(index_name="flock-knowledge-base")
-        results = vector_store.search_employees(
+        results = get_vector_store().search_employees(
             org_id=org_id,
             query_embedding=query_embedding,
             top_k=top_k
         )
 
         # Enrich results with full employee information
-        enriched_results = []
-        for result in results:
-            user_id_result = result['metadata'].get('user_id')
-            if user_id_result:
-                cursor.execute('''
-                    SELECT u.id, u.full_name, u.email,
-                           up.current_position, up.specialties, up.bio, up.years_experience
-                    FROM users u
-                    LEFT JOIN user_profiles up ON u.id = up.user_id
-                    WHERE u.id = %s
-                ''', (user_id_result,))
-
-                employee = cursor.fetchone()
-                if employee:
-                    enriched_results.append({
-                        'user_id': employee['id'],
-                        'name': employee['full_name'],
-                        'email': employee['email'],
-                        'title': employee.get('current_position', ''),
-                        'specialties': employee.get('specialties', ''),
-                        'bio': employee.get('bio', '')[:200] if employee.get('bio') else '',
-                        'experience': employee.get('years_experience', 0),
-                        'relevance_score': result['score']
-                    })
+        enriched_results = enrich_employee_hits(cursor, results)
 
         conn.close()
 
@@ -17501,392 +19460,300 @@ def trigger_employee_embedding():
     ''', (org_id, current_user_id))
 
     member = cursor.fetchone()
-    conn.close()
 
     if not member:
+        conn.close()
         return jsonify({'error': 'Access denied to organization'}), 403
 
     # Only allow generating embeddings for self unless owner/admin
     if target_user_id != current_user_id and member['role'] not in ['owner', 'admin']:
-        return jsonify({'error': 'Insufficient permissions'}), 403
-
-    try:
-        # Import task
-        from tasks import generate_employee_embeddings_task
-
-        # Queue background task
-        task = generate_employee_embeddings_task.delay(org_id, target_user_id)
-
-        return jsonify({
-            'success': True,
-            'message': 'Employee embedding generation started',
-            'task_id': task.id,
-            'user_id': target_user_id
-        })
-
-    except Exception as e:
-        print(f"Error triggering embedding generation: {e}")
-        return jsonify({'error': f'Failed to start task: {str(e)}'}), 500
-
-
-# ============================================================================
-# SMART FOLDERS API (SPRINT 3)
-# ============================================================================
-
-@app.route('/api/folders/by-team', methods=['GET'])
-@login_required
-def get_folders_by_team():
-    """
-    Get documents organized by team (smart folder view)
-
-    Query params:
-        org_id: Organization ID (required)
-        team: Filter by specific team (optional)
-    """
-    user_id = session['user_id']
-    org_id = request.args.get('org_id', type=int)
-
-    if not org_id:
-        return jsonify({'error': 'Missing required parameter: org_id'}), 400
-
-    # Verify user has access to organization
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute('''
-        SELECT 1 FROM organization_members
-        WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
-    ''', (org_id, user_id))
-
-    if not cursor.fetchone():
         conn.close()
-        return jsonify({'error': 'Access denied to organization'}), 403
+        return jsonify({'error': 'Insufficient permissions'}), 403
 
     try:
-        team_filter = request.args.get('team')
-
-        # Get all documents organized by team
-        query = '''
-            SELECT
-                COALESCE(dc.team, 'Uncategorized') as team,
-                COUNT(DISTINCT d.id) as document_count,
-                json_agg(
-                    json_build_object(
-                        'id', d.id,
-                        'filename', d.filename,
-                        'file_type', d.file_type,
-                        'file_size', d.file_size,
-                        'upload_date', d.upload_date,
-                        'processing_status', d.processing_status,
-                        'doc_type', COALESCE(dc.doc_type, d.file_type),
-                        'project', dc.project,
-                        'confidentiality_level', dc.confidentiality_level,
-                        'tags', dc.tags,
-                        'summary', dc.summary
-                    ) ORDER BY d.upload_date DESC
-                ) as documents
-            FROM documents d
-            LEFT JOIN document_classifications dc ON dc.document_id = d.id
-            WHERE d.organization_id = %s
-              AND d.is_deleted = FALSE
-        '''
-        params = [org_id]
-
-        if team_filter:
-            query += ' AND COALESCE(dc.team, \'Uncategorized\') = %s'
-            params.append(team_filter)
-
-        query += ' GROUP BY COALESCE(dc.team, \'Uncategorized\') ORDER BY COALESCE(dc.team, \'Uncategorized\')'
-
-        cursor.execute(query, params)
-        folders = cursor.fetchall()
-
+        # Forced refresh: re-embeds even if the profile is unchanged, after the debounce window
+        from employee_refresh import queue_employee_refresh
+        queue_employee_refresh(cursor, user_id=target_user_id, org_id=org_id, force=True)
+        conn.commit()
         conn.close()
-
-        # Add 'name' field to each folder for consistency
-        formatted_folders = []
-        for f in folders:
-            folder_dict = dict(f)
-            folder_dict['name'] = folder_dict.get('team', 'Uncategorized')
-            formatted_folders.append(folder_dict)
+        schedule_employee_refresh()
 
         return jsonify({
             'success': True,
-            'org_id': org_id,
-            'view_type': 'by_team',
-            'folders': formatted_folders
+            'message': 'Employee embedding refresh queued',
+            'user_id': target_user_id
         })
 
     except Exception as e:
-        print(f"Error getting team folders: {e}")
+        conn.rollback()
         conn.close()
-        return jsonify({'error': f'Failed to get team folders: {str(e)}'}), 500
-
+        print(f"Error triggering embedding generation: {e}")
+        return jsonify({'error': f'Failed to queue refresh: {str(e)}'}), 500
 
-@app.route('/api/folders/by-project', methods=['GET'])
-@login_required
-def get_folders_by_project():
-    """
-    Get documents organized by project (smart folder view)
 
-    Query params:
-        org_id: Organization ID (required)
-        project: Filter by specific project (optional)
-    """
-    user_id = session['user_id']
-    org_id = request.args.get('org_id', type=int)
+VECTOR_QUANTIZATIONS = ('float32', 'float16', 'int8')
+MAX_VECTOR_DIMENSIONS = 3072  # text-embedding-3-large
 
-    if not org_id:
-        return jsonify({'error': 'Missing required parameter: org_id'}), 400
 
-    # Verify user has access to organization
+def run_vector_reindex(org_id, job_id, dimensions, quantization, rerank):
+    """Background job: rewrite an organization's vectors into its new layout"""
     conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute('''
-        SELECT 1 FROM organization_members
-        WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
-    ''', (org_id, user_id))
-
-    if not cursor.fetchone():
-        conn.close()
-        return jsonify({'error': 'Access denied to organization'}), 403
-
+    cursor = conn.cursor()
     try:
-        project_filter = request.args.get('project')
-
-        query = '''
-            SELECT
-                COALESCE(dc.project, 'Uncategorized') as project,
-                COUNT(DISTINCT d.id) as document_count,
-                json_agg(
-                    json_build_object(
-                        'id', d.id,
-                        'filename', d.filename,
-                        'file_type', d.file_type,
-                        'file_size', d.file_size,
-                        'upload_date', d.upload_date,
-                        'processing_status', d.processing_status,
-                        'doc_type', COALESCE(dc.doc_type, d.file_type),
-                        'team', dc.team,
-                        'confidentiality_level', dc.confidentiality_level,
-                        'tags', dc.tags,
-                        'summary', dc.summary
-                    ) ORDER BY d.upload_date DESC
-                ) as documents
-            FROM documents d
-            LEFT JOIN document_classifications dc ON dc.document_id = d.id
-            WHERE d.organization_id = %s
-              AND d.is_deleted = FALSE
-        '''
-        params = [org_id]
-
-        if project_filter:
-            query += ' AND COALESCE(dc.project, \'Uncategorized\') = %s'
-            params.append(project_filter)
-
-        query += ' GROUP BY COALESCE(dc.project, \'Uncategorized\') ORDER BY COALESCE(dc.project, \'Uncategorized\')'
-
-        cursor.execute(query, params)
-        folders = cursor.fetchall()
+        cursor.execute('''
+            UPDATE processing_jobs SET status = 'running', started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (job_id,))
+        conn.commit()
 
-        conn.close()
+        from local_vector_store import NAMESPACES
+        vector_store = get_vector_store()
+        vector_store.configure(org_id, dimensions, quantization, rerank)
 
-        # Add 'name' field to each folder for consistency
-        formatted_folders = []
-        for f in folders:
-            folder_dict = dict(f)
-            folder_dict['name'] = folder_dict.get('project', 'Uncategorized')
-            formatted_folders.append(folder_dict)
+        results = {}
+        with job_heartbeat(job_id):
+            for position, namespace in enumerate(NAMESPACES):
+                results[namespace] = vector_store.reindex(org_id, namespace)
+                cursor.execute('''
+                    UPDATE processing_jobs SET progress = %s WHERE job_id = %s
+                ''', ((position + 1) * 100 // len(NAMESPACES), job_id))
+                conn.commit()
 
-        return jsonify({
-            'success': True,
-            'org_id': org_id,
-            'view_type': 'by_project',
-            'folders': formatted_folders
-        })
+        cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'completed', progress = 100, result_json = %s, completed_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (json.dumps(results), job_id))
+        conn.commit()
+        print(f"✓ Re-indexed vectors for org {org_id}: {results}")
 
     except Exception as e:
-        print(f"Error getting project folders: {e}")
+        conn.rollback()
+        print(f"Vector re-index failed for org {org_id}: {e}")
+        cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'failed', error_message = %s, completed_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (str(e), job_id))
+        conn.commit()
+    finally:
         conn.close()
-        return jsonify({'error': f'Failed to get project folders: {str(e)}'}), 500
+        invalidate_search_cache(org_id)
 
 
-@app.route('/api/folders/by-type', methods=['GET'])
+@app.route('/api/organizations/<int:org_id>/vector-settings', methods=['PUT'])
 @login_required
-def get_folders_by_type():
+def update_vector_settings(org_id):
     """
-    Get documents organized by document type (smart folder view)
+    Change how an organization's embeddings are stored and re-index existing vectors
 
-    Query params:
-        org_id: Organization ID (required)
-        doc_type: Filter by specific document type (optional)
+    Request body:
+    {
+        "dimensions": 512,         # optional, null keeps the model's full size
+        "quantization": "int8",    # float32 | float16 | int8
+        "rerank": false            # keep a float32 copy to re-rank candidates (more disk)
+    }
+
+    Returns the job_id of the re-index; its result reports searched-matrix and
+    total on-disk sizes before and after and recall@10 against the previous layout.
     """
     user_id = session['user_id']
-    org_id = request.args.get('org_id', type=int)
+    data = request.json or {}
 
-    if not org_id:
-        return jsonify({'error': 'Missing required parameter: org_id'}), 400
+    dimensions = data.get('dimensions')
+    quantization = data.get('quantization', 'float32')
+    rerank = bool(data.get('rerank', False))
+
+    if dimensions is not None and (not isinstance(dimensions, int) or not 64 <= dimensions <= MAX_VECTOR_DIMENSIONS):
+        return jsonify({'error': f'dimensions must be an integer between 64 and {MAX_VECTOR_DIMENSIONS}'}), 400
+    if quantization not in VECTOR_QUANTIZATIONS:
+        return jsonify({'error': f"quantization must be one of: {', '.join(VECTOR_QUANTIZATIONS)}"}), 400
+    if os.environ.get('VECTOR_STORE_BACKEND', 'pinecone').lower() != 'local':
+        return jsonify({'error': 'Vector settings are only supported by the local vector store'}), 400
 
-    # Verify user has access to organization
     conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT role FROM organization_members
+            WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
+        ''', (org_id, user_id))
+        member = cursor.fetchone()
 
-    cursor.execute('''
-        SELECT 1 FROM organization_members
-        WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
-    ''', (org_id, user_id))
+        if not member or member['role'] != 'owner':
+            return jsonify({'error': 'Only the organization owner can change vector settings'}), 403
 
-    if not cursor.fetchone():
-        conn.close()
-        return jsonify({'error': 'Access denied to organization'}), 403
+        fail_stale_jobs(cursor, org_id, 'vector_reindex')
+        cursor.execute('''
+            SELECT 1 FROM processing_jobs
+            WHERE organization_id = %s AND job_type = 'vector_reindex' AND status IN ('queued', 'running')
+        ''', (org_id,))
+        if cursor.fetchone():
+            return jsonify({'error': 'A vector re-index is already running for this organization'}), 409
 
-    try:
-        doc_type_filter = request.args.get('doc_type')
+        cursor.execute('''
+            UPDATE organizations
+            SET vector_dimensions = %s, vector_quantization = %s, vector_rerank = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        ''', (dimensions, quantization, rerank, org_id))
 
-        query = '''
-            SELECT
-                dc.doc_type,
-                COUNT(DISTINCT d.id) as document_count,
-                json_agg(
-                    json_build_object(
-                        'id', d.id,
-                        'filename', d.filename,
-                        'file_type', d.file_type,
-                        'upload_date', d.upload_date,
-                        'team', dc.team,
-                        'project', dc.project,
-                        'confidentiality_level', dc.confidentiality_level,
-                        'tags', dc.tags,
-                        'summary', dc.summary
-                    ) ORDER BY d.upload_date DESC
-                ) as documents
-            FROM documents d
-            INNER JOIN document_classifications dc ON dc.document_id = d.id
-            WHERE d.organization_id = %s
-              AND d.is_deleted = FALSE
-              AND dc.doc_type IS NOT NULL
-        '''
-        params = [org_id]
+        job_id = f"vector_reindex_{org_id}_{secrets.token_hex(8)}"
+        cursor.execute('''
+            INSERT INTO processing_jobs (organization_id, job_type, job_id, status)
+            VALUES (%s, 'vector_reindex', %s, 'queued')
+        ''', (org_id, job_id))
+        conn.commit()
 
-        if doc_type_filter:
-            query += ' AND dc.doc_type = %s'
-            params.append(doc_type_filter)
+    except Exception as e:
+        conn.rollback()
+        print(f"Error updating vector settings: {e}")
+        return jsonify({'error': 'Failed to update vector settings'}), 500
+    finally:
+        conn.close()
 
-        query += ' GROUP BY dc.doc_type ORDER BY dc.doc_type'
+    thread = threading.Thread(target=run_vector_reindex, args=(org_id, job_id, dimensions, quantization, rerank))
+    thread.daemon = True
+    thread.start()
 
-        cursor.execute(query, params)
-        folders = cursor.fetchall()
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'settings': {'dimensions': dimensions, 'quantization': quantization, 'rerank': rerank}
+    }), 202
 
-        conn.close()
 
-        return jsonify({
-            'success': True,
-            'org_id': org_id,
-            'view_type': 'by_type',
-            'folders': [dict(f) for f in folders]
-        })
+def run_bulk_reembed(org_id, job_id):
+    """Background job: run or resume a bulk re-embedding job"""
+    try:
+        from bulk_reembed import BulkReembedJob
 
+        job = BulkReembedJob(get_db_connection, get_vector_store())
+        job.run(org_id, job_id)
     except Exception as e:
-        print(f"Error getting type folders: {e}")
-        conn.close()
-        return jsonify({'error': f'Failed to get type folders: {str(e)}'}), 500
+        print(f"Bulk re-embedding {job_id} stopped: {e}")
+    finally:
+        invalidate_search_cache(org_id)
 
 
-@app.route('/api/folders/by-date', methods=['GET'])
+@app.route('/api/organizations/<int:org_id>/reembed', methods=['POST'])
 @login_required
-def get_folders_by_date():
+def start_bulk_reembed(org_id):
     """
-    Get documents organized by time period (smart folder view)
+    Re-embed (and optionally re-chunk) every document of an organization into a
+    shadow index and swap it in when done
 
-    Query params:
-        org_id: Organization ID (required)
-        time_period: Filter by specific period like "2024-Q1", "2024-03" (optional)
+    Request body (all optional):
+    {
+        "model": "text-embedding-3-large",   # must be the query embedding model
+        "dimensions": 1024,
+        "rechunk": true,
+        "chunk_tokens": 400,
+        "overlap_tokens": 40,
+        "restart": false       # abandon an unfinished job instead of resuming it
+    }
+
+    An unfinished job (queued, running or failed) is resumed from its last
+    checkpoint unless restart is set.
     """
     user_id = session['user_id']
-    org_id = request.args.get('org_id', type=int)
-
-    if not org_id:
-        return jsonify({'error': 'Missing required parameter: org_id'}), 400
+    data = request.json or {}
+
+    if os.environ.get('VECTOR_STORE_BACKEND', 'pinecone').lower() != 'local':
+        return jsonify({'error': 'Bulk re-embedding is only supported by the local vector store'}), 400
+
+    settings = {}
+    if 'model' in data:
+        # Queries are embedded with one model for every organization; vectors from another would not match
+        if data['model'] != QUERY_EMBEDDING_MODEL:
+            return jsonify({'error': f'model must be {QUERY_EMBEDDING_MODEL}, the model search queries are embedded with'}), 400
+        settings['model'] = data['model']
+    if data.get('dimensions') is not None:
+        if not isinstance(data['dimensions'], int) or not 64 <= data['dimensions'] <= MAX_VECTOR_DIMENSIONS:
+            return jsonify({'error': f'dimensions must be an integer between 64 and {MAX_VECTOR_DIMENSIONS}'}), 400
+        settings['dimensions'] = data['dimensions']
+    if data.get('rechunk'):
+        settings['rechunk'] = True
+        settings['chunk_tokens'] = data.get('chunk_tokens', 500)
+        settings['overlap_tokens'] = data.get('overlap_tokens', 50)
+        if (not isinstance(settings['chunk_tokens'], int) or not isinstance(settings['overlap_tokens'], int)
+                or not 50 <= settings['chunk_tokens'] <= 8000
+                or not 0 <= settings['overlap_tokens'] < settings['chunk_tokens']):
+            return jsonify({'error': 'chunk_tokens must be 50-8000 and overlap_tokens smaller than chunk_tokens'}), 400
 
-    # Verify user has access to organization
     conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute('''
-        SELECT 1 FROM organization_members
-        WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
-    ''', (org_id, user_id))
-
-    if not cursor.fetchone():
-        conn.close()
-        return jsonify({'error': 'Access denied to organization'}), 403
-
+    cursor = conn.cursor()
     try:
-        time_period_filter = request.args.get('time_period')
+        cursor.execute('''
+            SELECT role FROM organization_members
+            WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
+        ''', (org_id, user_id))
+        member = cursor.fetchone()
 
-        query = '''
-            SELECT
-                dc.time_period,
-                COUNT(DISTINCT d.id) as document_count,
-                json_agg(
-                    json_build_object(
-                        'id', d.id,
-                        'filename', d.filename,
-                        'file_type', d.file_type,
-                        'upload_date', d.upload_date,
-                        'doc_type', dc.doc_type,
-                        'team', dc.team,
-                        'project', dc.project,
-                        'confidentiality_level', dc.confidentiality_level,
-                        'tags', dc.tags,
-                        'summary', dc.summary
-                    ) ORDER BY d.upload_date DESC
-                ) as documents
-            FROM documents d
-            INNER JOIN document_classifications dc ON dc.document_id = d.id
-            WHERE d.organization_id = %s
-              AND d.is_deleted = FALSE
-              AND dc.time_period IS NOT NULL
-        '''
-        params = [org_id]
+        if not member or member['role'] != 'owner':
+            return jsonify({'error': 'Only the organization owner can re-embed documents'}), 403
 
-        if time_period_filter:
-            query += ' AND dc.time_period = %s'
-            params.append(time_period_filter)
+        from bulk_reembed import JOB_TYPE, create_reembed_job
 
-        query += ' GROUP BY dc.time_period ORDER BY dc.time_period DESC'
+        cursor.execute('''
+            SELECT job_id FROM processing_jobs
+            WHERE organization_id = %s AND job_type = %s
+              AND status IN ('queued', 'running', 'failed') AND completed_at IS NULL
+            ORDER BY created_at DESC
+            LIMIT 1
+        ''', (org_id, JOB_TYPE))
+        unfinished = cursor.fetchone()
 
-        cursor.execute(query, params)
-        folders = cursor.fetchall()
+        resumed = bool(unfinished) and not data.get('restart')
+        if resumed:
+            job_id = unfinished['job_id']
+        else:
+            if unfinished:
+                cursor.execute('''
+                    UPDATE processing_jobs
+                    SET status = 'failed', error_message = 'Abandoned for a new job', completed_at = CURRENT_TIMESTAMP
+                    WHERE job_id = %s
+                ''', (unfinished['job_id'],))
+            job_id = create_reembed_job(cursor, org_id, settings)
+        conn.commit()
 
+    except Exception as e:
+        conn.rollback()
+        print(f"Error starting bulk re-embedding: {e}")
+        return jsonify({'error': 'Failed to start re-embedding'}), 500
+    finally:
         conn.close()
 
-        return jsonify({
-            'success': True,
-            'org_id': org_id,
-            'view_type': 'by_date',
-            'folders': [dict(f) for f in folders]
-        })
+    # A job that is still running elsewhere keeps its advisory lock and this run exits immediately
+    thread = threading.Thread(target=run_bulk_reembed, args=(org_id, job_id))
+    thread.daemon = True
+    thread.start()
 
-    except Exception as e:
-        print(f"Error getting date folders: {e}")
-        conn.close()
-        return jsonify({'error': f'Failed to get date folders: {str(e)}'}), 500
+    return jsonify({'success': True, 'job_id': job_id, 'resumed': resumed}), 202
 
 
-@app.route('/api/folders/by-person', methods=['GET'])
-@login_required
-def get_folders_by_person():
+# ============================================================================
+# SMART FOLDERS API (SPRINT 3)
+# ============================================================================
+
+def smart_folder_response(view):
     """
-    Get documents organized by mentioned people (smart folder view)
+    Shared implementation of the /api/folders/by-* views
+
+    Without a folder parameter, returns folder names and document counts only
+    (from the materialized folder_counts). With one (team, project, doc_type,
+    time_period or person), returns a page of that folder's documents.
 
     Query params:
         org_id: Organization ID (required)
-        person: Filter by specific person name (optional)
+        <folder param>: Folder to list (optional)
+        limit: Page size (default 50, max 200)
+        cursor: next_cursor from the previous page
     """
+    from smart_folders import DEFAULT_PAGE_SIZE, FOLDER_VIEWS, get_folder_summaries, list_folder_documents
+
     user_id = session['user_id']
     org_id = request.args.get('org_id', type=int)
+    spec = FOLDER_VIEWS[view]
 
     if not org_id:
         return jsonify({'error': 'Missing required parameter: org_id'}), 400
@@ -17905,57 +19772,79 @@ def get_folders_by_person():
         return jsonify({'error': 'Access denied to organization'}), 403
 
     try:
-        person_filter = request.args.get('person')
-
-        # Unnest the mentioned_people array to create folders for each person
-        query = '''
-            SELECT
-                person,
-                COUNT(DISTINCT d.id) as document_count,
-                json_agg(
-                    json_build_object(
-                        'id', d.id,
-                        'filename', d.filename,
-                        'file_type', d.file_type,
-                        'upload_date', d.upload_date,
-                        'doc_type', dc.doc_type,
-                        'team', dc.team,
-                        'project', dc.project,
-                        'confidentiality_level', dc.confidentiality_level,
-                        'tags', dc.tags,
-                        'summary', dc.summary
-                    ) ORDER BY d.upload_date DESC
-                ) as documents
-            FROM documents d
-            INNER JOIN document_classifications dc ON dc.document_id = d.id,
-            jsonb_array_elements_text(dc.mentioned_people) as person
-            WHERE d.organization_id = %s
-              AND d.is_deleted = FALSE
-        '''
-        params = [org_id]
-
-        if person_filter:
-            query += ' AND person = %s'
-            params.append(person_filter)
-
-        query += ' GROUP BY person ORDER BY person'
+        folder = request.args.get(spec['param'])
 
-        cursor.execute(query, params)
-        folders = cursor.fetchall()
+        if folder is None:
+            folders = get_folder_summaries(conn, org_id, view, get_db_connection)
+            conn.close()
+            for f in folders:
+                f[spec['param']] = f['name']
+            return jsonify({
+                'success': True,
+                'org_id': org_id,
+                'view_type': f'by_{view}',
+                'folders': folders
+            })
 
+        try:
+            page = list_folder_documents(
+                cursor, org_id, view, folder,
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                page_cursor=request.args.get('cursor')
+            )
+        except ValueError:
+            conn.close()
+            return jsonify({'error': 'Invalid cursor'}), 400
         conn.close()
 
         return jsonify({
             'success': True,
             'org_id': org_id,
-            'view_type': 'by_person',
-            'folders': [dict(f) for f in folders]
+            'view_type': f'by_{view}',
+            'folder': folder,
+            'documents': page['documents'],
+            'next_cursor': page['next_cursor']
         })
 
     except Exception as e:
-        print(f"Error getting person folders: {e}")
+        print(f"Error getting {view} folders: {e}")
         conn.close()
-        return jsonify({'error': f'Failed to get person folders: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to get {view} folders: {str(e)}'}), 500
+
+
+@app.route('/api/folders/by-team', methods=['GET'])
+@login_required
+def get_folders_by_team():
+    """Smart folders by team; ?team=<name> lists one folder's documents"""
+    return smart_folder_response('team')
+
+
+@app.route('/api/folders/by-project', methods=['GET'])
+@login_required
+def get_folders_by_project():
+    """Smart folders by project; ?project=<name> lists one folder's documents"""
+    return smart_folder_response('project')
+
+
+@app.route('/api/folders/by-type', methods=['GET'])
+@login_required
+def get_folders_by_type():
+    """Smart folders by document type; ?doc_type=<type> lists one folder's documents"""
+    return smart_folder_response('type')
+
+
+@app.route('/api/folders/by-date', methods=['GET'])
+@login_required
+def get_folders_by_date():
+    """Smart folders by time period; ?time_period=<period> lists one folder's documents"""
+    return smart_folder_response('date')
+
+
+@app.route('/api/folders/by-person', methods=['GET'])
+@login_required
+def get_folders_by_person():
+    """Smart folders by mentioned person; ?person=<name> lists one folder's documents"""
+    return smart_folder_response('person')
 
 
 @app.route('/api/documents/<int:doc_id>/classification', methods=['GET'])
@@ -18052,6 +19941,7 @@ def reclassify_document(doc_id):
 
         # Trigger classification task
         task = classify_document_task.delay(doc_id)
+        invalidate_search_cache(doc['organization_id'])
 
         return jsonify({
             'success': True,
@@ -18065,6 +19955,68 @@ def reclassify_document(doc_id):
         return jsonify({'error': f'Failed to start re-classification: {str(e)}'}), 500
 
 
+def run_reclassify_all_job(org_id, job_id):
+    """Background job: reclassify every processed document of an organization"""
+    try:
+        from batch_classifier import run_reclassify_all
+        with job_heartbeat(job_id):
+            run_reclassify_all(get_db_connection, org_id, job_id)
+    except Exception as e:
+        print(f"Reclassification {job_id} failed: {e}")
+    finally:
+        invalidate_search_cache(org_id)
+
+
+@app.route('/api/organizations/<int:org_id>/reclassify', methods=['POST'])
+@login_required
+def reclassify_all_documents(org_id):
+    """
+    Reclassify every processed document of an organization
+
+    Documents are classified several per LLM request; follow progress with
+    GET /api/jobs/<job_id>/status.
+    """
+    from batch_classifier import JOB_TYPE, create_reclassify_job
+
+    user_id = session['user_id']
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT role FROM organization_members
+            WHERE organization_id = %s AND user_id = %s AND is_active = TRUE
+        ''', (org_id, user_id))
+        member = cursor.fetchone()
+
+        if not member or member['role'] not in ['owner', 'admin']:
+            return jsonify({'error': 'Only organization owners and admins can reclassify all documents'}), 403
+
+        fail_stale_jobs(cursor, org_id, JOB_TYPE)
+        cursor.execute('''
+            SELECT 1 FROM processing_jobs
+            WHERE organization_id = %s AND job_type = %s AND status IN ('queued', 'running')
+        ''', (org_id, JOB_TYPE))
+        if cursor.fetchone():
+            return jsonify({'error': 'A reclassification is already running for this organization'}), 409
+
+        job_id = create_reclassify_job(cursor, org_id)
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error starting reclassification: {e}")
+        return jsonify({'error': 'Failed to start reclassification'}), 500
+    finally:
+        conn.close()
+
+    thread = threading.Thread(target=run_reclassify_all_job, args=(org_id, job_id))
+    thread.daemon = True
+    thread.start()
+
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+
 # ============================================================================
 # HEALTH CHECK & MONITORING ENDPOINTS
 # ============================================================================
@@ -18105,18 +20057,18 @@ def health_check():
         health_status['checks']['redis'] = f'unhealthy: {str(e)}'
         health_status['status'] = 'degraded'
 
-    # Check Pinecone connection (optional, don't fail health check if missing)
+    # Check vector store (optional, don't fail health check if missing)
+    vector_backend = os.environ.get('VECTOR_STORE_BACKEND', 'pinecone').lower()
     try:
-        if os.environ.get('PINECONE_API_KEY'):
-            from vector_store import VectorStore
-            vector_store = VectorStore(index_name="flock-knowledge-base")
-            # Just checking if we can initialize
-            health_status['checks']['pinecone'] = 'healthy'
+        if vector_backend == 'local' or os.environ.get('PINECONE_API_KEY'):
+            # Built once per worker; only the first check pays for initialization
+            get_vector_store()
+            health_status['checks'][vector_backend] = 'healthy'
         else:
-            health_status['checks']['pinecone'] = 'not_configured'
+            health_status['checks'][vector_backend] = 'not_configured'
     except Exception as e:
-        health_status['checks']['pinecone'] = f'degraded: {str(e)}'
-        # Don't mark overall status as degraded for Pinecone
+        health_status['checks'][vector_backend] = f'degraded: {str(e)}'
+        # Don't mark overall status as degraded for the vector store
 
     # Check OpenAI API key
     if os.environ.get('OPENAI_API_KEY'):
@@ -18229,19 +20181,22 @@ def system_status():
         status['services']['redis'] = f'error: {str(e)}'
         status['services']['celery'] = 'unavailable'
 
-    # Pinecone stats
+    # Vector store stats
+    vector_backend = os.environ.get('VECTOR_STORE_BACKEND', 'pinecone').lower()
     try:
-        if os.environ.get('PINECONE_API_KEY'):
-            from vector_store import VectorStore
-            vector_store = VectorStore(index_name="flock-knowledge-base")
+        if vector_backend == 'local' or os.environ.get('PINECONE_API_KEY'):
+            get_vector_store()
 
             # Note: Getting stats for a specific org requires org_id
             # For system-wide stats, we'd need to aggregate
-            status['services']['pinecone'] = 'operational'
+            status['services'][vector_backend] = 'operational'
         else:
-            status['services']['pinecone'] = 'not_configured'
+            status['services'][vector_backend] = 'not_configured'
     except Exception as e:
-        status['services']['pinecone'] = f'error: {str(e)}'
+        status['services'][vector_backend] = f'error: {str(e)}'
+
+    # Which shared services this worker has built so far
+    status['services']['worker'] = {'pid': os.getpid(), 'instances': get_service_registry().status()}
 
     return jsonify(status)
 
@@ -18250,23 +20205,59 @@ def system_status():
 # PHASE 7: CHAT API ENDPOINTS
 # ============================================================================
 
+CONVERSATION_PAGE_SIZE = 30
+
+
+def refresh_conversation_preview(conversation_id):
+    """
+    Recompute a conversation's list preview and message count from its messages,
+    for writers that store messages without maintaining them (the orchestrator)
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE chat_conversations
+            SET last_message_preview = (
+                    SELECT LEFT(content, 200) FROM chat_messages
+                    WHERE conversation_id = %s ORDER BY id DESC LIMIT 1
+                ),
+                message_count = (SELECT COUNT(*) FROM chat_messages WHERE conversation_id = %s)
+            WHERE id = %s
+        ''', (conversation_id, conversation_id, conversation_id))
+        conn.commit()
+    except Exception as e:
+        print(f"Error refreshing conversation preview: {e}")
+    finally:
+        conn.close()
+
+
 @app.route('/api/chat/conversations', methods=['GET'])
 @login_required
 def get_conversations():
     """
-    Get all conversations for the user in their organization
+    Get the user's conversations in their organization, most recent first
 
     Query params:
         org_id: Organization ID (required)
         include_archived: Include archived conversations (default: false)
+        limit: Page size (default 30, max 100)
+        cursor: next_cursor from the previous page
     """
     user_id = session['user_id']
     org_id = request.args.get('org_id', type=int)
     include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+    limit = max(1, min(request.args.get('limit', CONVERSATION_PAGE_SIZE, type=int), 100))
+    page_cursor = request.args.get('cursor')
 
     if not org_id:
         return jsonify({'error': 'org_id is required'}), 400
 
+    # Keyset on (last_message_at, id)
+    after = decode_page_cursor(page_cursor)
+    if page_cursor and (not after or len(after) != 2):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
     # Verify user has access to organization
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -18280,32 +20271,41 @@ def get_conversations():
         conn.close()
         return jsonify({'error': 'Access denied'}), 403
 
-    # Get conversations
-    archived_filter = '' if include_archived else 'AND is_archived = FALSE'
-
-    cursor.execute(f'''
+    # Get one page of conversations
+    query = '''
         SELECT
             cc.id,
             cc.conversation_title,
             cc.created_at,
             cc.last_message_at,
             cc.is_archived,
-            (
-                SELECT content
-                FROM chat_messages
-                WHERE conversation_id = cc.id
-                ORDER BY timestamp DESC
-                LIMIT 1
-            ) as last_message_preview
+            cc.last_message_preview,
+            COALESCE(cc.message_count, 0) AS message_count
         FROM chat_conversations cc
-        WHERE cc.organization_id = %s AND cc.user_id = %s {archived_filter}
-        ORDER BY cc.last_message_at DESC
-    ''', (org_id, user_id))
+        WHERE cc.organization_id = %s AND cc.user_id = %s
+    '''
+    params = [org_id, user_id]
+    if not include_archived:
+        query += ' AND cc.is_archived = FALSE'
+    if after:
+        query += ' AND (cc.last_message_at, cc.id) < (%s, %s)'
+        params.extend(after)
+    query += ' ORDER BY cc.last_message_at DESC, cc.id DESC LIMIT %s'
+    params.append(limit + 1)
+
+    cursor.execute(query, params)
 
     conversations = cursor.fetchall()
     conn.close()
 
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        last = conversations[-1]
+        next_cursor = encode_page_cursor(last['last_message_at'], last['id'])
+
     return jsonify({
+        'next_cursor': next_cursor,
         'conversations': [
             {
                 'id': conv['id'],
@@ -18315,7 +20315,8 @@ def get_conversations():
                     else conv['last_message_preview'],
                 'last_message_at': conv['last_message_at'].isoformat() if conv['last_message_at'] else None,
                 'created_at': conv['created_at'].isoformat() if conv['created_at'] else None,
-                'is_archived': conv['is_archived']
+                'is_archived': conv['is_archived'],
+                'message_count': conv['message_count']
             }
             for conv in conversations
         ]
@@ -18377,8 +20378,18 @@ def create_conversation():
 @app.route('/api/chat/<int:conversation_id>/messages', methods=['GET'])
 @login_required
 def get_messages(conversation_id):
-    """Get all messages in a conversation"""
+    """
+    Get a conversation's messages, newest page first
+
+    Query params:
+        limit: Page size (default 50, max 200)
+        before: next_cursor from the previous page (a message id); pages go back in time
+
+    Messages within a page are oldest first.
+    """
     user_id = session['user_id']
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    before = request.args.get('before', type=int)
 
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -18397,23 +20408,28 @@ def get_messages(conversation_id):
         conn.close()
         return jsonify({'error': 'Conversation not found or access denied'}), 404
 
-    # Get messages
+    # Get one page of messages, keyset on id
     cursor.execute('''
         SELECT
             id, role, content, reasoning_json,
             source_documents_json, source_employees_json, source_external_json,
             timestamp
         FROM chat_messages
-        WHERE conversation_id = %s
-        ORDER BY timestamp ASC
-    ''', (conversation_id,))
+        WHERE conversation_id = %s AND (%s::int IS NULL OR id < %s)
+        ORDER BY id DESC
+        LIMIT %s
+    ''', (conversation_id, before, before, limit + 1))
 
     messages = cursor.fetchall()
     conn.close()
 
+    has_more = len(messages) > limit
+    messages = list(reversed(messages[:limit]))
+
     return jsonify({
         'conversation_id': conversation_id,
         'title': conversation['conversation_title'],
+        'next_cursor': messages[0]['id'] if has_more else None,
         'messages': [
             {
                 'id': msg['id'],
@@ -18476,18 +20492,9 @@ def send_message(conversation_id):
     org_id = conversation['organization_id']
 
     try:
-        # Initialize services
-        from vector_store import VectorStore
-        from embedding_service import EmbeddingService
-
-        vector_store = VectorStore(index_name="flock-knowledge-base")
-        embedding_service = EmbeddingService(model="text-embedding-3-large")
-
         if use_rag:
             # Simple RAG pipeline
-            from rag_pipeline import RAGPipeline
-
-            rag = RAGPipeline(vector_store, embedding_service)
+            rag = get_service_registry().get('rag_pipeline')
             result = rag.query(org_id=org_id, query=message, top_k=10)
 
             # Store messages
@@ -18516,11 +20523,14 @@ def send_message(conversation_id):
 
             assistant_msg = cursor.fetchone()
 
-            # Update conversation timestamp
+            # Update conversation timestamp and list preview
             cursor.execute('''
-                UPDATE chat_conversations SET last_message_at = NOW()
+                UPDATE chat_conversations
+                SET last_message_at = NOW(),
+                    last_message_preview = LEFT(%s, 200),
+                    message_count = COALESCE(message_count, 0) + 2
                 WHERE id = %s
-            ''', (conversation_id,))
+            ''', (result['answer'], conversation_id))
 
             conn.commit()
             conn.close()
@@ -18538,15 +20548,14 @@ def send_message(conversation_id):
             })
         else:
             # Full multi-agent system
-            from chat_agents import MasterOrchestrator
-
-            orchestrator = MasterOrchestrator(vector_store, embedding_service)
+            orchestrator = get_service_registry().get('orchestrator')
             result = orchestrator.process_query(
                 conversation_id=conversation_id,
                 org_id=org_id,
                 user_id=user_id,
                 query=message
             )
+            refresh_conversation_preview(conversation_id)
 
             return jsonify({
                 'answer': result['answer'],
@@ -18560,6 +20569,63 @@ def send_message(conversation_id):
         return jsonify({'error': f'Error processing message: {str(e)}'}), 500
 
 
+@app.route('/api/chat/<int:conversation_id>/messages/stream', methods=['POST'])
+@login_required
+def stream_message(conversation_id):
+    """
+    Send a message and stream the answer as Server-Sent Events
+
+    Request body:
+    {
+        "message": "User's question"
+    }
+
+    Events: "sources" (retrieved documents and employees, before generation starts),
+    "token" ({"text": ...} per answer delta), then "done" ({"message_id",
+    "timestamp", "usage"}) or "error". Both messages are stored in
+    chat_messages when the stream closes.
+    """
+    user_id = session['user_id']
+    data = request.json
+
+    if not data or 'message' not in data:
+        return jsonify({'error': 'message is required'}), 400
+
+    message = data['message']
+
+    if not message or not message.strip():
+        return jsonify({'error': 'Message cannot be empty'}), 400
+
+    # Verify access
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT cc.organization_id, om.user_id
+        FROM chat_conversations cc
+        JOIN organization_members om ON cc.organization_id = om.organization_id
+        WHERE cc.id = %s AND cc.user_id = %s AND om.user_id = %s AND om.is_active = TRUE
+    ''', (conversation_id, user_id, user_id))
+
+    conversation = cursor.fetchone()
+    conn.close()
+
+    if not conversation:
+        return jsonify({'error': 'Conversation not found or access denied'}), 404
+
+    try:
+        stream = get_service_registry().get('chat_answer_stream')
+    except Exception as e:
+        print(f"Error starting streamed answer: {e}")
+        return jsonify({'error': f'Error processing message: {str(e)}'}), 500
+
+    return Response(
+        stream_with_context(stream.events(conversation_id, conversation['organization_id'], message)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/chat/<int:conversation_id>/archive', methods=['POST'])
 @login_required
 def archive_conversation(conversation_id):
@@ -18631,6 +20697,7 @@ def unarchive_conversation(conversation_id):
 if __name__ == '__main__':
     # Initialize database
     init_database()
+    warm_up_services()
     
     # Create necessary directories
     os.makedirs('data', exist_ok=True)
@@ -0,0 +1,389 @@
+"""
+Batch Document Classification
+
+Classifies many documents per LLM call instead of one:
+
+1. Each document is represented by its stored summary or, without one, its
+   first chunks, truncated to MAX_DOCUMENT_TOKENS
+2. Documents are packed into requests of up to BATCH_DOCUMENTS documents and
+   MAX_REQUEST_TOKENS input tokens; each request asks for a JSON object with
+   one classification per document id
+3. Requests run concurrently under a shared per-minute rate limit and are
+   retried with backoff; documents missing from a response, or a request
+   rejected for its input (400), are retried in smaller requests, then on
+   their own. Any other client error (bad key, permissions, unknown model)
+   fails the job at once instead of being bisected
+4. The classifications are written to document_classifications with a
+   single execute_values upsert
+
+The org-wide "reclassify all" job walks the organization's processed
+documents in id order and reports progress in processing_jobs. The folder
+count triggers on document_classifications keep smart folders up to date.
+
+Usage:
+    classifier = BatchClassifier()
+    results = classifier.classify_documents(cursor, org_id, doc_ids)
+    write_classifications(cursor, org_id, results)
+
+    run_reclassify_all(get_db_connection, org_id, job_id)
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import random
+import secrets
+import time
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from embedding_batcher import SharedRateLimiter, TokenCounter, pack_batches
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = 'reclassify_all'
+CLASSIFICATION_MODEL = os.environ.get('CLASSIFICATION_MODEL', 'gpt-4o-mini')
+BATCH_DOCUMENTS = int(os.environ.get('CLASSIFICATION_BATCH_DOCUMENTS', 10))
+MAX_REQUEST_TOKENS = 12000
+MAX_DOCUMENT_TOKENS = 1200
+FIRST_CHUNKS = 3
+JOB_PAGE_SIZE = 200
+MAX_RETRIES = 5
+
+CONFIDENTIALITY_LEVELS = ('public', 'internal', 'confidential', 'restricted')
+MAX_KNOWN_LABELS = 30
+
+SYSTEM_PROMPT = """You classify an organization's documents. For every document you are given, return one
+classification. Reuse the organization's existing team and project names when one fits.
+
+Respond with a JSON object: {"classifications": [{
+    "document_id": <id as given>,
+    "team": string or null,
+    "project": string or null,
+    "doc_type": short label such as "Meeting Notes", "Report", "Proposal", "Policy",
+    "time_period": "YYYY-QN" the content refers to, or null,
+    "confidentiality_level": one of "public", "internal", "confidential", "restricted",
+    "mentioned_people": [full names],
+    "tags": [up to 5 short tags],
+    "summary": one or two sentences,
+    "confidence": {"team": 0-1, "project": 0-1, "doc_type": 0-1}
+}, ...]}"""
+
+
+def load_organization_context(cursor, org_id: int) -> Dict:
+    """Organization name and the team/project labels already in use, most common first"""
+    cursor.execute('SELECT name, use_case FROM organizations WHERE id = %s', (org_id,))
+    org = cursor.fetchone() or {}
+
+    context = {'name': org.get('name'), 'use_case': org.get('use_case')}
+    for column in ('team', 'project'):
+        cursor.execute(f'''
+            SELECT {column} AS label FROM document_classifications
+            WHERE organization_id = %s AND {column} IS NOT NULL
+            GROUP BY {column}
+            ORDER BY COUNT(*) DESC
+            LIMIT %s
+        ''', (org_id, MAX_KNOWN_LABELS))
+        context[f'{column}s'] = [row['label'] for row in cursor.fetchall()]
+    return context
+
+
+def load_document_inputs(cursor, org_id: int, doc_ids: List[int]) -> List[Dict]:
+    """[{'document_id', 'filename', 'text'}, ...] - the stored summary, else the first chunks"""
+    cursor.execute('''
+        SELECT d.id, d.filename, dc.summary,
+               (SELECT string_agg(c.chunk_text, E'\\n' ORDER BY c.chunk_index)
+                FROM document_chunks c
+                WHERE c.document_id = d.id AND c.chunk_index < %s) AS first_chunks
+        FROM documents d
+        LEFT JOIN document_classifications dc ON dc.document_id = d.id
+        WHERE d.organization_id = %s AND d.id = ANY(%s) AND d.is_deleted = FALSE
+        ORDER BY d.id
+    ''', (FIRST_CHUNKS, org_id, doc_ids))
+
+    return [{
+        'document_id': row['id'],
+        'filename': row['filename'],
+        'text': row['summary'] or row['first_chunks'] or '',
+    } for row in cursor.fetchall()]
+
+
+def normalize_classification(raw: Dict) -> Dict:
+    """Coerce one model answer to the document_classifications columns"""
+    def label(value, limit=200):
+        return (str(value).strip()[:limit] or None) if value is not None else None
+
+    def string_list(value, limit):
+        if not isinstance(value, list):
+            return []
+        return [str(item).strip() for item in value if str(item).strip()][:limit]
+
+    confidentiality = str(raw.get('confidentiality_level') or '').lower()
+    confidence = raw.get('confidence') if isinstance(raw.get('confidence'), dict) else {}
+
+    return {
+        'team': label(raw.get('team')),
+        'project': label(raw.get('project')),
+        'doc_type': label(raw.get('doc_type')),
+        'time_period': label(raw.get('time_period')),
+        'confidentiality_level': confidentiality if confidentiality in CONFIDENTIALITY_LEVELS else 'internal',
+        'mentioned_people': string_list(raw.get('mentioned_people'), 50),
+        'tags': string_list(raw.get('tags'), 5),
+        'summary': label(raw.get('summary'), 2000),
+        'confidence_scores': confidence,
+    }
+
+
+def write_classifications(cursor, org_id: int, classifications: Dict[int, Dict]) -> int:
+    """Upsert {document_id: classification} into document_classifications in one statement"""
+    if not classifications:
+        return 0
+
+    rows = [(
+        doc_id, org_id, c['team'], c['project'], c['doc_type'], c['time_period'], c['confidentiality_level'],
+        json.dumps(c['mentioned_people']), json.dumps(c['tags']), c['summary'], json.dumps(c['confidence_scores']),
+    ) for doc_id, c in classifications.items()]
+
+    execute_values(cursor, '''
+        INSERT INTO document_classifications (
+            document_id, organization_id, team, project, doc_type, time_period, confidentiality_level,
+            mentioned_people, tags, summary, confidence_scores, classified_at
+        )
+        VALUES %s
+        ON CONFLICT (document_id)
+        DO UPDATE SET organization_id = EXCLUDED.organization_id,
+                      team = EXCLUDED.team,
+                      project = EXCLUDED.project,
+                      doc_type = EXCLUDED.doc_type,
+                      time_period = EXCLUDED.time_period,
+                      confidentiality_level = EXCLUDED.confidentiality_level,
+                      mentioned_people = EXCLUDED.mentioned_people,
+                      tags = EXCLUDED.tags,
+                      summary = COALESCE(EXCLUDED.summary, document_classifications.summary),
+                      confidence_scores = EXCLUDED.confidence_scores,
+                      classified_at = CURRENT_TIMESTAMP
+    ''', rows, template='(%s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb, %s, %s::jsonb, CURRENT_TIMESTAMP)',
+        page_size=len(rows))
+    return len(rows)
+
+
+class BatchClassifier:
+    """Several documents per structured chat completion, concurrent and retrying"""
+
+    def __init__(self, model: str = CLASSIFICATION_MODEL, batch_documents: int = BATCH_DOCUMENTS,
+                 max_concurrency: Optional[int] = None, rate_limiter: Optional[SharedRateLimiter] = None,
+                 client=None):
+        self.model = model
+        self.batch_documents = batch_documents
+        self.max_concurrency = max_concurrency or int(os.environ.get('CLASSIFICATION_CONCURRENCY', 4))
+        self.rate_limiter = rate_limiter or SharedRateLimiter(
+            requests_per_minute=int(os.environ.get('CLASSIFICATION_RATE_LIMIT_PER_MINUTE', 60)),
+            tokens_per_minute=int(os.environ.get('CLASSIFICATION_TOKENS_PER_MINUTE', 200000)),
+            namespace='classification'
+        )
+        self.token_counter = TokenCounter()
+
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+        self.client = client
+
+    def classify_documents(self, cursor, org_id: int, doc_ids: List[int],
+                           context: Optional[Dict] = None) -> Dict[int, Dict]:
+        """{document_id: classification} for the documents that could be classified"""
+        documents = [doc for doc in load_document_inputs(cursor, org_id, doc_ids) if doc['text'].strip()]
+        if not documents:
+            return {}
+        return self.classify(documents, context or load_organization_context(cursor, org_id))
+
+    def classify(self, documents: List[Dict], context: Dict) -> Dict[int, Dict]:
+        """Classify [{'document_id', 'filename', 'text'}, ...] in as few requests as the limits allow"""
+        for doc in documents:
+            doc['text'] = self.token_counter.truncate(doc['text'], MAX_DOCUMENT_TOKENS)
+        token_counts = [self.token_counter.count(doc['text']) + 20 for doc in documents]
+        batches = pack_batches(token_counts, max_tokens=MAX_REQUEST_TOKENS, max_items=self.batch_documents)
+
+        results: Dict[int, Dict] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [
+                executor.submit(self._classify_batch, [documents[i] for i in batch], context)
+                for batch in batches
+            ]
+            for future in futures:
+                results.update(future.result())
+
+        failed = len(documents) - len(results)
+        if failed:
+            logger.warning(f"{failed}/{len(documents)} documents could not be classified")
+        return results
+
+    def _classify_batch(self, documents: List[Dict], context: Dict) -> Dict[int, Dict]:
+        answers = self._request(documents, context)
+        results = {}
+        for raw in answers:
+            try:
+                doc_id = int(raw.get('document_id'))
+            except (TypeError, ValueError):
+                continue
+            if any(doc['document_id'] == doc_id for doc in documents):
+                results[doc_id] = normalize_classification(raw)
+
+        missing = [doc for doc in documents if doc['document_id'] not in results]
+        if missing and len(documents) > 1:
+            # Retry what the model skipped or garbled in smaller requests
+            middle = max(1, len(missing) // 2)
+            for part in (missing[:middle], missing[middle:]):
+                if part:
+                    results.update(self._classify_batch(part, context))
+        elif missing:
+            logger.error(f"Classification failed for document {missing[0]['document_id']}")
+        return results
+
+    def _request(self, documents: List[Dict], context: Dict) -> List[Dict]:
+        from openai import APIConnectionError, APIStatusError, BadRequestError, RateLimitError
+
+        prompt = self._prompt(documents, context)
+        tokens = self.token_counter.count(prompt) + 300 * len(documents)
+
+        for attempt in range(MAX_RETRIES):
+            self.rate_limiter.acquire(tokens)
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0,
+                    response_format={"type": "json_object"},
+                    max_tokens=min(16000, 400 * len(documents)),
+                    timeout=120
+                )
+            except (RateLimitError, APIConnectionError) as e:
+                self._backoff(attempt, e)
+                continue
+            except BadRequestError as e:
+                if getattr(e, 'param', None) not in (None, 'messages'):
+                    raise  # e.g. max_tokens - every request would fail the same way
+                # The request was rejected for its content - _classify_batch splits it
+                logger.error(f"Classification request for {len(documents)} documents rejected: {e}")
+                return []
+            except APIStatusError as e:
+                if e.status_code >= 500:
+                    self._backoff(attempt, e)
+                    continue
+                raise  # Authentication, permission, not found: retrying or splitting can't help
+
+            try:
+                answers = json.loads(response.choices[0].message.content).get('classifications', [])
+                return [answer for answer in answers if isinstance(answer, dict)]
+            except (ValueError, AttributeError) as e:
+                logger.warning(f"Unparseable classification response for {len(documents)} documents: {e}")
+                return []
+
+        logger.error(f"Classification request for {len(documents)} documents failed after {MAX_RETRIES} attempts")
+        return []
+
+    def _prompt(self, documents: List[Dict], context: Dict) -> str:
+        lines = [f"Organization: {context.get('name') or 'Unknown'}"]
+        if context.get('teams'):
+            lines.append(f"Existing teams: {', '.join(context['teams'])}")
+        if context.get('projects'):
+            lines.append(f"Existing projects: {', '.join(context['projects'])}")
+        for doc in documents:
+            lines.append(f"\n--- document_id: {doc['document_id']} | filename: {doc['filename']}\n{doc['text']}")
+        return '\n'.join(lines)
+
+    def _backoff(self, attempt: int, error: Exception) -> None:
+        delay = min(60, 2 ** attempt) + random.random()
+        logger.warning(f"Classification request failed ({error}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def create_reclassify_job(cursor, org_id: int) -> str:
+    """Insert a queued processing_jobs row for an org-wide reclassification"""
+    job_id = f"reclassify_{org_id}_{secrets.token_hex(8)}"
+    cursor.execute('''
+        INSERT INTO processing_jobs (organization_id, job_type, job_id, status)
+        VALUES (%s, %s, %s, 'queued')
+    ''', (org_id, JOB_TYPE, job_id))
+    return job_id
+
+
+def run_reclassify_all(get_db_connection_func: Callable, org_id: int, job_id: str,
+                       classifier: Optional[BatchClassifier] = None, page_size: int = JOB_PAGE_SIZE) -> Dict:
+    """
+    Reclassify every processed document of an organization
+
+    Documents are read in keyset-paginated pages of page_size; each page is
+    classified in batched requests and upserted before the next is read, and
+    progress is saved after every page.
+
+    Returns:
+        {'documents', 'classified', 'failed'}
+    """
+    classifier = classifier or BatchClassifier()
+    conn = get_db_connection_func()
+    cursor = conn.cursor()
+    summary = {'documents': 0, 'classified': 0, 'failed': 0}
+    try:
+        cursor.execute('''
+            UPDATE processing_jobs SET status = 'running', started_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (job_id,))
+        cursor.execute('''
+            SELECT COUNT(*) AS total FROM documents
+            WHERE organization_id = %s AND is_deleted = FALSE AND processing_status = 'completed'
+        ''', (org_id,))
+        total = cursor.fetchone()['total']
+        conn.commit()
+
+        # Labels are fixed for the run so every page is classified against the same vocabulary
+        context = load_organization_context(cursor, org_id)
+        last_document_id = 0
+        while True:
+            cursor.execute('''
+                SELECT id FROM documents
+                WHERE organization_id = %s AND is_deleted = FALSE AND processing_status = 'completed'
+                  AND id > %s
+                ORDER BY id
+                LIMIT %s
+            ''', (org_id, last_document_id, page_size))
+            doc_ids = [row['id'] for row in cursor.fetchall()]
+            if not doc_ids:
+                break
+            last_document_id = doc_ids[-1]
+
+            results = classifier.classify_documents(cursor, org_id, doc_ids, context)
+            write_classifications(cursor, org_id, results)
+
+            summary['documents'] += len(doc_ids)
+            summary['classified'] += len(results)
+            summary['failed'] += len(doc_ids) - len(results)
+            cursor.execute('''
+                UPDATE processing_jobs SET progress = %s, result_json = %s WHERE job_id = %s
+            ''', (min(99, summary['documents'] * 100 // max(total, 1)), json.dumps(summary), job_id))
+            conn.commit()
+
+        cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'completed', progress = 100, result_json = %s, completed_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (json.dumps(summary), job_id))
+        conn.commit()
+        logger.info(f"Reclassified org {org_id}: {summary}")
+        return summary
+
+    except Exception as e:
+        conn.rollback()
+        cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'failed', error_message = %s, result_json = %s, completed_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (str(e), json.dumps(summary), job_id))
+        conn.commit()
+        raise
+    finally:
+        conn.close()
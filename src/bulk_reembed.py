@@ -0,0 +1,377 @@
+"""
+Bulk Re-embedding
+
+Rebuilds an organization's document vectors after a change of embedding
+model, chunking parameters or vector layout, without re-uploading anything:
+
+1. Documents are walked in id order in keyset-paginated batches
+2. Each document is embedded into a shadow namespace ("documents.shadow").
+   With rechunk, its stored file is re-extracted and re-chunked first and the
+   new chunks are staged in document_chunks_shadow
+3. After every batch the checkpoint (last document id, counters, settings) is
+   saved in processing_jobs.result_json, so a killed job resumes after the
+   last finished batch
+4. When no documents are left, the shadow namespace replaces the live one
+   (LocalVectorStore.swap_namespace) and staged chunks replace
+   document_chunks in one transaction. Right before the swap, with the live
+   namespace locked against writers, documents whose live vectors were
+   written after the job started (new uploads, documents that were still
+   processing) are re-embedded into the shadow and documents deleted since
+   are removed from it, so the swap loses nothing written meanwhile
+
+Interactive search never waits on the job: it only writes the shadow
+namespace, takes a reduced share of the shared embeddings rate limit, embeds
+one request at a time and pauses between batches. A Postgres advisory lock
+keeps two runs for the same organization apart and is released by the
+server if the process dies.
+
+Usage:
+    job_id = create_reembed_job(cursor, org_id, {'rechunk': True, 'chunk_tokens': 400})
+    BulkReembedJob(get_db_connection, vector_store).run(org_id, job_id)
+"""
+
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from document_dedup import chunk_hash
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = 'bulk_reembed'
+BATCH_DOCUMENTS = int(os.environ.get('REEMBED_BATCH_DOCUMENTS', 20))
+BATCH_PAUSE_SECONDS = float(os.environ.get('REEMBED_BATCH_PAUSE', 0.5))
+RATE_LIMIT_SHARE = float(os.environ.get('REEMBED_RATE_LIMIT_SHARE', 0.5))
+ADVISORY_LOCK_CLASS = 4201  # pg_try_advisory_lock(ADVISORY_LOCK_CLASS, org_id)
+
+DEFAULT_SETTINGS = {
+    'model': 'text-embedding-3-large',
+    'dimensions': None,
+    'rechunk': False,
+    'chunk_tokens': 500,
+    'overlap_tokens': 50,
+}
+
+
+class JobAlreadyRunning(Exception):
+    """Another process holds the re-embedding lock for this organization"""
+
+
+def create_reembed_job(cursor, org_id: int, settings: Optional[Dict] = None) -> str:
+    """Insert a queued processing_jobs row whose checkpoint carries the job settings"""
+    job_id = f"reembed_{org_id}_{secrets.token_hex(8)}"
+    checkpoint = {
+        'phase': 'embedding',
+        'last_document_id': 0,
+        'documents': 0,
+        'chunks': 0,
+        'failed_chunks': 0,
+        'pending_document_ids': [],
+        'settings': dict(DEFAULT_SETTINGS, **(settings or {})),
+    }
+    cursor.execute('''
+        INSERT INTO processing_jobs (organization_id, job_type, job_id, status, result_json)
+        VALUES (%s, %s, %s, 'queued', %s)
+    ''', (org_id, JOB_TYPE, job_id, json.dumps(checkpoint)))
+    return job_id
+
+
+class BulkReembedJob:
+    """Resumable, checkpointed re-embedding of one organization's documents"""
+
+    def __init__(self, get_db_connection_func: Callable, vector_store, embedder=None, storage=None,
+                 namespace: str = 'documents', batch_documents: int = BATCH_DOCUMENTS,
+                 pause_seconds: float = BATCH_PAUSE_SECONDS):
+        if not hasattr(vector_store, 'swap_namespace'):
+            raise ValueError('Bulk re-embedding needs a vector store with shadow namespaces (the local backend)')
+        self.get_db_connection = get_db_connection_func
+        self.vector_store = vector_store
+        self.embedder = embedder
+        self.storage = storage
+        self.namespace = namespace
+        self.batch_documents = batch_documents
+        self.pause_seconds = pause_seconds
+
+    def run(self, org_id: int, job_id: str) -> Dict:
+        """
+        Run (or resume) a job created by create_reembed_job
+
+        Returns the final checkpoint. Raises JobAlreadyRunning when another
+        process is working on the organization.
+        """
+        lock_conn = self.get_db_connection()
+        try:
+            cursor = lock_conn.cursor()
+            cursor.execute('SELECT pg_try_advisory_lock(%s, %s) AS locked', (ADVISORY_LOCK_CLASS, org_id))
+            if not cursor.fetchone()['locked']:
+                raise JobAlreadyRunning(f"A re-embedding job is already running for org {org_id}")
+            lock_conn.commit()
+
+            conn = self.get_db_connection()
+            try:
+                return self._run(conn, org_id, job_id)
+            except Exception as e:
+                conn.rollback()
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE processing_jobs SET status = 'failed', error_message = %s WHERE job_id = %s
+                ''', (str(e), job_id))
+                conn.commit()
+                raise
+            finally:
+                conn.close()
+        finally:
+            lock_conn.close()  # Releases the advisory lock
+
+    def _run(self, conn, org_id: int, job_id: str) -> Dict:
+        from local_vector_store import shadow_namespace
+
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, result_json, created_at FROM processing_jobs WHERE job_id = %s', (job_id,))
+        job = cursor.fetchone()
+        if job is None:
+            raise ValueError(f"Unknown job {job_id}")
+        if job['status'] == 'completed':
+            return json.loads(job['result_json'])
+
+        checkpoint = json.loads(job['result_json'])
+        settings = checkpoint['settings']
+        shadow = shadow_namespace(self.namespace)
+        embedder = self.embedder or self._create_embedder(settings)
+        chunker = None
+        if settings.get('rechunk'):
+            from page_extraction import TokenChunker
+            chunker = TokenChunker(settings['chunk_tokens'], settings['overlap_tokens'])
+
+        if checkpoint['last_document_id'] == 0 and checkpoint['phase'] == 'embedding':
+            # Fresh start: discard whatever an abandoned job left behind
+            self.vector_store.drop_namespace(org_id, shadow)
+            cursor.execute('DELETE FROM document_chunks_shadow WHERE organization_id = %s', (org_id,))
+
+        cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'running', error_message = NULL, started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+            WHERE job_id = %s
+        ''', (job_id,))
+        conn.commit()
+
+        if checkpoint['phase'] == 'embedding':
+            while True:
+                cursor.execute('''
+                    SELECT COUNT(*) AS total FROM documents
+                    WHERE organization_id = %s AND is_deleted = FALSE
+                ''', (org_id,))
+                total = cursor.fetchone()['total']
+
+                cursor.execute('''
+                    SELECT id, file_type, storage_url, processing_status
+                    FROM documents
+                    WHERE organization_id = %s AND is_deleted = FALSE AND id > %s
+                    ORDER BY id
+                    LIMIT %s
+                ''', (org_id, checkpoint['last_document_id'], self.batch_documents))
+                documents = cursor.fetchall()
+
+                if not documents:
+                    # Documents still being processed when the walk passed them
+                    documents = self._finished_pending_documents(cursor, org_id, checkpoint)
+                    if not documents:
+                        break
+
+                for document in documents:
+                    if document['processing_status'] == 'completed':
+                        self._reembed_document(cursor, org_id, job_id, document, shadow, embedder, chunker, checkpoint)
+                    elif document['id'] not in checkpoint['pending_document_ids']:
+                        checkpoint['pending_document_ids'].append(document['id'])
+                    checkpoint['last_document_id'] = max(checkpoint['last_document_id'], document['id'])
+
+                self._save_checkpoint(cursor, job_id, checkpoint, min(99, checkpoint['documents'] * 100 // max(total, 1)))
+                conn.commit()
+                time.sleep(self.pause_seconds)
+
+            checkpoint['phase'] = 'swapping'
+            self._save_checkpoint(cursor, job_id, checkpoint, 99)
+            conn.commit()
+
+        def catch_up():
+            self._catch_up(conn, org_id, job_id, job['created_at'], shadow, embedder, chunker, checkpoint)
+
+        # Swapping is idempotent, so a job killed half way through repeats it
+        if self.vector_store.has_namespace(org_id, shadow):
+            self.vector_store.swap_namespace(org_id, shadow, self.namespace, before_swap=catch_up)
+        else:
+            logger.warning(f"Re-embedding job {job_id} produced no vectors; live index left unchanged")
+
+        if chunker is not None:
+            cursor.execute('''
+                DELETE FROM document_chunks
+                WHERE document_id IN (SELECT DISTINCT document_id FROM document_chunks_shadow WHERE job_id = %s)
+            ''', (job_id,))
+            cursor.execute('''
+                INSERT INTO document_chunks
+                    (document_id, chunk_text, chunk_index, token_count, embedding_id, metadata_json, content_hash)
+                SELECT s.document_id, s.chunk_text, s.chunk_index, s.token_count, s.embedding_id, s.metadata_json, s.content_hash
+                FROM document_chunks_shadow s
+                JOIN documents d ON d.id = s.document_id
+                WHERE s.job_id = %s AND d.is_deleted = FALSE
+            ''', (job_id,))
+            cursor.execute('DELETE FROM document_chunks_shadow WHERE job_id = %s', (job_id,))
+
+        checkpoint['phase'] = 'done'
+        cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'completed', progress = 100, result_json = %s, completed_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        ''', (json.dumps(checkpoint), job_id))
+        conn.commit()
+
+        logger.info(f"Re-embedded org {org_id}: {checkpoint['documents']} documents, {checkpoint['chunks']} chunks")
+        return checkpoint
+
+    def _catch_up(self, conn, org_id: int, job_id: str, since, shadow: str, embedder, chunker,
+                  checkpoint: Dict) -> None:
+        """
+        Bring the shadow namespace up to date with live writes made since the job started
+
+        Called by swap_namespace with the live namespace locked, so no document
+        can get live vectors between this pass and the swap. Picks up documents
+        whose vectors were written (or whose processing completed) since the
+        job started, and completed documents created after the walk ended.
+        Documents still processing without vectors are embedded into the
+        swapped-in namespace once they finish.
+        """
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id FROM documents
+            WHERE organization_id = %s AND is_deleted = TRUE AND deleted_at >= %s
+        ''', (org_id, since))
+        for row in cursor.fetchall():
+            self.vector_store.delete_document(org_id, row['id'], shadow)
+
+        cursor.execute('''
+            SELECT id, file_type, storage_url, processing_status
+            FROM documents
+            WHERE organization_id = %s AND is_deleted = FALSE
+              AND (vectors_updated_at >= %s OR (processing_status = 'completed' AND id > %s))
+            ORDER BY id
+        ''', (org_id, since, checkpoint['last_document_id']))
+        documents = cursor.fetchall()
+        for document in documents:
+            self._reembed_document(cursor, org_id, job_id, document, shadow, embedder, chunker, checkpoint)
+
+        checkpoint['caught_up_documents'] = len(documents)
+        self._save_checkpoint(cursor, job_id, checkpoint, 99)
+        conn.commit()
+
+    def _finished_pending_documents(self, cursor, org_id: int, checkpoint: Dict) -> List[Dict]:
+        """Pending documents that have finished processing since; the rest are left to _catch_up"""
+        pending = checkpoint['pending_document_ids']
+        checkpoint['pending_document_ids'] = []
+        if not pending:
+            return []
+        cursor.execute('''
+            SELECT id, file_type, storage_url, processing_status
+            FROM documents
+            WHERE id = ANY(%s) AND is_deleted = FALSE AND processing_status = 'completed'
+            ORDER BY id
+        ''', (pending,))
+        return cursor.fetchall()
+
+    def _reembed_document(self, cursor, org_id: int, job_id: str, document: Dict, shadow: str,
+                          embedder, chunker, checkpoint: Dict) -> None:
+        doc_id = document['id']
+        if chunker is not None:
+            chunks = self._rechunk(document, chunker)
+        else:
+            cursor.execute('''
+                SELECT chunk_index, chunk_text, token_count, metadata_json
+                FROM document_chunks
+                WHERE document_id = %s
+                ORDER BY chunk_index
+            ''', (doc_id,))
+            chunks = cursor.fetchall()
+
+        embeddings = embedder.embed([chunk['chunk_text'] for chunk in chunks], org_id) if chunks else []
+
+        vectors, staged = [], []
+        for chunk, embedding in zip(chunks, embeddings):
+            vector_id = f"doc_{doc_id}_chunk_{chunk['chunk_index']}"
+            if embedding is not None:
+                metadata = json.loads(chunk['metadata_json']) if chunk['metadata_json'] else {}
+                metadata.update({
+                    'doc_id': doc_id,
+                    'org_id': org_id,
+                    'chunk_index': chunk['chunk_index'],
+                    'doc_type': document['file_type'],
+                    'text': chunk['chunk_text'][:1000],
+                })
+                vectors.append({'id': vector_id, 'values': embedding, 'metadata': metadata})
+            if chunker is not None:
+                staged.append((
+                    job_id, org_id, doc_id, chunk['chunk_text'], chunk['chunk_index'], chunk['token_count'],
+                    vector_id if embedding is not None else None, chunk['metadata_json'], chunk_hash(chunk['chunk_text'])
+                ))
+
+        if vectors:
+            self.vector_store.upsert_vectors(org_id, vectors, shadow)
+
+        if chunker is not None:
+            cursor.execute('DELETE FROM document_chunks_shadow WHERE job_id = %s AND document_id = %s', (job_id, doc_id))
+            if staged:
+                execute_values(cursor, '''
+                    INSERT INTO document_chunks_shadow
+                        (job_id, organization_id, document_id, chunk_text, chunk_index, token_count,
+                         embedding_id, metadata_json, content_hash)
+                    VALUES %s
+                ''', staged)
+
+        checkpoint['documents'] += 1
+        checkpoint['chunks'] += len(vectors)
+        checkpoint['failed_chunks'] += len(chunks) - len(vectors)
+
+    def _rechunk(self, document: Dict, chunker) -> List[Dict]:
+        from page_extraction import extract_file_pages
+
+        if self.storage is None:
+            from object_storage import create_storage
+            self.storage = create_storage()
+
+        with self.storage.open_local_path(document['storage_url']) as file_path:
+            pages = extract_file_pages(file_path, document['file_type'])
+
+        chunks = []
+        for page in pages:
+            for text, token_count in chunker.chunk(page['text']):
+                chunks.append({
+                    'chunk_index': len(chunks),
+                    'chunk_text': text,
+                    'token_count': token_count,
+                    'metadata_json': json.dumps({'page': page['page'], 'ocr': page['ocr']}),
+                })
+        return chunks
+
+    def _create_embedder(self, settings: Dict):
+        from embedding_batcher import BatchEmbedder, SharedRateLimiter
+
+        # Same shared counters as every other embedding caller, but a lower ceiling:
+        # the job only runs while the organization is using less than its share
+        limits = SharedRateLimiter()
+        rate_limiter = SharedRateLimiter(
+            requests_per_minute=max(1, int(limits.requests_per_minute * RATE_LIMIT_SHARE)),
+            tokens_per_minute=max(1, int(limits.tokens_per_minute * RATE_LIMIT_SHARE)),
+        )
+        return BatchEmbedder(
+            self.get_db_connection, model=settings['model'], dimensions=settings.get('dimensions'),
+            max_concurrency=1, rate_limiter=rate_limiter
+        )
+
+    @staticmethod
+    def _save_checkpoint(cursor, job_id: str, checkpoint: Dict, progress: int) -> None:
+        cursor.execute('''
+            UPDATE processing_jobs SET result_json = %s, progress = %s WHERE job_id = %s
+        ''', (json.dumps(checkpoint), progress, job_id))
@@ -0,0 +1,279 @@
+"""
+Streaming Chat Answers
+
+Server-Sent Events variant of a RAG chat answer, so the first words reach
+the user as soon as the model produces them instead of after the whole
+generation:
+
+1. "sources": retrieved document chunks and employees whose profile matches
+   the question, sent before generation starts
+2. "token": answer text deltas as the model streams them
+3. "done": id and timestamp of the stored assistant message, token usage
+   ("error" instead when retrieval or generation fails)
+
+The user and assistant messages are written to chat_messages in one
+transaction when the stream closes - including when the client disconnects
+mid-answer, in which case the partial answer is kept. When retrieval or
+generation fails before the first token, the question alone is stored so it
+still shows up in the conversation. Conversation history
+comes from a ChatContextWindow (recent turns plus rolling summary), whose
+summary is brought up to date after each stored answer.
+
+Usage:
+    stream = ChatAnswerStream(get_db_connection, vector_store, embedding_service,
+                              enrich_employees=enrich_employee_hits)
+    return Response(stream_with_context(stream.events(conversation_id, org_id, message)),
+                    mimetype='text/event-stream')
+"""
+
+import json
+import logging
+import os
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = os.environ.get('CHAT_MODEL', 'gpt-4o-mini')
+TOP_K = 10
+EMPLOYEE_TOP_K = 5
+MIN_SCORE = 0.3
+MAX_CONTEXT_CHARS = 2000  # per retrieved chunk
+
+SYSTEM_PROMPT = """You answer questions about an organization using its documents.
+Answer from the numbered sources below and cite them as [1], [2], ...
+If the sources don't contain the answer, say so instead of guessing."""
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """One Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def load_chunk_sources(cursor, hits: List[Dict]) -> List[Dict]:
+    """
+    Text, page and document details of vector hits in score order, read with
+    one query; hits on deleted documents are dropped
+    """
+    keys = [(int(hit['metadata']['doc_id']), int(hit['metadata'].get('chunk_index', 0)))
+            for hit in hits if hit['metadata'].get('doc_id')]
+    if not keys:
+        return []
+
+    cursor.execute('''
+        SELECT c.document_id, c.chunk_index, c.chunk_text, c.metadata_json, d.filename, d.file_type
+        FROM document_chunks c
+        JOIN documents d ON d.id = c.document_id
+        WHERE d.is_deleted = FALSE
+          AND (c.document_id, c.chunk_index) IN (SELECT * FROM unnest(%s::int[], %s::int[]))
+    ''', ([doc_id for doc_id, _ in keys], [chunk_index for _, chunk_index in keys]))
+    chunks = {(row['document_id'], row['chunk_index']): row for row in cursor.fetchall()}
+
+    sources = []
+    for hit, key in zip((hit for hit in hits if hit['metadata'].get('doc_id')), keys):
+        chunk = chunks.get(key)
+        if chunk is None:
+            continue
+        try:
+            chunk_metadata = json.loads(chunk['metadata_json']) if chunk['metadata_json'] else {}
+        except ValueError:
+            chunk_metadata = {}
+        sources.append({
+            'doc_id': chunk['document_id'],
+            'filename': chunk['filename'],
+            'file_type': chunk['file_type'],
+            'chunk_index': chunk['chunk_index'],
+            'page': chunk_metadata.get('page'),
+            'score': hit.get('score'),
+            'text': chunk['chunk_text'],
+        })
+    return sources
+
+
+class ChatAnswerStream:
+    """Retrieval followed by a streamed chat completion, persisted when the stream closes"""
+
+    def __init__(self, get_db_connection_func: Callable, vector_store, embedding_service, client=None,
+                 model: str = CHAT_MODEL, top_k: int = TOP_K, min_score: float = MIN_SCORE,
+                 context_window=None, enrich_employees: Optional[Callable] = None,
+                 employee_top_k: int = EMPLOYEE_TOP_K):
+        """
+        enrich_employees(cursor, hits) turns employee vector hits into source
+        entries ({'user_id', 'name', 'title', ...}); without it no employees
+        are retrieved.
+        """
+        self.get_db_connection = get_db_connection_func
+        self.vector_store = vector_store
+        self.embedding_service = embedding_service
+        self.enrich_employees = enrich_employees
+        self.employee_top_k = employee_top_k
+        if context_window is None:
+            from conversation_context import ChatContextWindow
+            context_window = ChatContextWindow(get_db_connection_func, client=client)
+        self.context_window = context_window
+        self.model = model
+        self.top_k = top_k
+        self.min_score = min_score
+
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+        self.client = client
+
+    def events(self, conversation_id: int, org_id: int, message: str) -> Iterator[str]:
+        """SSE frames for one answer; the messages are stored when the generator closes"""
+        answer_parts: List[str] = []
+        sources: List[Dict] = []
+        employees: List[Dict] = []
+        completed = False
+        try:
+            history, sources, employees = self._prepare(conversation_id, org_id, message)
+            yield sse_event('sources', {
+                'documents': [dict(source, text=source['text'][:300]) for source in sources],
+                'employees': employees,
+                'external': []
+            })
+
+            usage = {}
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(history, sources, employees, message),
+                temperature=0.3,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in response:
+                if chunk.usage:
+                    usage = {
+                        'prompt_tokens': chunk.usage.prompt_tokens,
+                        'completion_tokens': chunk.usage.completion_tokens,
+                        'total_tokens': chunk.usage.total_tokens
+                    }
+                if chunk.choices and chunk.choices[0].delta.content:
+                    answer_parts.append(chunk.choices[0].delta.content)
+                    yield sse_event('token', {'text': chunk.choices[0].delta.content})
+
+            completed = True
+            stored = self._store(conversation_id, message, ''.join(answer_parts), sources, employees)
+            yield sse_event('done', {
+                'message_id': stored['id'],
+                'timestamp': stored['timestamp'].isoformat() if stored['timestamp'] else None,
+                'usage': usage
+            })
+
+        except Exception as e:
+            logger.error(f"Streaming answer failed for conversation {conversation_id}: {e}")
+            yield sse_event('error', {'error': 'Failed to generate an answer'})
+        finally:
+            # Also runs on GeneratorExit when the client goes away mid-answer
+            if not completed:
+                try:
+                    if answer_parts:
+                        self._store(conversation_id, message, ''.join(answer_parts), sources, employees)
+                    else:
+                        self._store_question(conversation_id, message)
+                except Exception as e:
+                    logger.error(f"Could not store unfinished answer for conversation {conversation_id}: {e}")
+
+    def _prepare(self, conversation_id: int, org_id: int, message: str):
+        """(history context, sources, employees) - the only blocking work before the first event"""
+        embedding = self.embedding_service.generate_single_embedding(message, org_id)
+        hits = self.vector_store.search_documents(
+            org_id=org_id, query_embedding=embedding, top_k=self.top_k, min_score=self.min_score
+        )
+        employee_hits = []
+        if self.enrich_employees is not None:
+            employee_hits = self.vector_store.search_employees(
+                org_id=org_id, query_embedding=embedding, top_k=self.employee_top_k
+            )
+
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            sources = load_chunk_sources(cursor, hits)
+            employees = self.enrich_employees(cursor, employee_hits) if employee_hits else []
+            history = self.context_window.build(cursor, conversation_id)
+        finally:
+            conn.close()
+        return history, sources, employees
+
+    def _messages(self, history: Dict, sources: List[Dict], employees: List[Dict], message: str) -> List[Dict]:
+        context = '\n\n'.join(
+            f"[{position}] {source['filename']}" + (f" (page {source['page']})" if source['page'] else '')
+            + f"\n{source['text'][:MAX_CONTEXT_CHARS]}"
+            for position, source in enumerate(sources, 1)
+        ) or 'No relevant documents were found.'
+        if employees:
+            context += '\n\nColleagues whose profile matches the question:\n' + '\n'.join(
+                f"- {employee['name']}" + (f", {employee['title']}" if employee.get('title') else '')
+                + (f" ({employee['specialties']})" if employee.get('specialties') else '')
+                for employee in employees
+            )
+
+        messages = [{"role": "system", "content": f"{SYSTEM_PROMPT}\n\nSources:\n{context}"}]
+        messages.extend(self.context_window.as_chat_messages(history))
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def _store(self, conversation_id: int, message: str, answer: str, sources: List[Dict],
+               employees: List[Dict]) -> Dict:
+        """Write the user message and the assistant answer in one transaction"""
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO chat_messages (conversation_id, role, content, timestamp)
+                VALUES (%s, %s, %s, NOW())
+            ''', (conversation_id, 'user', message))
+            cursor.execute('''
+                INSERT INTO chat_messages (
+                    conversation_id, role, content, source_documents_json, source_employees_json, timestamp
+                )
+                VALUES (%s, %s, %s, %s, %s, NOW())
+                RETURNING id, timestamp
+            ''', (
+                conversation_id,
+                'assistant',
+                answer,
+                json.dumps([dict(source, text=source['text'][:300]) for source in sources]),
+                json.dumps(employees, default=str)
+            ))
+            stored = cursor.fetchone()
+            cursor.execute('''
+                UPDATE chat_conversations
+                SET last_message_at = NOW(),
+                    last_message_preview = LEFT(%s, 200),
+                    message_count = COALESCE(message_count, 0) + 2
+                WHERE id = %s
+            ''', (answer, conversation_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        self.context_window.update_summary_async(conversation_id)
+        return stored
+
+    def _store_question(self, conversation_id: int, message: str) -> None:
+        """Write only the user message, for an answer that failed before its first token"""
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO chat_messages (conversation_id, role, content, timestamp)
+                VALUES (%s, %s, %s, NOW())
+            ''', (conversation_id, 'user', message))
+            cursor.execute('''
+                UPDATE chat_conversations
+                SET last_message_at = NOW(),
+                    last_message_preview = LEFT(%s, 200),
+                    message_count = COALESCE(message_count, 0) + 1
+                WHERE id = %s
+            ''', (message, conversation_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
@@ -0,0 +1,200 @@
+"""
+Conversation Context Window
+
+Bounds the conversation history sent to the model on every chat turn:
+
+- The last RECENT_TURNS turns (user + assistant message pairs) are kept
+  verbatim, oldest dropped first if they exceed the token budget
+- Everything older is folded into a rolling summary stored on
+  chat_conversations (history_summary, summarized_through_message_id).
+  After each new message, only the messages that just left the verbatim
+  window are summarized together with the previous summary - the summary
+  is extended, never recomputed from the whole conversation. Evicted
+  messages beyond MAX_SUMMARY_INPUT_TOKENS (the first summary of a long
+  conversation) are folded in several chunks, so none are skipped
+- Tokens are counted with tiktoken (TokenCounter)
+
+Usage:
+    window = ChatContextWindow(get_db_connection)
+    context = window.build(cursor, conversation_id)   # {'summary', 'messages'}
+    messages = window.as_chat_messages(context)
+    ...store the new messages...
+    window.update_summary_async(conversation_id)
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from embedding_batcher import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+RECENT_TURNS = int(os.environ.get('CHAT_HISTORY_TURNS', 6))
+HISTORY_TOKEN_BUDGET = int(os.environ.get('CHAT_HISTORY_TOKENS', 3000))
+SUMMARY_MAX_TOKENS = 500
+SUMMARY_MODEL = os.environ.get('CHAT_SUMMARY_MODEL', 'gpt-4o-mini')
+MAX_SUMMARY_INPUT_TOKENS = 12000
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant that
+answers questions from the user's organization's documents. Extend the existing summary with the new
+messages. Keep the questions asked, facts and names given in answers, decisions and open questions.
+Drop small talk. Write at most 250 words of plain prose."""
+
+
+class ChatContextWindow:
+    """Recent turns verbatim plus a stored rolling summary of everything older"""
+
+    def __init__(self, get_db_connection_func: Callable, recent_turns: int = RECENT_TURNS,
+                 token_budget: int = HISTORY_TOKEN_BUDGET, model: str = SUMMARY_MODEL, client=None):
+        self.get_db_connection = get_db_connection_func
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.model = model
+        self.token_counter = TokenCounter()
+        self._client = client
+
+    def build(self, cursor, conversation_id: int) -> Dict:
+        """
+        History to send with the next question
+
+        Returns:
+            {'summary': str or None, 'messages': [{'id', 'role', 'content'}, ...] oldest first}
+        """
+        cursor.execute('''
+            SELECT history_summary, COALESCE(summarized_through_message_id, 0) AS summarized_through
+            FROM chat_conversations WHERE id = %s
+        ''', (conversation_id,))
+        state = cursor.fetchone() or {'history_summary': None, 'summarized_through': 0}
+
+        cursor.execute('''
+            SELECT id, role, content FROM chat_messages
+            WHERE conversation_id = %s AND id > %s
+            ORDER BY id DESC
+            LIMIT %s
+        ''', (conversation_id, state['summarized_through'], self.recent_turns * 2))
+        recent = [dict(row) for row in cursor.fetchall()]
+
+        summary = state['history_summary']
+        budget = self.token_budget - (self.token_counter.count(summary) if summary else 0)
+
+        # Newest first, so the oldest turns are the ones left out when over budget
+        messages = []
+        for message in recent:
+            tokens = self.token_counter.count(message['content'])
+            if tokens > budget:
+                if not messages:
+                    # Always keep the latest message, truncated if it alone is over budget
+                    message['content'] = self.token_counter.truncate(message['content'], max(budget, 100))
+                    messages.append(message)
+                break
+            messages.append(message)
+            budget -= tokens
+
+        return {'summary': summary, 'messages': list(reversed(messages))}
+
+    def as_chat_messages(self, context: Dict) -> List[Dict]:
+        """Chat completion messages for a context returned by build()"""
+        messages = []
+        if context['summary']:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{context['summary']}"})
+        messages.extend({"role": message['role'], "content": message['content']} for message in context['messages'])
+        return messages
+
+    def update_summary(self, conversation_id: int) -> bool:
+        """
+        Fold the messages that have left the verbatim window into the summary
+
+        Returns True when the summary changed. A concurrent update of the same
+        conversation wins; this one is then discarded.
+        """
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT history_summary, COALESCE(summarized_through_message_id, 0) AS summarized_through
+                FROM chat_conversations WHERE id = %s
+            ''', (conversation_id,))
+            state = cursor.fetchone()
+            if state is None:
+                return False
+
+            # Unsummarized messages older than the newest recent_turns turns
+            cursor.execute('''
+                SELECT id, role, content FROM chat_messages
+                WHERE conversation_id = %s AND id > %s
+                ORDER BY id DESC
+                OFFSET %s
+            ''', (conversation_id, state['summarized_through'], self.recent_turns * 2))
+            evicted = list(reversed([dict(row) for row in cursor.fetchall()]))
+            conn.commit()
+            if not evicted:
+                return False
+
+            summary = state['history_summary']
+            for chunk in self._transcript_chunks(evicted):
+                summary = self._summarize(summary, chunk)
+
+            cursor.execute('''
+                UPDATE chat_conversations
+                SET history_summary = %s, summarized_through_message_id = %s, summary_updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND COALESCE(summarized_through_message_id, 0) = %s
+            ''', (summary, evicted[-1]['id'], conversation_id, state['summarized_through']))
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def update_summary_async(self, conversation_id: int) -> None:
+        """update_summary() in a daemon thread, after the answer has been returned"""
+        def run():
+            try:
+                self.update_summary(conversation_id)
+            except Exception as e:
+                logger.error(f"Summarizing conversation {conversation_id} failed: {e}")
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def _transcript_chunks(self, messages: List[Dict]) -> List[List[str]]:
+        """Transcript lines grouped into chunks of at most MAX_SUMMARY_INPUT_TOKENS"""
+        chunks, chunk, chunk_tokens = [], [], 0
+        for message in messages:
+            line = self.token_counter.truncate(
+                f"{message['role'].capitalize()}: {message['content']}", MAX_SUMMARY_INPUT_TOKENS
+            )
+            tokens = self.token_counter.count(line)
+            if chunk and chunk_tokens + tokens > MAX_SUMMARY_INPUT_TOKENS:
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(line)
+            chunk_tokens += tokens
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _summarize(self, previous: Optional[str], lines: List[str]) -> str:
+        transcript = '\n\n'.join(lines)
+
+        response = self._get_client().chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Existing summary:\n{previous or '(none yet)'}\n\nNew messages:\n{transcript}"}
+            ],
+            temperature=0.2,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            timeout=60
+        )
+        return response.choices[0].message.content.strip()
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+        return self._client
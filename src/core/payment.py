@@ -1,7 +1,7 @@
 import os
 import stripe
 from datetime import datetime, timedelta
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, List
 import logging
 
 class SubscriptionManager:
@@ -486,12 +486,7 @@ class SubscriptionManager:
             
             # Update free matches counter if needed
             if is_free:
-                cursor.execute('''
-                    UPDATE users 
-                    SET free_matches_used = free_matches_used + 1,
-                        last_free_match_date = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                ''', (user_id,))
+                self.increment_free_matches([user_id], cursor=cursor)
             
             conn.commit()
             conn.close()
@@ -499,6 +494,41 @@ class SubscriptionManager:
         except Exception as e:
             print(f"Error recording matching usage: {e}")
 
+    def increment_free_matches(self, user_ids: List[int], cursor=None) -> int:
+        """Increment the free simulation counter for several users in one statement
+
+        Pass the caller's cursor to run inside its transaction; otherwise a
+        connection is opened and committed here. Returns the number of rows updated.
+        """
+        user_ids = sorted({int(uid) for uid in user_ids if uid})
+        if not user_ids:
+            return 0
+
+        own_connection = cursor is None
+        conn = None
+        try:
+            if own_connection:
+                conn = self.get_db_connection()
+                cursor = conn.cursor()
+
+            # Single set-based update; ids are sorted so concurrent callers
+            # acquire row locks in the same order
+            cursor.execute('''
+                UPDATE users
+                SET free_matches_used = COALESCE(free_matches_used, 0) + 1,
+                    last_free_match_date = CURRENT_TIMESTAMP
+                WHERE id = ANY(%s)
+            ''', (user_ids,))
+            updated = cursor.rowcount
+
+            if own_connection:
+                conn.commit()
+            return updated
+
+        finally:
+            if own_connection and conn:
+                conn.close()
+
     def handle_successful_payment(self, invoice):
         """Handle successful payment"""
         pass
@@ -0,0 +1,104 @@
+"""
+Document Deduplication
+
+Content hashing for uploads and chunks so identical content is stored,
+OCR'd and embedded once per organization:
+
+- documents.content_hash: SHA-256 of the uploaded bytes, unique per org among
+  non-deleted documents. upload_documents skips storage and processing when
+  the hash already exists.
+- document_chunks.content_hash: SHA-256 of the chunk text. When a changed
+  version of a document is processed, chunks whose text already exists in the
+  org reuse the stored vector instead of calling the embedding API.
+
+Usage (processing task):
+    reused = reuse_chunk_embeddings(cursor, vector_store, org_id, chunk_texts)
+    to_embed = [i for i in range(len(chunk_texts)) if i not in reused]
+    # ...and store chunk_hash(text) in document_chunks.content_hash for each chunk
+"""
+
+import hashlib
+import logging
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream: BinaryIO, block_size: int = HASH_BLOCK_SIZE) -> Tuple[str, int]:
+    """
+    SHA-256 and size of a seekable stream, read in fixed-size blocks
+
+    The stream is rewound before and after hashing so it can be uploaded next.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    for block in iter(lambda: stream.read(block_size), b''):
+        digest.update(block)
+        size += len(block)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+def chunk_hash(text: str) -> str:
+    """
+    SHA-256 of a chunk's text; matches the SQL backfill
+    encode(sha256(convert_to(chunk_text, 'UTF8')), 'hex')
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def find_duplicate_document(cursor, org_id: int, content_hash: str) -> Optional[Dict]:
+    """Non-deleted document in the organization with the same content hash"""
+    cursor.execute('''
+        SELECT id, filename, file_type, processing_status
+        FROM documents
+        WHERE organization_id = %s AND content_hash = %s AND is_deleted = FALSE
+    ''', (org_id, content_hash))
+    return cursor.fetchone()
+
+
+def reuse_chunk_embeddings(cursor, vector_store, org_id: int, chunk_texts: List[str]) -> Dict[int, List[float]]:
+    """
+    Embeddings of already-indexed chunks with identical text in the organization
+
+    Args:
+        chunk_texts: Chunk texts of the document being processed, in chunk order
+
+    Returns:
+        {chunk position: embedding values} for every chunk that can be reused;
+        the remaining chunks still need to be embedded
+    """
+    hashes = [chunk_hash(text) for text in chunk_texts]
+    if not hashes or not hasattr(vector_store, 'fetch_vectors'):
+        return {}
+
+    cursor.execute('''
+        SELECT DISTINCT ON (dc.content_hash) dc.content_hash, dc.embedding_id
+        FROM document_chunks dc
+        JOIN documents d ON d.id = dc.document_id
+        WHERE d.organization_id = %s AND d.is_deleted = FALSE
+          AND dc.content_hash = ANY(%s) AND dc.embedding_id IS NOT NULL
+        ORDER BY dc.content_hash, dc.id DESC
+    ''', (org_id, list(set(hashes))))
+    embedding_ids = {row['content_hash']: row['embedding_id'] for row in cursor.fetchall()}
+    if not embedding_ids:
+        return {}
+
+    try:
+        vectors = vector_store.fetch_vectors(org_id, embedding_ids.values(), 'documents')
+    except Exception as e:
+        logger.warning(f"Could not fetch stored chunk vectors for org {org_id}, embedding all chunks: {e}")
+        return {}
+
+    reused = {}
+    for position, content_hash in enumerate(hashes):
+        vector = vectors.get(embedding_ids.get(content_hash))
+        if vector is not None:
+            reused[position] = vector['values']
+
+    if reused:
+        logger.info(f"Reusing {len(reused)}/{len(hashes)} chunk embeddings for org {org_id}")
+    return reused
@@ -0,0 +1,178 @@
+"""
+Document Listing
+
+Paginated, filtered listing of an organization's documents for
+/api/documents and the documents page. Pages are keyset-paginated on
+(upload_date, id) newest first, served by idx_documents_org_upload, so the
+first page costs the same whatever the size of the corpus.
+
+Only the requested fields are selected: metadata_json is neither read nor
+parsed unless 'metadata' is asked for, and uploader names are decrypted once
+per distinct uploader on the page instead of being read from the legacy
+plaintext name columns.
+
+Usage:
+    filters = parse_document_filters(request.args)
+    page = list_documents_page(cursor, org_id, filters, fields, limit=50, page_cursor=None,
+                               decrypt=data_encryption.decrypt_sensitive_data)
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pagination import encode_page_cursor
+from smart_folders import decode_document_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# response field -> column(s) it needs
+DOCUMENT_FIELDS = {
+    'id': ['d.id'],
+    'filename': ['d.filename'],
+    'file_type': ['d.file_type'],
+    'file_size': ['d.file_size'],
+    'upload_date': ['d.upload_date'],
+    'uploaded_by': ['d.uploaded_by'],
+    'processing_status': ['d.processing_status'],
+    'metadata': ['d.metadata_json'],
+}
+DEFAULT_FIELDS = list(DOCUMENT_FIELDS)
+
+
+def parse_fields(value: Optional[str]) -> List[str]:
+    """Comma-separated field names to a projection; ValueError on unknown fields"""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in DOCUMENT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_document_filters(args) -> Dict:
+    """
+    Filters from request arguments; ValueError when one is malformed
+
+    status and file_type accept comma-separated lists, uploaded_by a user id,
+    date_from / date_to ISO dates or timestamps (date_to is exclusive).
+    """
+    filters = {}
+    for key in ('status', 'file_type'):
+        value = args.get(key)
+        if value:
+            filters[key] = [item.strip().lower() for item in value.split(',') if item.strip()]
+    if args.get('uploaded_by'):
+        filters['uploaded_by'] = int(args['uploaded_by'])
+    for key in ('date_from', 'date_to'):
+        if args.get(key):
+            filters[key] = datetime.fromisoformat(args[key])
+    return filters
+
+
+def resolve_uploader_names(cursor, user_ids: Iterable[int], decrypt: Optional[Callable] = None) -> Dict[int, str]:
+    """{user_id: 'First Last'} from the encrypted name columns, plaintext without decrypt or as a fallback"""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+
+    cursor.execute('''
+        SELECT id, first_name_encrypted, last_name_encrypted, first_name, last_name
+        FROM users WHERE id = ANY(%s)
+    ''', (user_ids,))
+
+    names = {}
+    for row in cursor.fetchall():
+        parts = []
+        for encrypted, plain in ((row['first_name_encrypted'], row['first_name']),
+                                 (row['last_name_encrypted'], row['last_name'])):
+            try:
+                parts.append(decrypt(encrypted) if encrypted and decrypt else plain)
+            except Exception as e:
+                logger.warning(f"Could not decrypt name of user {row['id']}: {e}")
+                parts.append(plain)
+        names[row['id']] = ' '.join(part for part in parts if part) or 'Unknown'
+    return names
+
+
+def list_documents_page(cursor, org_id: int, filters: Optional[Dict] = None, fields: Optional[List[str]] = None,
+                        limit: int = DEFAULT_PAGE_SIZE, page_cursor: Optional[str] = None,
+                        decrypt: Optional[Callable] = None) -> Dict:
+    """
+    One page of an organization's non-deleted documents, newest first
+
+    Returns:
+        {'documents': [...], 'next_cursor': str or None}
+    """
+    filters = filters or {}
+    fields = fields or DEFAULT_FIELDS
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # id and upload_date are always needed for the cursor
+    columns = ['d.id', 'd.upload_date']
+    for field in fields:
+        columns.extend(column for column in DOCUMENT_FIELDS[field] if column not in columns)
+
+    query = f'''
+        SELECT {', '.join(columns)}
+        FROM documents d
+        WHERE d.organization_id = %s AND d.is_deleted = FALSE
+    '''
+    params = [org_id]
+
+    if filters.get('status'):
+        query += ' AND d.processing_status = ANY(%s)'
+        params.append(filters['status'])
+    if filters.get('file_type'):
+        query += ' AND LOWER(d.file_type) = ANY(%s)'
+        params.append(filters['file_type'])
+    if filters.get('uploaded_by'):
+        query += ' AND d.uploaded_by = %s'
+        params.append(filters['uploaded_by'])
+    if filters.get('date_from'):
+        query += ' AND d.upload_date >= %s'
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        query += ' AND d.upload_date < %s'
+        params.append(filters['date_to'])
+
+    if page_cursor:
+        upload_date, doc_id = decode_document_cursor(page_cursor)
+        query += ' AND (d.upload_date, d.id) < (%s, %s)'
+        params.extend([upload_date, doc_id])
+
+    query += ' ORDER BY d.upload_date DESC, d.id DESC LIMIT %s'
+    params.append(limit + 1)
+
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_page_cursor(rows[-1]['upload_date'], rows[-1]['id'])
+
+    names = {}
+    if 'uploaded_by' in fields:
+        names = resolve_uploader_names(cursor, (row['uploaded_by'] for row in rows), decrypt)
+
+    documents = []
+    for row in rows:
+        document = {}
+        for field in fields:
+            if field == 'upload_date':
+                document[field] = row['upload_date'].isoformat() if row['upload_date'] else None
+            elif field == 'uploaded_by':
+                document[field] = names.get(row['uploaded_by'], 'Unknown')
+            elif field == 'metadata':
+                document[field] = json.loads(row['metadata_json']) if row['metadata_json'] else {}
+            else:
+                document[field] = row[field]
+        documents.append(document)
+
+    return {'documents': documents, 'next_cursor': next_cursor}
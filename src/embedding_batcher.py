@@ -0,0 +1,362 @@
+"""
+Batched Embedding Generation
+
+Embeds many texts (document chunks, employee profiles) in as few API calls as
+possible:
+
+- Texts are packed into requests by token count (tiktoken) up to the
+  per-request limits of the embeddings endpoint
+- Several requests run concurrently, all drawing from one rate limiter that
+  is shared through Redis when REDIS_URL is set (per process otherwise)
+- Rate-limit and server errors are retried with backoff; a request rejected
+  for its input (400) is split in half until only the offending text is left
+  out, so one bad chunk never fails the whole document. Any other client
+  error (bad key, permissions, unknown model, invalid dimensions) fails the
+  batch at once instead of being bisected into thousands of requests
+- Token usage of every request is added to embedding_usage
+
+Usage:
+    embedder = BatchEmbedder(get_db_connection)
+    embeddings = embedder.embed(texts, org_id)   # aligned with texts; None for texts that failed
+
+    embed_document_chunks(get_db_connection, vector_store, embedder, doc_id, org_id, job_id)
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Limits of the /v1/embeddings endpoint
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300000
+MAX_TOKENS_PER_INPUT = 8191
+
+# USD per 1M tokens
+EMBEDDING_PRICES = {
+    'text-embedding-3-large': 0.13,
+    'text-embedding-3-small': 0.02,
+    'text-embedding-ada-002': 0.10,
+}
+
+MAX_RETRIES = 5
+
+
+class TokenCounter:
+    """tiktoken-based token counting and truncation (~4 chars per token without tiktoken)"""
+
+    def __init__(self, encoding_name: str = 'cl100k_base'):
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception:
+            self._encoding = None
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            return max(1, len(text) // 4)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self._encoding is None:
+            return text[:max_tokens * 4]
+        tokens = self._encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+
+
+def pack_batches(token_counts: Sequence[int], max_tokens: int = MAX_TOKENS_PER_REQUEST,
+                 max_items: int = MAX_INPUTS_PER_REQUEST) -> List[List[int]]:
+    """Greedily group text positions into requests under both per-request limits"""
+    batches, current, current_tokens = [], [], 0
+    for position, tokens in enumerate(token_counts):
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(position)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class SharedRateLimiter:
+    """
+    Per-minute request and token budget for the embeddings API
+
+    With Redis, all web and worker processes share one fixed-window counter;
+    otherwise the budget is per process.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 redis_url: Optional[str] = None, namespace: str = 'embeddings'):
+        self.requests_per_minute = requests_per_minute or int(os.environ.get('EMBEDDING_RATE_LIMIT_PER_MINUTE', 60))
+        self.tokens_per_minute = tokens_per_minute or int(os.environ.get('EMBEDDING_TOKENS_PER_MINUTE', 1000000))
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._window = None
+        self._used = [0, 0]
+
+        self._redis = None
+        redis_url = redis_url or os.environ.get('REDIS_URL')
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.from_url(redis_url)
+            except Exception as e:
+                logger.warning(f"Embedding rate limiter running per process: {e}")
+
+    def acquire(self, tokens: int) -> None:
+        """Block until a request of this many tokens fits in the current minute"""
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            window = int(time.time() // 60)
+            if self._try_acquire(window, tokens):
+                return
+            time.sleep(max(0.05, (window + 1) * 60 - time.time()))
+
+    def _try_acquire(self, window: int, tokens: int) -> bool:
+        if self._redis is not None:
+            try:
+                return self._try_acquire_redis(window, tokens)
+            except Exception as e:
+                logger.warning(f"Redis rate limiter unavailable, using local budget: {e}")
+
+        with self._lock:
+            if self._window != window:
+                self._window, self._used = window, [0, 0]
+            if self._used[0] + 1 > self.requests_per_minute or self._used[1] + tokens > self.tokens_per_minute:
+                return False
+            self._used[0] += 1
+            self._used[1] += tokens
+            return True
+
+    def _try_acquire_redis(self, window: int, tokens: int) -> bool:
+        request_key = f"ratelimit:{self.namespace}:{window}:requests"
+        token_key = f"ratelimit:{self.namespace}:{window}:tokens"
+        pipe = self._redis.pipeline()
+        pipe.incr(request_key)
+        pipe.incrby(token_key, tokens)
+        pipe.expire(request_key, 120)
+        pipe.expire(token_key, 120)
+        used_requests, used_tokens, _, _ = pipe.execute()
+
+        if used_requests > self.requests_per_minute or used_tokens > self.tokens_per_minute:
+            pipe = self._redis.pipeline()
+            pipe.decr(request_key)
+            pipe.decrby(token_key, tokens)
+            pipe.execute()
+            return False
+        return True
+
+
+class BatchEmbedder:
+    """Token-packed, concurrent, retrying embedding generation with usage accounting"""
+
+    def __init__(self, get_db_connection_func: Optional[Callable] = None, model: str = 'text-embedding-3-large',
+                 dimensions: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 rate_limiter: Optional[SharedRateLimiter] = None, client=None):
+        self.get_db_connection = get_db_connection_func
+        self.model = model
+        self.dimensions = dimensions
+        self.max_concurrency = max_concurrency or int(os.environ.get('EMBEDDING_CONCURRENCY', 4))
+        self.rate_limiter = rate_limiter or SharedRateLimiter()
+        self.token_counter = TokenCounter()
+
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+        self.client = client
+
+    def embed(self, texts: Sequence[str], org_id: Optional[int] = None) -> List[Optional[List[float]]]:
+        """Embeddings aligned with texts; None where a text could not be embedded"""
+        inputs = [self.token_counter.truncate(text, MAX_TOKENS_PER_INPUT) for text in texts]
+        token_counts = [self.token_counter.count(text) for text in inputs]
+        batches = pack_batches(token_counts)
+
+        results: List[Optional[List[float]]] = [None] * len(inputs)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [
+                executor.submit(self._embed_batch, [inputs[i] for i in batch], [token_counts[i] for i in batch], org_id)
+                for batch in batches
+            ]
+            for batch, future in zip(batches, futures):
+                for position, embedding in zip(batch, future.result()):
+                    results[position] = embedding
+
+        failed = sum(1 for embedding in results if embedding is None)
+        if failed:
+            logger.warning(f"{failed}/{len(results)} texts could not be embedded for org {org_id}")
+        return results
+
+    def _embed_batch(self, inputs: List[str], token_counts: List[int], org_id: Optional[int]) -> List[Optional[List[float]]]:
+        from openai import APIConnectionError, APIStatusError, BadRequestError, RateLimitError
+
+        for attempt in range(MAX_RETRIES):
+            self.rate_limiter.acquire(sum(token_counts))
+            try:
+                kwargs = {'model': self.model, 'input': inputs}
+                if self.dimensions:
+                    kwargs['dimensions'] = self.dimensions
+                response = self.client.embeddings.create(**kwargs)
+            except (RateLimitError, APIConnectionError) as e:
+                self._backoff(attempt, e)
+                continue
+            except BadRequestError as e:
+                if getattr(e, 'param', None) not in (None, 'input'):
+                    raise  # e.g. dimensions - every request would fail the same way
+                # The request was rejected for its content - isolate the failing texts
+                if len(inputs) == 1:
+                    logger.error(f"Embedding rejected for one text ({token_counts[0]} tokens): {e}")
+                    return [None]
+                middle = len(inputs) // 2
+                return (self._embed_batch(inputs[:middle], token_counts[:middle], org_id) +
+                        self._embed_batch(inputs[middle:], token_counts[middle:], org_id))
+            except APIStatusError as e:
+                if e.status_code >= 500:
+                    self._backoff(attempt, e)
+                    continue
+                raise  # Authentication, permission, not found: retrying or splitting can't help
+
+            usage = getattr(response, 'usage', None)
+            self._record_usage(org_id, getattr(usage, 'total_tokens', None) or sum(token_counts))
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+        logger.error(f"Embedding batch of {len(inputs)} texts failed after {MAX_RETRIES} attempts")
+        return [None] * len(inputs)
+
+    def _backoff(self, attempt: int, error: Exception) -> None:
+        delay = min(60, 2 ** attempt) + random.random()
+        logger.warning(f"Embedding request failed ({error}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+    def _record_usage(self, org_id: Optional[int], tokens: int) -> None:
+        if org_id is None or self.get_db_connection is None:
+            return
+
+        cost = tokens * EMBEDDING_PRICES.get(self.model, 0.13) / 1000000
+        conn = None
+        try:
+            conn = self.get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO embedding_usage (organization_id, date, tokens_used, api_calls, estimated_cost)
+                VALUES (%s, %s, %s, 1, %s)
+                ON CONFLICT (organization_id, date)
+                DO UPDATE SET tokens_used = embedding_usage.tokens_used + EXCLUDED.tokens_used,
+                              api_calls = embedding_usage.api_calls + 1,
+                              estimated_cost = embedding_usage.estimated_cost + EXCLUDED.estimated_cost
+            ''', (org_id, date.today(), tokens, cost))
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"Failed to record embedding usage for org {org_id}: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+
+def embed_document_chunks(get_db_connection_func: Callable, vector_store, embedder: BatchEmbedder,
+                          doc_id: int, org_id: int, job_id: Optional[str] = None,
+                          progress_range: Tuple[int, int] = (80, 100), write_batch_size: int = 500) -> Dict:
+    """
+    Embed a document's chunks and upsert them into the vector store
+
+    Chunks with text already embedded elsewhere in the organization reuse that
+    vector (see document_dedup). Vectors of chunk indexes the document no
+    longer has (it was reprocessed into fewer chunks), or whose chunk failed
+    to embed, are deleted; the previous run's range is read from
+    documents.vector_chunk_count. documents.vectors_updated_at is committed
+    before any vector is written, so a bulk re-embedding job running
+    meanwhile re-embeds the document before it swaps its shadow index in.
+    Returns {'chunks', 'embedded', 'reused', 'failed', 'removed'}.
+    """
+    from document_dedup import reuse_chunk_embeddings
+
+    conn = get_db_connection_func()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT file_type, vector_chunk_count FROM documents WHERE id = %s', (doc_id,))
+        document = cursor.fetchone()
+        cursor.execute('UPDATE documents SET vectors_updated_at = CURRENT_TIMESTAMP WHERE id = %s', (doc_id,))
+        conn.commit()
+        cursor.execute('''
+            SELECT id, chunk_index, chunk_text, metadata_json
+            FROM document_chunks
+            WHERE document_id = %s
+            ORDER BY chunk_index
+        ''', (doc_id,))
+        chunks = cursor.fetchall()
+
+        texts = [chunk['chunk_text'] for chunk in chunks]
+        embeddings: Dict[int, List[float]] = reuse_chunk_embeddings(cursor, vector_store, org_id, texts)
+        reused = len(embeddings)
+
+        pending = [position for position in range(len(chunks)) if position not in embeddings]
+        for position, embedding in zip(pending, embedder.embed([texts[p] for p in pending], org_id)):
+            if embedding is not None:
+                embeddings[position] = embedding
+
+        low, high = progress_range
+        positions = sorted(embeddings)
+        for start in range(0, len(positions), write_batch_size):
+            batch = positions[start:start + write_batch_size]
+            vectors, assignments = [], []
+            for position in batch:
+                chunk = chunks[position]
+                vector_id = f"doc_{doc_id}_chunk_{chunk['chunk_index']}"
+                metadata = json.loads(chunk['metadata_json']) if chunk['metadata_json'] else {}
+                metadata.update({
+                    'doc_id': doc_id,
+                    'org_id': org_id,
+                    'chunk_index': chunk['chunk_index'],
+                    'doc_type': document['file_type'] if document else None,
+                    'text': chunk['chunk_text'][:1000],
+                })
+                vectors.append({'id': vector_id, 'values': embeddings[position], 'metadata': metadata})
+                assignments.append((vector_id, chunk['id']))
+
+            vector_store.upsert_vectors(org_id, vectors, 'documents')
+            cursor.execute('''
+                UPDATE document_chunks AS dc SET embedding_id = v.embedding_id
+                FROM unnest(%s::text[], %s::int[]) AS v(embedding_id, chunk_id)
+                WHERE dc.id = v.chunk_id
+            ''', ([a[0] for a in assignments], [a[1] for a in assignments]))
+
+            if job_id:
+                progress = low + (high - low) * min(start + write_batch_size, len(positions)) // max(len(positions), 1)
+                cursor.execute('UPDATE processing_jobs SET progress = %s WHERE job_id = %s', (progress, job_id))
+            conn.commit()
+
+        # Vector ids are per chunk index, so an upsert never replaces the ids of dropped
+        # chunks; chunks that failed to embed must not keep an older text's vector either
+        chunk_range = max((chunk['chunk_index'] for chunk in chunks), default=-1) + 1
+        previous_range = (document['vector_chunk_count'] or 0) if document else 0
+        written = {chunks[position]['chunk_index'] for position in embeddings}
+        stale = [f"doc_{doc_id}_chunk_{index}" for index in range(max(previous_range, chunk_range)) if index not in written]
+        if stale:
+            vector_store.delete_vectors(org_id, stale, 'documents')
+        cursor.execute('UPDATE documents SET vector_chunk_count = %s WHERE id = %s', (chunk_range, doc_id))
+        conn.commit()
+
+        # Searches cached while the document was processing don't include it yet
+        from search_cache import bump_search_generation
+        bump_search_generation(org_id)
+
+        return {
+            'chunks': len(chunks),
+            'embedded': len(embeddings) - reused,
+            'reused': reused,
+            'failed': len(chunks) - len(embeddings),
+            'removed': len(stale),
+        }
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
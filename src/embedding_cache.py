@@ -0,0 +1,178 @@
+"""
+Query Embedding Cache
+
+Caches query embeddings so repeated searches and chat questions skip the
+embedding API call. Two tiers:
+
+- In-process LRU (per worker, no serialization)
+- Shared Redis tier (REDIS_URL), values stored as float16 bytes (~6KB for a
+  3072-dim vector) - cosine scores move by well under 0.01
+
+Keys are SHA-256 hashes of (model, organization, normalized query), so raw
+query text is never written to Redis. Cache hits are counted per organization
+and day in embedding_usage.cache_hits, flushed in batches.
+
+Usage:
+    cache = QueryEmbeddingCache(get_db_connection)
+    embedding_service = CachedEmbeddingService(EmbeddingService(model="text-embedding-3-large"), cache)
+    embedding = embedding_service.generate_single_embedding(query, org_id)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query used for cache keys"""
+    return ' '.join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Two-tier (LRU + Redis) cache of query embeddings with per-org hit accounting"""
+
+    def __init__(self, get_db_connection_func: Optional[Callable] = None, max_entries: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None, redis_url: Optional[str] = None):
+        self.get_db_connection = get_db_connection_func
+        self.max_entries = max_entries or int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 2048))
+        self.ttl_seconds = ttl_seconds or int(os.environ.get('QUERY_EMBEDDING_CACHE_TTL', 7 * 24 * 3600))
+
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._redis = None
+        redis_url = redis_url or os.environ.get('REDIS_URL')
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.from_url(redis_url)
+            except Exception as e:
+                logger.warning(f"Query embedding cache running without Redis tier: {e}")
+
+        # Pending hit counts per (org_id, date), flushed to embedding_usage in batches
+        self._pending_hits: Dict[Tuple[int, date], int] = {}
+        self._last_flush = time.monotonic()
+        self.flush_every_hits = 50
+        self.flush_every_seconds = 60
+
+    def key(self, model: str, org_id: Optional[int], text: str) -> str:
+        digest = hashlib.sha256(f"{model}\x00{org_id}\x00{normalize_query(text)}".encode('utf-8')).hexdigest()
+        return f"qemb:{digest}"
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+                return embedding
+
+        if self._redis is None:
+            return None
+
+        try:
+            raw = self._redis.get(key)
+        except Exception as e:
+            logger.warning(f"Redis read failed for query embedding cache: {e}")
+            return None
+        if raw is None:
+            return None
+
+        embedding = np.frombuffer(raw, dtype=np.float16).astype(np.float32).tolist()
+        self._remember(key, embedding)
+        return embedding
+
+    def set(self, key: str, embedding: List[float]) -> None:
+        self._remember(key, embedding)
+        if self._redis is not None:
+            try:
+                self._redis.set(key, np.asarray(embedding, dtype=np.float16).tobytes(), ex=self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Redis write failed for query embedding cache: {e}")
+
+    def get_or_create(self, model: str, org_id: Optional[int], text: str,
+                      create: Callable[[], List[float]]) -> List[float]:
+        """Return the cached embedding for text, calling create() and caching on a miss"""
+        key = self.key(model, org_id, text)
+        embedding = self.get(key)
+        if embedding is not None:
+            self.record_hit(org_id)
+            return embedding
+
+        embedding = create()
+        self.set(key, embedding)
+        return embedding
+
+    def record_hit(self, org_id: Optional[int]) -> None:
+        if org_id is None or self.get_db_connection is None:
+            return
+
+        with self._lock:
+            bucket = (int(org_id), date.today())
+            self._pending_hits[bucket] = self._pending_hits.get(bucket, 0) + 1
+            due = (sum(self._pending_hits.values()) >= self.flush_every_hits or
+                   time.monotonic() - self._last_flush >= self.flush_every_seconds)
+        if due:
+            self.flush_usage()
+
+    def flush_usage(self) -> None:
+        """Write pending cache hit counts to embedding_usage"""
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        conn = None
+        try:
+            conn = self.get_db_connection()
+            cursor = conn.cursor()
+            for (org_id, day), hits in pending.items():
+                cursor.execute('''
+                    INSERT INTO embedding_usage (organization_id, date, cache_hits)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (organization_id, date)
+                    DO UPDATE SET cache_hits = COALESCE(embedding_usage.cache_hits, 0) + EXCLUDED.cache_hits
+                ''', (org_id, day, hits))
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"Failed to record query embedding cache hits: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._lru[key] = embedding
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+
+class CachedEmbeddingService:
+    """
+    Wraps an EmbeddingService so generate_single_embedding() goes through a
+    QueryEmbeddingCache; every other attribute is delegated unchanged
+    """
+
+    def __init__(self, embedding_service, cache: QueryEmbeddingCache):
+        self._service = embedding_service
+        self._cache = cache
+        self.model = getattr(embedding_service, 'model', 'text-embedding-3-large')
+
+    def generate_single_embedding(self, text: str, org_id: Optional[int] = None, *args, **kwargs) -> List[float]:
+        return self._cache.get_or_create(
+            self.model, org_id, text,
+            lambda: self._service.generate_single_embedding(text, org_id, *args, **kwargs)
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._service, name)
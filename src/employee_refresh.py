@@ -0,0 +1,322 @@
+"""
+Incremental Employee Embedding Refresh
+
+Keeps the "employees" vector namespace in step with profiles and org
+membership without full rebuilds:
+
+1. Profile saves and membership changes call queue_employee_refresh(), which
+   upserts (organization_id, user_id) rows into employee_embedding_refresh in
+   the caller's transaction; repeated changes only move requested_at forward
+2. EmployeeEmbeddingRefresher.schedule() starts a per-process timer; when it
+   fires, refresh_due() claims every request older than the debounce window
+   (FOR UPDATE SKIP LOCKED, so several processes can run it) and commits the
+   claim before embedding, so profile saves never wait on the refresh. The
+   claimed requests are handled per organization; if an organization fails,
+   its requests are queued again, due REFRESH_RETRY_SECONDS later
+3. Each employee's profile snapshot is hashed and compared with the stored
+   employee_embeddings.profile_snapshot_json; only changed employees are
+   embedded, in one batched call per organization. Employees no longer in the
+   organization have their vector removed. Employees whose embedding failed
+   are queued again, due REFRESH_RETRY_SECONDS later
+4. Each process calls schedule() once at start, so requests left queued by a
+   restart are picked up without waiting for the next profile change
+
+Usage:
+    queue_employee_refresh(cursor, user_id=user_id)   # before conn.commit()
+    refresher.schedule()                              # after the commit
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+REFRESH_DEBOUNCE_SECONDS = int(os.environ.get('EMPLOYEE_REFRESH_DEBOUNCE', 30))
+REFRESH_BATCH_SIZE = 500
+REFRESH_RETRY_SECONDS = int(os.environ.get('EMPLOYEE_REFRESH_RETRY', 300))
+MAX_PROFILE_TEXT_CHARS = 8000
+
+# Snapshot fields that don't describe what someone knows or does
+EXCLUDED_PROFILE_FIELDS = {'id', 'user_id', 'created_at', 'updated_at', 'email', 'phone', 'postcode', 'linkedin_url'}
+
+
+def queue_employee_refresh(cursor, user_id: Optional[int] = None, org_id: Optional[int] = None,
+                           force: bool = False) -> None:
+    """
+    Request a refresh for one membership (user_id and org_id), all of a user's
+    organizations (user_id) or a whole organization (org_id); the caller commits
+
+    force re-embeds even when the snapshot is unchanged.
+    """
+    if user_id is not None and org_id is not None:
+        # Explicit pair: also covers memberships that were just removed
+        source, params = 'SELECT %s, %s, %s', [org_id, user_id, force]
+    elif user_id is not None:
+        source = '''
+            SELECT organization_id, user_id, %s FROM organization_members
+            WHERE user_id = %s AND is_active = TRUE
+        '''
+        params = [force, user_id]
+    elif org_id is not None:
+        source = '''
+            SELECT organization_id, user_id, %s FROM organization_members
+            WHERE organization_id = %s AND is_active = TRUE
+        '''
+        params = [force, org_id]
+    else:
+        raise ValueError('queue_employee_refresh needs a user_id, an org_id or both')
+
+    cursor.execute(f'''
+        INSERT INTO employee_embedding_refresh (organization_id, user_id, force)
+        {source}
+        ON CONFLICT (organization_id, user_id)
+        DO UPDATE SET requested_at = CURRENT_TIMESTAMP,
+                      force = employee_embedding_refresh.force OR EXCLUDED.force
+    ''', params)
+
+
+def load_profile_snapshots(cursor, org_id: int, user_ids: List[int]) -> Dict[int, Dict]:
+    """{user_id: snapshot} for active members of the organization; others are omitted"""
+    cursor.execute('''
+        SELECT u.id AS user_id, u.first_name, u.last_name, om.role,
+               to_jsonb(up) AS profile
+        FROM organization_members om
+        JOIN users u ON u.id = om.user_id
+        LEFT JOIN user_profiles up ON up.user_id = u.id
+        WHERE om.organization_id = %s AND om.user_id = ANY(%s) AND om.is_active = TRUE
+    ''', (org_id, user_ids))
+
+    snapshots = {}
+    for row in cursor.fetchall():
+        profile = dict(row['profile'] or {})
+        if isinstance(profile.get('profile_data'), str):
+            try:
+                profile.update(json.loads(profile.pop('profile_data')))
+            except ValueError:
+                pass
+        snapshots[row['user_id']] = {
+            'name': ' '.join(part for part in (row['first_name'], row['last_name']) if part),
+            'role': row['role'],
+            'profile': {key: value for key, value in profile.items()
+                        if key not in EXCLUDED_PROFILE_FIELDS and value not in (None, '', [], {})},
+        }
+    return snapshots
+
+
+def serialize_snapshot(snapshot: Dict) -> str:
+    """Canonical JSON stored in employee_embeddings.profile_snapshot_json"""
+    return json.dumps(snapshot, sort_keys=True, default=str)
+
+
+def snapshot_hash(serialized_snapshot: Optional[str]) -> Optional[str]:
+    if not serialized_snapshot:
+        return None
+    return hashlib.sha256(serialized_snapshot.encode('utf-8')).hexdigest()
+
+
+def profile_text(snapshot: Dict) -> str:
+    """Text embedded for an employee: name, org role and every profile field"""
+    lines = [snapshot['name'], f"Role: {snapshot['role']}"]
+    for key, value in sorted(snapshot['profile'].items()):
+        if isinstance(value, (list, tuple)):
+            value = ', '.join(str(item) for item in value)
+        elif isinstance(value, dict):
+            value = '; '.join(f"{k}: {v}" for k, v in value.items())
+        lines.append(f"{key.replace('_', ' ').capitalize()}: {value}")
+    return '\n'.join(line for line in lines if line)[:MAX_PROFILE_TEXT_CHARS]
+
+
+class EmployeeEmbeddingRefresher:
+    """Debounced, batched re-embedding of employees whose profile snapshot changed"""
+
+    def __init__(self, get_db_connection_func: Callable, vector_store=None, embedder=None,
+                 debounce_seconds: int = REFRESH_DEBOUNCE_SECONDS, batch_size: int = REFRESH_BATCH_SIZE):
+        self.get_db_connection = get_db_connection_func
+        self.vector_store = vector_store
+        self.embedder = embedder
+        self.debounce_seconds = debounce_seconds
+        self.batch_size = batch_size
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def schedule(self, delay: Optional[float] = None) -> None:
+        """Run refresh_due() once the debounce window has passed, unless a run is already scheduled"""
+        with self._timer_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.debounce_seconds + 1 if delay is None else delay, self._run_scheduled)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run_scheduled(self) -> None:
+        with self._timer_lock:
+            self._timer = None
+        try:
+            self.refresh_due()
+            wait = self._seconds_until_next_due()
+            if wait is not None:
+                self.schedule(wait)
+        except Exception as e:
+            logger.error(f"Employee embedding refresh failed: {e}")
+
+    def refresh_due(self) -> Dict[str, int]:
+        """
+        Process every refresh request older than the debounce window
+
+        Returns:
+            {'checked', 'embedded', 'unchanged', 'removed', 'failed'}
+        """
+        summary = {'checked': 0, 'embedded': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute('''
+                    DELETE FROM employee_embedding_refresh
+                    WHERE (organization_id, user_id) IN (
+                        SELECT organization_id, user_id FROM employee_embedding_refresh
+                        WHERE requested_at <= CURRENT_TIMESTAMP - make_interval(secs => %s)
+                        ORDER BY organization_id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING organization_id, user_id, force
+                ''', (self.debounce_seconds, self.batch_size))
+                claimed = cursor.fetchall()
+                # Release the row locks before any embedding call; failures are queued again below
+                conn.commit()
+                if not claimed:
+                    break
+
+                by_org: Dict[int, Dict[int, bool]] = {}
+                for row in claimed:
+                    by_org.setdefault(row['organization_id'], {})[row['user_id']] = row['force']
+
+                for org_id, users in by_org.items():
+                    try:
+                        counts = self._refresh_org(cursor, org_id, users)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logger.error(f"Employee embedding refresh failed for org {org_id}: {e}")
+                        self._requeue(cursor, org_id, users)
+                        conn.commit()
+                        counts = {'checked': len(users), 'failed': len(users)}
+                    for key, count in counts.items():
+                        summary[key] += count
+
+            if summary['checked']:
+                logger.info(f"Employee embedding refresh: {summary}")
+            return summary
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _refresh_org(self, cursor, org_id: int, users: Dict[int, bool]) -> Dict[str, int]:
+        user_ids = list(users)
+        snapshots = load_profile_snapshots(cursor, org_id, user_ids)
+
+        cursor.execute('''
+            SELECT user_id, embedding_id, profile_snapshot_json
+            FROM employee_embeddings
+            WHERE organization_id = %s AND user_id = ANY(%s)
+        ''', (org_id, user_ids))
+        existing = {row['user_id']: row for row in cursor.fetchall()}
+
+        serialized = {user_id: serialize_snapshot(snapshot) for user_id, snapshot in snapshots.items()}
+        changed = [
+            user_id for user_id in serialized
+            if users[user_id] or user_id not in existing
+            or snapshot_hash(existing[user_id]['profile_snapshot_json']) != snapshot_hash(serialized[user_id])
+        ]
+        removed = [user_id for user_id in user_ids if user_id not in snapshots and user_id in existing]
+
+        vector_store = self._get_vector_store()
+        counts = {'checked': len(user_ids), 'embedded': 0, 'unchanged': len(serialized) - len(changed),
+                  'removed': len(removed), 'failed': 0}
+
+        if changed:
+            embeddings = self._get_embedder().embed([profile_text(snapshots[user_id]) for user_id in changed], org_id)
+            vectors, rows, failed = [], [], []
+            for user_id, embedding in zip(changed, embeddings):
+                if embedding is None:
+                    failed.append(user_id)
+                    continue
+                embedding_id = existing[user_id]['embedding_id'] if user_id in existing else f"employee_{org_id}_{user_id}"
+                vectors.append({
+                    'id': embedding_id,
+                    'values': embedding,
+                    'metadata': {'user_id': user_id, 'org_id': org_id, 'name': snapshots[user_id]['name'],
+                                 'role': snapshots[user_id]['role']},
+                })
+                rows.append((user_id, org_id, embedding_id, serialized[user_id]))
+
+            if vectors:
+                vector_store.upsert_vectors(org_id, vectors, 'employees')
+                execute_values(cursor, '''
+                    INSERT INTO employee_embeddings (user_id, organization_id, embedding_id, profile_snapshot_json)
+                    VALUES %s
+                    ON CONFLICT (user_id, organization_id)
+                    DO UPDATE SET embedding_id = EXCLUDED.embedding_id,
+                                  profile_snapshot_json = EXCLUDED.profile_snapshot_json,
+                                  last_updated = CURRENT_TIMESTAMP
+                ''', rows)
+            counts['embedded'] = len(vectors)
+            counts['failed'] = len(failed)
+
+            if failed:
+                # Their claims are already committed; queue the failures again for a later retry
+                self._requeue(cursor, org_id, {user_id: users[user_id] for user_id in failed})
+
+        if removed:
+            vector_store.delete_vectors(org_id, [existing[user_id]['embedding_id'] for user_id in removed], 'employees')
+            cursor.execute('''
+                DELETE FROM employee_embeddings WHERE organization_id = %s AND user_id = ANY(%s)
+            ''', (org_id, removed))
+
+        return counts
+
+    def _requeue(self, cursor, org_id: int, users: Dict[int, bool]) -> None:
+        """Queue claimed requests again, due REFRESH_RETRY_SECONDS from now; the caller commits"""
+        execute_values(cursor, '''
+            INSERT INTO employee_embedding_refresh (organization_id, user_id, force, requested_at)
+            VALUES %s
+            ON CONFLICT (organization_id, user_id)
+            DO UPDATE SET requested_at = GREATEST(employee_embedding_refresh.requested_at, EXCLUDED.requested_at),
+                          force = employee_embedding_refresh.force OR EXCLUDED.force
+        ''', [(org_id, user_id, force, REFRESH_RETRY_SECONDS) for user_id, force in users.items()],
+            template='(%s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))')
+
+    def _seconds_until_next_due(self) -> Optional[float]:
+        """Seconds until the oldest remaining request leaves the debounce window, None when idle"""
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT EXTRACT(EPOCH FROM MIN(requested_at) + make_interval(secs => %s) - CURRENT_TIMESTAMP) AS wait
+                FROM employee_embedding_refresh
+            ''', (self.debounce_seconds,))
+            wait = cursor.fetchone()['wait']
+            return None if wait is None else max(1.0, float(wait) + 1)
+        finally:
+            conn.close()
+
+    def _get_vector_store(self):
+        if self.vector_store is None:
+            from local_vector_store import create_vector_store
+            self.vector_store = create_vector_store("flock-knowledge-base")
+        return self.vector_store
+
+    def _get_embedder(self):
+        if self.embedder is None:
+            from embedding_batcher import BatchEmbedder
+            self.embedder = BatchEmbedder(self.get_db_connection)
+        return self.embedder
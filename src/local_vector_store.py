@@ -0,0 +1,854 @@
+"""
+Local On-Disk Vector Store
+
+Drop-in replacement for the Pinecone-backed VectorStore that keeps vectors on
+local disk, one directory per organization and namespace ("documents",
+"employees"):
+
+    <VECTOR_STORE_PATH>/<index_name>/org_<id>/
+        layout.json           - dimensions/dtype/rerank used for new segments (configure())
+        <namespace>/
+            manifest.json     - dimension, dtype, rerank, row and tombstone counts, version, file generation
+            vectors.bin       - row-major float32/float16/int8 matrix (memory-mapped for reads)
+            scales.bin        - per-row float32 scale factors (int8 only)
+            vectors_full.bin  - float32 copy used to re-rank candidates (only when rerank is on)
+            records.jsonl     - one {"id", "metadata"} line per matrix row
+            tombstones.jsonl  - rows removed by deletes or superseded by upserts
+            index.hnsw        - HNSW graph over the rows (only when hnswlib is installed)
+
+Vectors are L2-normalized on write, so scores are cosine similarities like the
+Pinecone index. Upserts append rows and tombstone the previous row for the same
+id; deletes only write tombstones. Without hnswlib, queries fall back to an
+exact scan of the memory-mapped matrix.
+
+The manifest is the commit point: appends become visible when it is rewritten
+with the new row and tombstone counts. A writer first truncates every file to
+the lengths the manifest records, so bytes left behind by a crash between the
+append and the manifest write are discarded instead of shifting later rows.
+
+Shortened embeddings: text-embedding-3 vectors can be cut to their first N
+dimensions and renormalized (the same thing the API's `dimensions` parameter
+does), so an org configured with a smaller dimension stores truncated vectors
+and queries are truncated the same way - full-size query embeddings keep
+working. int8 rows are scaled per row to [-127, 127]. With rerank on, the
+top_k * RERANK_FACTOR candidates from the compact matrix are re-scored against
+vectors_full.bin before results are returned.
+
+compact() and reindex() write the rewritten files as a new generation
+(vectors.<n>.bin, ...) and switch to it by rewriting the manifest, so readers
+never see a half-written segment. The previous generation is removed on the
+next rewrite. Bulk re-embedding fills a shadow namespace ("documents.shadow")
+that swap_namespace() moves into place the same way.
+
+Usage:
+    from local_vector_store import create_vector_store
+
+    vector_store = create_vector_store("flock-knowledge-base")  # honours VECTOR_STORE_BACKEND
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # Optional: exact search is used instead
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+NAMESPACES = ('documents', 'employees')
+SHADOW_SUFFIX = '.shadow'
+SUPPORTED_DTYPES = ('float32', 'float16', 'int8')
+RERANK_FACTOR = 4
+RERANK_MARGIN = 0.05  # Quantized scores can undershoot min_score by this much before re-ranking
+RECALL_AT = 10
+DATA_FILES = ('vectors.bin', 'scales.bin', 'vectors_full.bin', 'records.jsonl', 'tombstones.jsonl', 'index.hnsw')
+
+
+def create_vector_store(index_name: str = "flock-knowledge-base"):
+    """
+    Create the vector store selected by VECTOR_STORE_BACKEND ("pinecone" or "local")
+
+    Both backends expose search_documents() and search_employees() with the same
+    arguments and result shape ({'id', 'score', 'metadata'} dicts).
+    """
+    backend = os.environ.get('VECTOR_STORE_BACKEND', 'pinecone').lower()
+
+    if backend == 'local':
+        return LocalVectorStore(index_name=index_name)
+
+    from vector_store import VectorStore
+    return VectorStore(index_name=index_name)
+
+
+def shadow_namespace(namespace: str) -> str:
+    """Namespace a bulk re-embedding job writes to before swap_namespace()"""
+    return f"{namespace}{SHADOW_SUFFIX}"
+
+
+class _NamespaceSegment:
+    """Read-only view of one org/namespace directory, cached until its manifest changes"""
+
+    def __init__(self, path: str, manifest: Dict[str, Any]):
+        self.path = path
+        self.version = manifest['version']
+        self.dim = manifest['dim']
+        self.count = manifest['count']
+        self.dtype = np.dtype(manifest['dtype'])
+
+        self.matrix = None
+        self.scales = None
+        self.full = None
+        if self.count:
+            self.matrix = np.memmap(
+                _data_file(path, manifest, 'vectors.bin'),
+                dtype=self.dtype, mode='r', shape=(self.count, self.dim)
+            )
+            if self.dtype == np.int8:
+                self.scales = np.memmap(
+                    _data_file(path, manifest, 'scales.bin'), dtype=np.float32, mode='r', shape=(self.count,)
+                )
+            if manifest.get('rerank'):
+                self.full = np.memmap(
+                    _data_file(path, manifest, 'vectors_full.bin'),
+                    dtype=np.float32, mode='r', shape=(self.count, self.dim)
+                )
+
+        self.records = _read_jsonl(_data_file(path, manifest, 'records.jsonl'), self.count)
+        self.deleted = _tombstoned_rows(path, manifest)
+
+        self.index = None
+        index_path = _data_file(path, manifest, 'index.hnsw')
+        if hnswlib is not None and self.count and os.path.exists(index_path):
+            try:
+                self.index = hnswlib.Index(space='ip', dim=self.dim)
+                self.index.load_index(index_path, max_elements=self.count)
+            except Exception as e:
+                logger.warning(f"Could not load HNSW index at {index_path}, using exact search: {e}")
+                self.index = None
+
+    @property
+    def live_count(self) -> int:
+        return self.count - len(self.deleted)
+
+    def rows(self, rows) -> np.ndarray:
+        """float32 values of the given rows (a slice or an index array), dequantized"""
+        return _dequantize(self.matrix[rows], None if self.scales is None else self.scales[rows])
+
+    def vectors(self, rows) -> np.ndarray:
+        """Most precise stored values of the given rows: the re-rank copy when there is one"""
+        if self.full is not None:
+            return np.asarray(self.full[rows], dtype=np.float32)
+        return self.rows(rows)
+
+    def query(self, query_vector: np.ndarray, top_k: int, min_score: float,
+              metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return up to top_k live rows scoring >= min_score that match the metadata filter"""
+        if not self.count or not self.live_count:
+            return []
+
+        def is_match(row: int) -> bool:
+            if row in self.deleted or row >= self.count:
+                return False
+            if metadata_filter:
+                metadata = self.records[row].get('metadata', {})
+                return all(metadata.get(key) == value for key, value in metadata_filter.items())
+            return True
+
+        rerank = self.full is not None
+        candidate_k = top_k * RERANK_FACTOR if rerank else top_k
+        threshold = min_score - RERANK_MARGIN if rerank else min_score
+
+        if self.index is not None:
+            k = min(candidate_k, self.live_count)
+            self.index.set_ef(max(64, k * 4))
+            try:
+                labels, distances = self.index.knn_query(query_vector, k=k, filter=is_match)
+                candidates = [(int(row), 1.0 - float(distance)) for row, distance in zip(labels[0], distances[0])]
+            except RuntimeError:
+                # Filter too selective for the graph to return k results - scan instead
+                candidates = self._exact_candidates(query_vector, is_match, candidate_k, threshold)
+        else:
+            candidates = self._exact_candidates(query_vector, is_match, candidate_k, threshold)
+
+        if rerank and candidates:
+            rows = np.asarray(sorted(row for row, _ in candidates))
+            exact_scores = np.asarray(self.full[rows], dtype=np.float32) @ query_vector
+            candidates = list(zip(rows.tolist(), exact_scores.tolist()))
+
+        results = []
+        for row, score in sorted(candidates, key=lambda c: c[1], reverse=True):
+            if score < min_score:
+                break
+            record = self.records[row]
+            results.append({'id': record['id'], 'score': float(score), 'metadata': record.get('metadata', {})})
+            if len(results) >= top_k:
+                break
+        return results
+
+    def _exact_candidates(self, query_vector: np.ndarray, is_match, top_k: int, min_score: float,
+                          block_rows: int = 65536):
+        """Brute-force scan of the memory-mapped matrix, keeping the best top_k matches per block"""
+        candidates = []
+        for start in range(0, self.count, block_rows):
+            block = self.rows(slice(start, start + block_rows))
+            scores = block @ query_vector
+            above = np.nonzero(scores >= min_score)[0]
+            kept = 0
+            for offset in above[np.argsort(-scores[above])]:
+                row = start + int(offset)
+                if is_match(row):
+                    candidates.append((row, float(scores[offset])))
+                    kept += 1
+                    if kept >= top_k:
+                        break
+        return candidates
+
+
+class LocalVectorStore:
+    """File-backed vector store with the same search interface as VectorStore"""
+
+    def __init__(self, index_name: str = "flock-knowledge-base", base_path: Optional[str] = None,
+                 dtype: Optional[str] = None):
+        self.index_name = index_name
+        self.base_path = os.path.join(
+            base_path or os.environ.get('VECTOR_STORE_PATH', os.path.join('data', 'vectors')),
+            index_name
+        )
+        self.dtype = dtype or os.environ.get('VECTOR_STORE_DTYPE', 'float32')
+        if self.dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{self.dtype}', expected one of {SUPPORTED_DTYPES}")
+
+        self._segments: Dict[str, _NamespaceSegment] = {}
+        self._segments_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search_documents(self, org_id: int, query_embedding: List[float], top_k: int = 10,
+                         doc_type: Optional[str] = None, min_score: float = 0.7) -> List[Dict[str, Any]]:
+        """Semantic search over an organization's document chunks"""
+        metadata_filter = {'doc_type': doc_type} if doc_type else None
+        return self._query(org_id, 'documents', query_embedding, top_k, min_score, metadata_filter)
+
+    def search_employees(self, org_id: int, query_embedding: List[float], top_k: int = 10,
+                         min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """Semantic search over an organization's employee profile embeddings"""
+        return self._query(org_id, 'employees', query_embedding, top_k, min_score)
+
+    def get_stats(self, org_id: int) -> Dict[str, Any]:
+        """Live vector counts per namespace for an organization"""
+        stats = {'backend': 'local', 'hnsw': hnswlib is not None, 'layout': self.get_layout(org_id)}
+        for namespace in NAMESPACES:
+            segment = self._segment(org_id, namespace)
+            stats[namespace] = segment.live_count if segment else 0
+        return stats
+
+    def fetch_vectors(self, org_id: int, ids: Iterable[str], namespace: str = 'documents') -> Dict[str, Dict[str, Any]]:
+        """Stored (normalized) values and metadata for the given ids; missing ids are omitted"""
+        segment = self._segment(org_id, namespace)
+        ids = {str(i) for i in ids}
+        if segment is None or not ids:
+            return {}
+
+        found = {}
+        for row, record in enumerate(segment.records):
+            if record['id'] in ids and row not in segment.deleted:
+                found[record['id']] = {
+                    'values': segment.vectors(slice(row, row + 1))[0].tolist(),
+                    'metadata': record.get('metadata', {})
+                }
+        return found
+
+    def _query(self, org_id: int, namespace: str, query_embedding: List[float], top_k: int,
+               min_score: float, metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        segment = self._segment(org_id, namespace)
+        if segment is None:
+            return []
+
+        query_vector = _normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))
+        query_vector = _shorten(query_vector, segment.dim)[0]
+
+        return segment.query(query_vector, top_k, min_score or 0.0, metadata_filter)
+
+    def _segment(self, org_id: int, namespace: str) -> Optional[_NamespaceSegment]:
+        """Cached segment for org/namespace, reopened whenever a writer bumps the manifest"""
+        path = self._namespace_path(org_id, namespace)
+        manifest = _read_manifest(path)
+        if manifest is None:
+            return None
+
+        with self._segments_lock:
+            segment = self._segments.get(path)
+            if segment is None or segment.version != manifest['version']:
+                segment = _NamespaceSegment(path, manifest)
+                self._segments[path] = segment
+            return segment
+
+    # ------------------------------------------------------------------
+    # Layout (shortened / quantized vectors)
+    # ------------------------------------------------------------------
+
+    def configure(self, org_id: int, dim: Optional[int] = None, dtype: str = 'float32',
+                  rerank: bool = False) -> Dict[str, Any]:
+        """
+        Set the storage layout for an organization
+
+        Applies to namespaces created afterwards; existing namespaces keep their
+        layout until reindex() rewrites them.
+
+        Args:
+            dim: Stored dimensions (None keeps the embedding model's full size)
+            dtype: 'float32', 'float16' or 'int8'
+            rerank: Keep a float32 copy to re-rank candidates (ignored for float32)
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{dtype}', expected one of {SUPPORTED_DTYPES}")
+        if dim is not None and int(dim) < 1:
+            raise ValueError('Vector dimensions must be positive')
+
+        layout = {'dim': int(dim) if dim else None, 'dtype': dtype, 'rerank': bool(rerank) and dtype != 'float32'}
+        org_path = os.path.join(self.base_path, f"org_{int(org_id)}")
+        os.makedirs(org_path, exist_ok=True)
+        _atomic_write(os.path.join(org_path, 'layout.json'), json.dumps(layout).encode('utf-8'))
+        return layout
+
+    def get_layout(self, org_id: int) -> Dict[str, Any]:
+        """Configured layout for an organization (store defaults when configure() was never called)"""
+        try:
+            with open(os.path.join(self.base_path, f"org_{int(org_id)}", 'layout.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'dim': None, 'dtype': self.dtype, 'rerank': False}
+
+    def reindex(self, org_id: int, namespace: str = 'documents', sample_queries: int = 50) -> Dict[str, Any]:
+        """
+        Rewrite an org/namespace into its configured layout, dropping tombstoned rows
+
+        Recall is measured on sample_queries stored vectors: exact top-10
+        neighbours over the old full-precision vectors against a search of the
+        rewritten segment (each query's own row excluded).
+
+        Returns:
+            {'rows', 'dropped', 'dim', 'dtype', 'rerank', 'vector_bytes_before',
+             'vector_bytes_after', 'rerank_bytes', 'disk_bytes_before',
+             'disk_bytes_after', 'recall_at_10'}
+
+            vector_bytes_* cover only the matrix scanned on every query;
+            disk_bytes_* are every file of the generation, including the float32
+            re-rank copy and the HNSW graph.
+        """
+        path = self._namespace_path(org_id, namespace)
+        if _read_manifest(path) is None:
+            return {'rows': 0, 'dropped': 0, 'recall_at_10': None}
+
+        with _locked(path):
+            return self._rewrite(path, self.get_layout(org_id), sample_queries)
+
+    # ------------------------------------------------------------------
+    # Writes (used by the ingestion and embedding tasks)
+    # ------------------------------------------------------------------
+
+    def upsert_vectors(self, org_id: int, vectors: List[Dict[str, Any]], namespace: str = 'documents') -> int:
+        """
+        Insert or replace vectors for an organization
+
+        Args:
+            vectors: [{'id': str, 'values': [...], 'metadata': {...}}, ...]
+
+        Returns:
+            Number of vectors written
+        """
+        if not vectors:
+            return 0
+        if namespace not in NAMESPACES and namespace not in map(shadow_namespace, NAMESPACES):
+            raise ValueError(f"Unknown namespace '{namespace}'")
+
+        path = self._namespace_path(org_id, namespace)
+        os.makedirs(path, exist_ok=True)
+
+        matrix = _normalize(np.asarray([v['values'] for v in vectors], dtype=np.float32))
+
+        with _locked(path):
+            manifest = _read_manifest(path)
+            if manifest is None:
+                layout = self.get_layout(org_id)
+                manifest = {
+                    'dim': layout['dim'] or matrix.shape[1], 'dtype': layout['dtype'],
+                    'rerank': layout['rerank'], 'count': 0, 'tombstones': 0, 'version': 0, 'generation': 0
+                }
+            matrix = _shorten(matrix, manifest['dim'])
+            _truncate_to_manifest(path, manifest)
+
+            start_row = manifest['count']
+            superseded = self._live_rows_for_ids(path, manifest, {str(v['id']) for v in vectors})
+
+            _append_rows(path, manifest, matrix)
+            _append_jsonl(_data_file(path, manifest, 'records.jsonl'), (
+                {'id': str(v['id']), 'metadata': v.get('metadata', {})} for v in vectors
+            ))
+            _append_jsonl(_data_file(path, manifest, 'tombstones.jsonl'), ({'row': row} for row in superseded))
+
+            manifest['count'] = start_row + len(vectors)
+            manifest['tombstones'] += len(superseded)
+            self._update_hnsw(path, manifest, matrix, start_row, superseded)
+            manifest['version'] += 1
+            _write_manifest(path, manifest)
+
+        return len(vectors)
+
+    def delete_vectors(self, org_id: int, ids: Iterable[str], namespace: str = 'documents') -> int:
+        """Tombstone vectors by id; rows are reclaimed by compact()"""
+        path = self._namespace_path(org_id, namespace)
+        ids = {str(i) for i in ids}
+        if not ids or _read_manifest(path) is None:
+            return 0
+
+        with _locked(path):
+            manifest = _read_manifest(path)
+            _truncate_to_manifest(path, manifest)
+            rows = self._live_rows_for_ids(path, manifest, ids)
+            if rows:
+                _append_jsonl(_data_file(path, manifest, 'tombstones.jsonl'), ({'row': row} for row in rows))
+                manifest['tombstones'] += len(rows)
+                self._update_hnsw(path, manifest, None, manifest['count'], rows)
+                manifest['version'] += 1
+                _write_manifest(path, manifest)
+        return len(rows)
+
+    def delete_document(self, org_id: int, doc_id: int, namespace: str = 'documents') -> int:
+        """Tombstone every chunk vector belonging to a document"""
+        segment = self._segment(org_id, namespace)
+        if segment is None:
+            return 0
+        ids = [
+            record['id'] for row, record in enumerate(segment.records)
+            if row not in segment.deleted and record.get('metadata', {}).get('doc_id') == doc_id
+        ]
+        return self.delete_vectors(org_id, ids, namespace)
+
+    def compact(self, org_id: int, namespace: str = 'documents') -> int:
+        """Rewrite an org/namespace without tombstoned rows; returns the number of rows dropped"""
+        path = self._namespace_path(org_id, namespace)
+        if _read_manifest(path) is None:
+            return 0
+
+        with _locked(path):
+            manifest = _read_manifest(path)
+            deleted = _tombstoned_rows(path, manifest)
+            if not deleted:
+                return 0
+            layout = {'dim': manifest['dim'], 'dtype': manifest['dtype'], 'rerank': manifest.get('rerank', False)}
+            return self._rewrite(path, layout)['dropped']
+
+    def swap_namespace(self, org_id: int, source: str, target: str,
+                       before_swap: Optional[Callable[[], None]] = None) -> int:
+        """
+        Atomically replace target with the contents of source (a shadow namespace)
+
+        The source files become a new generation of target and the target
+        manifest is switched to it; searches see either the old or the new
+        vectors, never a mix. Returns the number of rows now in target.
+
+        The target generation is recorded in the source manifest before any
+        file moves, so a swap interrupted halfway can be retried: files
+        already moved are kept and only the rest are moved.
+
+        before_swap runs with target already locked against writers (it is
+        skipped when retrying an interrupted swap), so nothing written to
+        target after it started is lost by the swap.
+        """
+        source_path = self._namespace_path(org_id, source)
+        target_path = self._namespace_path(org_id, target)
+        source_manifest = _read_manifest(source_path)
+        if source_manifest is None:
+            raise ValueError(f"Namespace '{source}' has no vectors to swap in")
+        os.makedirs(target_path, exist_ok=True)
+
+        with _locked(target_path):
+            if before_swap is not None and 'swap_generation' not in _read_manifest(source_path):
+                before_swap()
+
+            with _locked(source_path):
+                source_manifest = _read_manifest(source_path)
+                target_manifest = _read_manifest(target_path) or {'version': 0, 'generation': -1}
+                target_generation = target_manifest.get('generation', 0)
+                pending = source_manifest.pop('swap_generation', None)
+
+                if pending is not None and pending == target_generation:
+                    # Interrupted after the target manifest was switched: only cleanup is left
+                    manifest = target_manifest
+                else:
+                    if pending is None:
+                        pending = target_generation + 1
+                        _remove_generation(target_path, pending)  # leftovers of an interrupted rewrite
+                        _write_manifest(source_path, dict(source_manifest, swap_generation=pending))
+                    elif pending != target_generation + 1:
+                        raise ValueError(
+                            f"Namespace '{target}' was rewritten during an interrupted swap of '{source}'; "
+                            "rebuild the shadow namespace"
+                        )
+
+                    manifest = dict(source_manifest, version=target_manifest['version'] + 1, generation=pending)
+                    for name in DATA_FILES:
+                        source_file = _data_file(source_path, source_manifest, name)
+                        if os.path.exists(source_file):
+                            os.replace(source_file, _data_file(target_path, manifest, name))
+
+                    _write_manifest(target_path, manifest)
+                _remove_generation(target_path, manifest['generation'] - 2)
+                os.remove(os.path.join(source_path, 'manifest.json'))
+
+        shutil.rmtree(source_path, ignore_errors=True)
+        return manifest['count'] - len(_tombstoned_rows(target_path, manifest))
+
+    def has_namespace(self, org_id: int, namespace: str) -> bool:
+        return _read_manifest(self._namespace_path(org_id, namespace)) is not None
+
+    def drop_namespace(self, org_id: int, namespace: str) -> None:
+        """Delete every vector of an org/namespace (used to discard a shadow namespace)"""
+        path = self._namespace_path(org_id, namespace)
+        if not os.path.isdir(path):
+            return
+        with _locked(path):
+            try:
+                os.remove(os.path.join(path, 'manifest.json'))
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(path, ignore_errors=True)
+
+    def _namespace_path(self, org_id: int, namespace: str) -> str:
+        return os.path.join(self.base_path, f"org_{int(org_id)}", namespace)
+
+    def _live_rows_for_ids(self, path: str, manifest: Dict[str, Any], ids: set) -> List[int]:
+        deleted = _tombstoned_rows(path, manifest)
+        records = _read_jsonl(_data_file(path, manifest, 'records.jsonl'), manifest['count'])
+        return [row for row, record in enumerate(records) if record['id'] in ids and row not in deleted]
+
+    def _rewrite(self, path: str, layout: Dict[str, Any], sample_queries: int = 0,
+                 block_rows: int = 65536) -> Dict[str, Any]:
+        """
+        Copy the live rows into a new file generation with the given layout and
+        switch the manifest to it; the caller holds the namespace lock
+        """
+        old_manifest = _read_manifest(path)
+        disk_bytes_before = _disk_bytes(path, old_manifest)
+        source = _NamespaceSegment(path, old_manifest)
+        live_rows = np.asarray([row for row in range(source.count) if row not in source.deleted], dtype=np.int64)
+
+        manifest = {
+            'dim': layout['dim'] or source.dim, 'dtype': layout['dtype'],
+            'rerank': bool(layout['rerank']) and layout['dtype'] != 'float32',
+            'count': len(live_rows), 'tombstones': 0, 'version': old_manifest['version'] + 1,
+            'generation': old_manifest.get('generation', 0) + 1,
+        }
+        if manifest['dim'] > source.dim:
+            raise ValueError(f"Cannot widen {source.dim}-dimension vectors to {manifest['dim']}; re-embed instead")
+        _remove_generation(path, manifest['generation'])  # leftovers of an interrupted rewrite
+
+        # Recall sample: stored vectors used as queries, ground truth from the source precision
+        rng = np.random.default_rng(0)
+        sample_positions = np.sort(rng.choice(len(live_rows), size=min(sample_queries, len(live_rows)), replace=False))
+        queries = source.vectors(live_rows[sample_positions]) if len(sample_positions) else np.empty((0, source.dim), dtype=np.float32)
+        truth_scores = np.empty((len(queries), 0), dtype=np.float32)
+        truth_rows = np.empty((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, len(live_rows), block_rows):
+            block = source.vectors(live_rows[start:start + block_rows])
+            if len(queries):
+                scores = queries @ block.T
+                for i, position in enumerate(sample_positions):
+                    if start <= position < start + len(block):
+                        scores[i, position - start] = -np.inf
+                candidate_scores = np.concatenate([truth_scores, scores], axis=1)
+                candidate_rows = np.concatenate([
+                    truth_rows, np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+                ], axis=1)
+                keep = np.argsort(-candidate_scores, axis=1)[:, :RECALL_AT]
+                truth_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+                truth_rows = np.take_along_axis(candidate_rows, keep, axis=1)
+
+            _append_rows(path, manifest, _shorten(block, manifest['dim']))
+
+        records = [source.records[row] for row in live_rows]
+        _atomic_write(_data_file(path, manifest, 'records.jsonl'),
+                      ''.join(json.dumps(r) + '\n' for r in records).encode('utf-8'))
+        _atomic_write(_data_file(path, manifest, 'tombstones.jsonl'), b'')
+        self._update_hnsw(path, manifest, None, manifest['count'], [])
+
+        recall = None
+        if len(queries):
+            rewritten = _NamespaceSegment(path, manifest)
+            hits = []
+            for i, position in enumerate(sample_positions):
+                own_id = records[position]['id']
+                expected = {records[row]['id'] for row, score in zip(truth_rows[i], truth_scores[i]) if np.isfinite(score)}
+                found = [r['id'] for r in rewritten.query(_shorten(queries[i:i + 1], manifest['dim'])[0],
+                                                         RECALL_AT + 1, -1.0) if r['id'] != own_id][:RECALL_AT]
+                if expected:
+                    hits.append(len(expected.intersection(found)) / len(expected))
+            recall = round(float(np.mean(hits)), 4) if hits else None
+
+        _write_manifest(path, manifest)
+        _remove_generation(path, manifest['generation'] - 2)
+
+        return {
+            'rows': manifest['count'],
+            'dropped': source.count - manifest['count'],
+            'dim': manifest['dim'],
+            'dtype': manifest['dtype'],
+            'rerank': manifest['rerank'],
+            'vector_bytes_before': _vector_bytes(path, old_manifest),
+            'vector_bytes_after': _vector_bytes(path, manifest),
+            'rerank_bytes': _file_size(_data_file(path, manifest, 'vectors_full.bin')) if manifest['rerank'] else 0,
+            'disk_bytes_before': disk_bytes_before,
+            'disk_bytes_after': _disk_bytes(path, manifest),
+            'recall_at_10': recall,
+        }
+
+    def _update_hnsw(self, path: str, manifest: Dict[str, Any], new_rows: Optional[np.ndarray],
+                     start_row: int, deleted_rows: List[int]) -> None:
+        """Incrementally add new rows to and mark deleted rows in the HNSW graph"""
+        if hnswlib is None or not manifest['count']:
+            return
+
+        index_path = _data_file(path, manifest, 'index.hnsw')
+        index = hnswlib.Index(space='ip', dim=manifest['dim'])
+        capacity = max(1024, manifest['count'] * 2)
+
+        if os.path.exists(index_path):
+            index.load_index(index_path, max_elements=capacity, allow_replace_deleted=False)
+        else:
+            index.init_index(max_elements=capacity, ef_construction=200, M=16)
+            if start_row:
+                # Existing rows written before hnswlib was available, or a rewritten generation
+                existing = _NamespaceSegment(path, dict(manifest, count=start_row)).vectors(slice(0, start_row))
+                index.add_items(existing, np.arange(start_row))
+                deleted_rows = list(deleted_rows) + list(_tombstoned_rows(path, manifest))
+
+        if new_rows is not None and len(new_rows):
+            if index.get_max_elements() < manifest['count']:
+                index.resize_index(capacity)
+            index.add_items(new_rows, np.arange(start_row, start_row + len(new_rows)))
+
+        for row in set(deleted_rows):
+            try:
+                index.mark_deleted(row)
+            except RuntimeError:
+                pass  # Already marked
+
+        # Readers load the file while writers update it - replace it, never rewrite in place
+        tmp_path = f"{index_path}.tmp"
+        index.save_index(tmp_path)
+        os.replace(tmp_path, index_path)
+
+
+# ----------------------------------------------------------------------
+# Vector helpers
+# ----------------------------------------------------------------------
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _shorten(matrix: np.ndarray, dim: int) -> np.ndarray:
+    """Keep the first dim dimensions of normalized rows and renormalize (Matryoshka truncation)"""
+    if matrix.shape[1] == dim:
+        return matrix
+    if matrix.shape[1] < dim:
+        raise ValueError(f"Vector dimension {matrix.shape[1]} is smaller than index dimension {dim}")
+    return _normalize(np.ascontiguousarray(matrix[:, :dim]))
+
+
+def _quantize(matrix: np.ndarray, dtype: str):
+    """(values, per-row scales or None) for storing float32 rows as dtype"""
+    if dtype == 'int8':
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        values = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return values, scales.astype(np.float32)
+    return matrix.astype(dtype), None
+
+
+def _dequantize(values: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    block = np.asarray(values, dtype=np.float32)
+    if scales is not None:
+        block = block * np.asarray(scales, dtype=np.float32).reshape(-1, 1)
+    return block
+
+
+def _append_rows(path: str, manifest: Dict[str, Any], matrix: np.ndarray) -> None:
+    """Append normalized float32 rows (already at manifest['dim']) in the manifest's layout"""
+    values, scales = _quantize(matrix, manifest['dtype'])
+    with open(_data_file(path, manifest, 'vectors.bin'), 'ab') as f:
+        f.write(values.tobytes())
+    if scales is not None:
+        with open(_data_file(path, manifest, 'scales.bin'), 'ab') as f:
+            f.write(scales.tobytes())
+    if manifest.get('rerank'):
+        with open(_data_file(path, manifest, 'vectors_full.bin'), 'ab') as f:
+            f.write(np.asarray(matrix, dtype=np.float32).tobytes())
+
+
+# ----------------------------------------------------------------------
+# File helpers
+# ----------------------------------------------------------------------
+
+def _data_file(path: str, manifest: Dict[str, Any], name: str) -> str:
+    """Path of a data file in the manifest's generation (generation 0 keeps the plain names)"""
+    generation = manifest.get('generation', 0)
+    if generation:
+        stem, extension = name.rsplit('.', 1)
+        name = f"{stem}.{generation}.{extension}"
+    return os.path.join(path, name)
+
+
+def _remove_generation(path: str, generation: int) -> None:
+    if generation < 0:
+        return
+    for name in DATA_FILES:
+        try:
+            os.remove(_data_file(path, {'generation': generation}, name))
+        except FileNotFoundError:
+            pass
+
+
+def _truncate_to_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """
+    Cut every data file back to the rows and tombstones the manifest commits
+
+    Anything past those lengths was appended by a writer that died before
+    rewriting the manifest. The HNSW index may already contain such rows, so it
+    is dropped and rebuilt from the committed rows on the next write. A
+    manifest from before tombstone counts were recorded adopts the current count.
+    """
+    if 'tombstones' not in manifest:
+        manifest['tombstones'] = len(_read_jsonl(_data_file(path, manifest, 'tombstones.jsonl')))
+
+    dtype = np.dtype(manifest['dtype'])
+    lengths = {'vectors.bin': manifest['count'] * manifest['dim'] * dtype.itemsize}
+    if dtype == np.int8:
+        lengths['scales.bin'] = manifest['count'] * 4
+    if manifest.get('rerank'):
+        lengths['vectors_full.bin'] = manifest['count'] * manifest['dim'] * 4
+    lengths['records.jsonl'] = _jsonl_prefix_bytes(_data_file(path, manifest, 'records.jsonl'), manifest['count'])
+    lengths['tombstones.jsonl'] = _jsonl_prefix_bytes(_data_file(path, manifest, 'tombstones.jsonl'), manifest['tombstones'])
+
+    truncated = False
+    for name, length in lengths.items():
+        file_path = _data_file(path, manifest, name)
+        if _file_size(file_path) > length:
+            logger.warning(f"Discarding {_file_size(file_path) - length} uncommitted bytes of {file_path}")
+            os.truncate(file_path, length)
+            truncated = True
+
+    if truncated:
+        try:
+            os.remove(_data_file(path, manifest, 'index.hnsw'))
+        except FileNotFoundError:
+            pass
+
+
+def _jsonl_prefix_bytes(file_path: str, lines: int) -> int:
+    """Byte length of the first `lines` lines of a file"""
+    size = 0
+    try:
+        with open(file_path, 'rb') as f:
+            for _ in range(lines):
+                line = f.readline()
+                if not line:
+                    break
+                size += len(line)
+    except FileNotFoundError:
+        pass
+    return size
+
+
+def _tombstoned_rows(path: str, manifest: Dict[str, Any]) -> set:
+    """Rows deleted as of the manifest (later, uncommitted tombstones are ignored)"""
+    entries = _read_jsonl(_data_file(path, manifest, 'tombstones.jsonl'), manifest.get('tombstones'))
+    return {entry['row'] for entry in entries}
+
+
+def _file_size(file_path: str) -> int:
+    try:
+        return os.path.getsize(file_path)
+    except FileNotFoundError:
+        return 0
+
+
+def _vector_bytes(path: str, manifest: Dict[str, Any]) -> int:
+    """Size of the matrix searched on every query (vectors + int8 scales)"""
+    return _file_size(_data_file(path, manifest, 'vectors.bin')) + _file_size(_data_file(path, manifest, 'scales.bin'))
+
+
+def _disk_bytes(path: str, manifest: Dict[str, Any]) -> int:
+    """Size of every file in the manifest's generation"""
+    return sum(_file_size(_data_file(path, manifest, name)) for name in DATA_FILES)
+
+
+@contextmanager
+def _locked(path: str):
+    """Exclusive cross-process lock for writers of one org/namespace directory"""
+    with open(os.path.join(path, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(path, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    _atomic_write(os.path.join(path, 'manifest.json'), json.dumps(manifest).encode('utf-8'))
+
+
+def _atomic_write(file_path: str, data: bytes) -> None:
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def _read_jsonl(file_path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Entries of a JSON-lines file; with a limit, lines past it (possibly torn) are not parsed"""
+    entries = []
+    try:
+        with open(file_path, 'r') as f:
+            for line in f:
+                if limit is not None and len(entries) >= limit:
+                    break
+                if line.strip():
+                    entries.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _append_jsonl(file_path: str, entries: Iterable[Dict[str, Any]]) -> None:
+    lines = ''.join(json.dumps(entry) + '\n' for entry in entries)
+    if lines:
+        with open(file_path, 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
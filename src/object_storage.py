@@ -0,0 +1,636 @@
+"""
+Object Storage
+
+Pluggable storage for uploaded documents. Two backends share one interface:
+
+- S3Storage: DigitalOcean Spaces via storage_manager.StorageManager, which
+  owns the document key and URL layout the processing workers read
+- FilesystemStorage: local directory for single-node deployments and
+  benchmarks (STORAGE_PATH)
+
+Uploads queued to the document processing workers need a backend those
+workers can read, so their routes ask for create_storage(shared=True), which
+refuses the filesystem backend.
+
+Writes stream through a writer object so a file is never held whole in
+memory: S3 uses multipart uploads (one 8MB part buffered at a time), the
+filesystem writes to a temp file and moves it into place. Reads for the
+extractor go through open_mmap(), which is zero-copy on the filesystem backend.
+
+Filesystem layout:
+
+    <STORAGE_PATH>/
+        objects/ab/cd/<sha256>   - file contents, stored once per distinct content
+        keys/<key>               - hard link to the object for each stored key
+        tmp/                     - in-progress writes and multipart parts
+
+Downloads and presigned uploads on the filesystem backend use signed,
+expiring URLs served by the app (/api/storage/...). With
+STORAGE_ACCEL_REDIRECT_PREFIX set, downloads are handed to nginx via
+X-Accel-Redirect; otherwise they are sent with sendfile.
+
+Usage:
+    storage = create_storage()  # honours STORAGE_BACKEND
+    storage = create_storage(shared=True)  # S3 only: the stored URL is read by the workers
+    writer = storage.open_writer("documents/org_1/abc/report.pdf", "application/pdf")
+    for block in blocks:
+        writer.write(block)
+    storage_url = writer.close()   # or writer.abort() on failure
+
+    with storage.open_mmap(storage_url) as data:
+        header = data[:5]
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import secrets
+import shutil
+import tempfile
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+logger = logging.getLogger(__name__)
+
+# S3 requires every part except the last to be at least 5MB
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+COPY_BLOCK_SIZE = 1024 * 1024
+STORAGE_BACKENDS = ('s3', 'filesystem')
+
+
+class UploadTooLarge(Exception):
+    """A presigned upload sent more bytes than its URL allows"""
+
+
+def content_disposition(filename: str) -> str:
+    """
+    attachment Content-Disposition value for a user-supplied filename
+
+    Quotes and backslashes are escaped and control characters dropped; names
+    that aren't plain ASCII also get an RFC 5987 filename* parameter.
+    """
+    filename = ''.join(ch for ch in filename if ch >= ' ' and ch != '\x7f') or 'download'
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii') or 'download'
+    value = 'attachment; filename="{}"'.format(ascii_name.replace('\\', '\\\\').replace('"', '\\"'))
+    if ascii_name != filename:
+        value += f"; filename*=UTF-8''{quote(filename, safe='')}"
+    return value
+
+
+def create_storage(backend: Optional[str] = None, shared: bool = False) -> 'StorageBackend':
+    """
+    Storage backend selected by STORAGE_BACKEND ('s3' by default, or 'filesystem')
+
+    shared=True is for objects handed to the external document processing
+    workers, which read documents.storage_url themselves; local:// URLs are
+    unreadable there, so the filesystem backend is refused.
+    """
+    backend = (backend or os.environ.get('STORAGE_BACKEND', 's3')).lower()
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected one of {STORAGE_BACKENDS}")
+    if backend == 'filesystem':
+        if shared:
+            raise ValueError("STORAGE_BACKEND=filesystem is not readable by the document processing workers; "
+                             "use STORAGE_BACKEND=s3 for uploads")
+        return FilesystemStorage()
+    return S3Storage()
+
+
+class StorageBackend(ABC):
+    """Interface shared by the storage backends"""
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        """Storage URL recorded on documents for a key"""
+
+    @abstractmethod
+    def key_from_url(self, storage_url: str) -> str:
+        """Key of a storage URL produced by url_for()"""
+
+    @abstractmethod
+    def open_writer(self, key: str, content_type: str = 'application/octet-stream'):
+        """Writer with write(bytes), close() -> storage URL and abort()"""
+
+    def upload_stream(self, key: str, stream: BinaryIO, content_type: str = 'application/octet-stream') -> str:
+        """Copy a readable stream into storage block by block; returns the storage URL"""
+        writer = self.open_writer(key, content_type)
+        try:
+            for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+                writer.write(block)
+            return writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove an object; missing keys are ignored"""
+
+    @abstractmethod
+    def object_size(self, key: str) -> Optional[int]:
+        """Size of a stored object, or None when it does not exist"""
+
+    @abstractmethod
+    def read_head(self, key: str, length: int = 8192) -> bytes:
+        """First bytes of an object, e.g. for type sniffing"""
+
+    def content_hash(self, key: str) -> str:
+        """SHA-256 hex digest of a stored object's bytes"""
+        digest = hashlib.sha256()
+        with self.open_local_path(self.url_for(key)) as path, open(path, 'rb') as f:
+            for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @abstractmethod
+    def open_mmap(self, storage_url: str):
+        """Context manager: read-only memory map (or bytes for empty files) of a stored object"""
+
+    @abstractmethod
+    def open_local_path(self, storage_url: str):
+        """Context manager: local file path of a stored object, for tools that need a path (pdf2image, worker processes)"""
+
+    @abstractmethod
+    def generate_download_url(self, storage_url: str, expires_in: int = 3600,
+                              filename: Optional[str] = None) -> str:
+        """Expiring URL that downloads the object, as an attachment named filename when given"""
+
+    @abstractmethod
+    def presigned_put_url(self, key: str, content_type: str, expires_in: int = 3600,
+                          max_size: Optional[int] = None) -> str:
+        """Expiring URL the client PUTs the object to; max_size caps the body where the backend receives it"""
+
+    @abstractmethod
+    def create_presigned_multipart(self, key: str, content_type: str, part_count: int,
+                                   expires_in: int = 3600, max_part_size: Optional[int] = None) -> Tuple[str, List[str]]:
+        """Start a multipart upload and presign one PUT URL per part (PartNumber 1..part_count)"""
+
+    @abstractmethod
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict]) -> None:
+        """parts: [{'PartNumber': int, 'ETag': str}, ...] as reported by the client"""
+
+    @abstractmethod
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        """Discard an unfinished multipart upload and its parts"""
+
+
+# ============================================================================
+# S3 / DIGITALOCEAN SPACES
+# ============================================================================
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible bucket configured from the DO_SPACES_* settings
+
+    Whole-file uploads, their validation and download URLs go through
+    StorageManager so the stored URLs keep the layout the processing workers
+    expect; streamed and presigned uploads use the bucket client directly.
+    """
+
+    def __init__(self, bucket: Optional[str] = None, endpoint: Optional[str] = None,
+                 part_size: int = DEFAULT_PART_SIZE):
+        import boto3
+        from storage_manager import StorageManager
+
+        self.manager = StorageManager()
+        self.bucket = bucket or os.environ['DO_SPACES_BUCKET']
+        self.endpoint = (endpoint or os.environ['DO_SPACES_ENDPOINT']).rstrip('/')
+        self.part_size = part_size
+        self.client = boto3.client(
+            's3',
+            region_name=os.environ.get('DO_SPACES_REGION'),
+            endpoint_url=self.endpoint,
+            aws_access_key_id=os.environ['DO_SPACES_KEY'],
+            aws_secret_access_key=os.environ['DO_SPACES_SECRET']
+        )
+
+    def validate_file(self, file, filename: str) -> Tuple[bool, Optional[str], Optional[str]]:
+        """(is_valid, error_message, file_type) for an uploaded werkzeug file"""
+        return self.manager.validate_file(file, filename)
+
+    def upload_file(self, file, org_id: int, doc_id: int, filename: str) -> str:
+        """Store an uploaded werkzeug file for a document; returns the storage URL"""
+        return self.manager.upload_file(file, org_id, doc_id, filename)
+
+    def url_for(self, key: str) -> str:
+        return f"{self.endpoint}/{self.bucket}/{key}"
+
+    def key_from_url(self, storage_url: str) -> str:
+        """Object key from a path-style or virtual-hosted-style URL"""
+        parsed = urlparse(storage_url)
+        path = parsed.path.lstrip('/')
+        if parsed.netloc.startswith(f"{self.bucket}."):
+            return path
+        if path.startswith(f"{self.bucket}/"):
+            return path[len(self.bucket) + 1:]
+        return path
+
+    def open_writer(self, key: str, content_type: str = 'application/octet-stream') -> 'S3MultipartWriter':
+        return S3MultipartWriter(self, key, content_type)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def object_size(self, key: str) -> Optional[int]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def read_head(self, key: str, length: int = 8192) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes=0-{length - 1}")
+        return response['Body'].read()
+
+    def content_hash(self, key: str) -> str:
+        # Multipart ChecksumSHA256 values are checksums of part checksums, so the bytes are re-read
+        digest = hashlib.sha256()
+        body = self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        for block in body.iter_chunks(COPY_BLOCK_SIZE):
+            digest.update(block)
+        return digest.hexdigest()
+
+    @contextmanager
+    def open_mmap(self, storage_url: str):
+        # Objects have to be downloaded first; a temp file keeps them out of the heap
+        with tempfile.TemporaryFile() as f:
+            self.client.download_fileobj(self.bucket, self.key_from_url(storage_url), f)
+            f.flush()
+            if f.tell() == 0:
+                yield b''
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    @contextmanager
+    def open_local_path(self, storage_url: str):
+        key = self.key_from_url(storage_url)
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(key)[1]) as f:
+            self.client.download_fileobj(self.bucket, key, f)
+            f.flush()
+            yield f.name
+
+    def generate_download_url(self, storage_url: str, expires_in: int = 3600,
+                              filename: Optional[str] = None) -> str:
+        # StorageManager resolves the URLs it stores and names the download itself
+        return self.manager.generate_download_url(storage_url, expires_in=expires_in)
+
+    def presigned_put_url(self, key: str, content_type: str, expires_in: int = 3600,
+                          max_size: Optional[int] = None) -> str:
+        # The bucket receives the bytes; completion checks the stored size
+        return self.client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': self.bucket, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=expires_in
+        )
+
+    def create_presigned_multipart(self, key: str, content_type: str, part_count: int,
+                                   expires_in: int = 3600, max_part_size: Optional[int] = None) -> Tuple[str, List[str]]:
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, ContentType=content_type
+        )['UploadId']
+        urls = [
+            self.client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': self.bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': part_number},
+                ExpiresIn=expires_in
+            )
+            for part_number in range(1, part_count + 1)
+        ]
+        return upload_id, urls
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict]) -> None:
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': sorted(parts, key=lambda p: p['PartNumber'])}
+        )
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            logger.warning(f"Failed to abort multipart upload for {key}: {e}")
+
+
+class S3MultipartWriter:
+    """Streams written bytes into a multipart upload, one part at a time"""
+
+    def __init__(self, storage: S3Storage, key: str, content_type: str):
+        self.storage = storage
+        self.key = key
+        self.content_type = content_type
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self.storage.part_size:
+            part = bytes(self._buffer[:self.storage.part_size])
+            del self._buffer[:self.storage.part_size]
+            self._upload_part(part)
+
+    def close(self) -> str:
+        """Finish the upload and return the object's storage URL"""
+        client = self.storage.client
+        if self._upload_id is None:
+            # Small file: a single PUT is cheaper than a one-part multipart upload
+            client.put_object(Bucket=self.storage.bucket, Key=self.key,
+                              Body=bytes(self._buffer), ContentType=self.content_type)
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            client.complete_multipart_upload(
+                Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+        self._buffer = bytearray()
+        return self.storage.url_for(self.key)
+
+    def abort(self) -> None:
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            self.storage.abort_multipart(self.key, self._upload_id)
+
+    def _upload_part(self, part: bytes) -> None:
+        client = self.storage.client
+        if self._upload_id is None:
+            response = client.create_multipart_upload(
+                Bucket=self.storage.bucket, Key=self.key, ContentType=self.content_type
+            )
+            self._upload_id = response['UploadId']
+
+        part_number = len(self._parts) + 1
+        response = client.upload_part(
+            Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=part
+        )
+        self._parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+
+# ============================================================================
+# LOCAL FILESYSTEM
+# ============================================================================
+
+class FilesystemStorage(StorageBackend):
+    """Content-addressed local storage with signed app URLs standing in for presigned S3 URLs"""
+
+    URL_SCHEME = 'local://'
+
+    def __init__(self, base_path: Optional[str] = None, secret_key: Optional[str] = None,
+                 public_url: Optional[str] = None, accel_redirect_prefix: Optional[str] = None):
+        from itsdangerous import URLSafeSerializer
+
+        self.base_path = os.path.abspath(base_path or os.environ.get('STORAGE_PATH', os.path.join('data', 'storage')))
+        self.public_url = (public_url or os.environ.get('STORAGE_PUBLIC_URL', '')).rstrip('/')
+        self.accel_redirect_prefix = accel_redirect_prefix or os.environ.get('STORAGE_ACCEL_REDIRECT_PREFIX')
+        self._serializer = URLSafeSerializer(secret_key or os.environ['SECRET_KEY'], salt='local-storage')
+
+        for directory in ('objects', 'keys', 'tmp'):
+            os.makedirs(os.path.join(self.base_path, directory), exist_ok=True)
+
+    # -- keys and paths ------------------------------------------------------
+
+    def url_for(self, key: str) -> str:
+        return f"{self.URL_SCHEME}{key}"
+
+    def key_from_url(self, storage_url: str) -> str:
+        if not storage_url.startswith(self.URL_SCHEME):
+            raise ValueError(f"Not a local storage URL: {storage_url}")
+        return storage_url[len(self.URL_SCHEME):]
+
+    def key_path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.base_path, 'keys', key))
+        if not path.startswith(os.path.join(self.base_path, 'keys') + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def object_path(self, content_hash: str) -> str:
+        return os.path.join(self.base_path, 'objects', content_hash[:2], content_hash[2:4], content_hash)
+
+    # -- writes --------------------------------------------------------------
+
+    def open_writer(self, key: str, content_type: str = 'application/octet-stream') -> 'FilesystemWriter':
+        return FilesystemWriter(self, key)
+
+    def delete(self, key: str) -> None:
+        """Remove a key; the object goes too once no other key links to it"""
+        path = self.key_path(key)
+        with self._locked():
+            self._unlink_key(path)
+
+    def _commit(self, temp_path: str, key: str, content_hash: str) -> None:
+        """Move a finished temp file into the object store and link the key to it"""
+        object_path = self.object_path(content_hash)
+        path = self.key_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._locked():
+            if os.path.exists(object_path):
+                os.unlink(temp_path)  # identical content is already stored
+            else:
+                os.replace(temp_path, object_path)
+            self._unlink_key(path)
+            os.link(object_path, path)
+
+    def _unlink_key(self, path: str) -> None:
+        """Caller holds the lock"""
+        if not os.path.exists(path):
+            return
+        # Links: the object itself plus one per key; the last key takes the object with it
+        object_path = self._object_for(path) if os.stat(path).st_nlink <= 2 else None
+        os.unlink(path)
+        if object_path and os.path.exists(object_path) and os.stat(object_path).st_nlink == 1:
+            os.unlink(object_path)
+
+    def _object_for(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                digest.update(block)
+        return self.object_path(digest.hexdigest())
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.base_path, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # -- reads ---------------------------------------------------------------
+
+    def object_size(self, key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.key_path(key))
+        except FileNotFoundError:
+            return None
+
+    def read_head(self, key: str, length: int = 8192) -> bytes:
+        with open(self.key_path(key), 'rb') as f:
+            return f.read(length)
+
+    @contextmanager
+    def open_mmap(self, storage_url: str):
+        with open(self.key_path(self.key_from_url(storage_url)), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b''
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    @contextmanager
+    def open_local_path(self, storage_url: str):
+        yield self.key_path(self.key_from_url(storage_url))
+
+    # -- signed URLs ---------------------------------------------------------
+
+    def generate_download_url(self, storage_url: str, expires_in: int = 3600,
+                              filename: Optional[str] = None) -> str:
+        token = self._sign('get', key=self.key_from_url(storage_url), filename=filename, expires_in=expires_in)
+        return f"{self.public_url}/api/storage/download/{token}"
+
+    def presigned_put_url(self, key: str, content_type: str, expires_in: int = 3600,
+                          max_size: Optional[int] = None) -> str:
+        token = self._sign('put', key=key, max_size=max_size, expires_in=expires_in)
+        return f"{self.public_url}/api/storage/objects/{token}"
+
+    def create_presigned_multipart(self, key: str, content_type: str, part_count: int,
+                                   expires_in: int = 3600, max_part_size: Optional[int] = None) -> Tuple[str, List[str]]:
+        upload_id = secrets.token_hex(16)
+        os.makedirs(self._multipart_dir(upload_id))
+        urls = [
+            f"{self.public_url}/api/storage/objects/"
+            f"{self._sign('part', key=key, upload_id=upload_id, part=part_number, max_size=max_part_size, expires_in=expires_in)}"
+            for part_number in range(1, part_count + 1)
+        ]
+        return upload_id, urls
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict]) -> None:
+        directory = self._multipart_dir(upload_id)
+        writer = self.open_writer(key)
+        try:
+            for part in sorted(parts, key=lambda p: p['PartNumber']):
+                part_path = os.path.join(directory, str(int(part['PartNumber'])))
+                with open(part_path + '.etag') as f:
+                    if f.read() != part['ETag'].strip('"'):
+                        raise ValueError(f"ETag mismatch for part {part['PartNumber']}")
+                with open(part_path, 'rb') as f:
+                    for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                        writer.write(block)
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        shutil.rmtree(self._multipart_dir(upload_id), ignore_errors=True)
+
+    def verify_token(self, token: str, operation: str) -> Optional[Dict]:
+        """Payload of a valid, unexpired signed URL token for the operation, else None"""
+        from itsdangerous import BadSignature
+
+        try:
+            payload = self._serializer.loads(token)
+        except BadSignature:
+            return None
+        if payload.get('op') != operation or payload.get('exp', 0) < time.time():
+            return None
+        return payload
+
+    def receive_upload(self, payload: Dict, stream: BinaryIO) -> str:
+        """
+        Store the body of a presigned PUT; returns the ETag
+
+        Raises UploadTooLarge, keeping nothing, once the body passes the size
+        signed into the URL.
+        """
+        max_size = payload.get('max_size')
+        blocks = _limited_blocks(stream, max_size)
+
+        if payload['op'] == 'put':
+            writer = self.open_writer(payload['key'])
+            try:
+                for block in blocks:
+                    writer.write(block)
+                writer.close()
+            except Exception:
+                writer.abort()
+                raise
+            return writer.content_hash
+
+        directory = self._multipart_dir(payload['upload_id'])
+        if not os.path.isdir(directory):
+            raise FileNotFoundError('Unknown or finished multipart upload')
+        digest = hashlib.sha256()
+        part_path = os.path.join(directory, str(int(payload['part'])))
+        try:
+            with open(part_path, 'wb') as f:
+                for block in blocks:
+                    f.write(block)
+                    digest.update(block)
+        except UploadTooLarge:
+            os.unlink(part_path)
+            raise
+        with open(part_path + '.etag', 'w') as f:
+            f.write(digest.hexdigest())
+        return digest.hexdigest()
+
+    def _sign(self, operation: str, expires_in: int, **fields) -> str:
+        return self._serializer.dumps(dict(fields, op=operation, exp=int(time.time()) + expires_in))
+
+    def _multipart_dir(self, upload_id: str) -> str:
+        if not upload_id.isalnum():
+            raise ValueError(f"Invalid upload id: {upload_id}")
+        return os.path.join(self.base_path, 'tmp', f"mp_{upload_id}")
+
+
+def _limited_blocks(stream: BinaryIO, max_size: Optional[int]):
+    """Blocks of a stream, raising UploadTooLarge once more than max_size bytes were read"""
+    received = 0
+    for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+        received += len(block)
+        if max_size is not None and received > max_size:
+            raise UploadTooLarge(f"Upload exceeds the {max_size} bytes allowed by this URL")
+        yield block
+
+
+class FilesystemWriter:
+    """Writes to a temp file while hashing; close() files it under its content hash"""
+
+    def __init__(self, storage: FilesystemStorage, key: str):
+        self.storage = storage
+        self.key = key
+        self._digest = hashlib.sha256()
+        fd, self._temp_path = tempfile.mkstemp(dir=os.path.join(storage.base_path, 'tmp'))
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._digest.update(data)
+
+    @property
+    def content_hash(self) -> str:
+        return self._digest.hexdigest()
+
+    def close(self) -> str:
+        self._file.close()
+        self.storage._commit(self._temp_path, self.key, self.content_hash)
+        return self.storage.url_for(self.key)
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.unlink(self._temp_path)
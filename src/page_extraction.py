@@ -0,0 +1,264 @@
+"""
+Page-Level Document Extraction
+
+Extracts PDFs page range by page range in a process pool instead of as one
+unit, so large scanned files use every core and report progress while they
+run:
+
+1. The PDF is split into ranges of PAGES_PER_TASK pages
+2. Each range is extracted in a worker process; pages whose text layer has
+   fewer than MIN_TEXT_CHARS characters are rasterized (pdf2image) and OCR'd
+   (pytesseract) - pages with a text layer are never rasterized
+3. Finished ranges are chunked and written to document_chunks in page order
+   as soon as every earlier range is done, and processing_jobs.progress is
+   updated after every range
+
+Celery's prefork workers are daemonic and cannot start child processes; there
+the pool falls back to threads, which still parallelize OCR because tesseract
+runs as a subprocess.
+
+Usage (processing task):
+    pipeline = PageExtractionPipeline(get_db_connection)
+    summary = pipeline.process_pdf(doc_id, org_id, job_id, storage_url)
+"""
+
+import concurrent.futures
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from document_dedup import chunk_hash
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_TASK = int(os.environ.get('EXTRACTION_PAGES_PER_TASK', 4))
+MIN_TEXT_CHARS = 25
+OCR_DPI = 300
+CHUNK_TOKENS = 500
+CHUNK_OVERLAP_TOKENS = 50
+
+
+def plan_page_ranges(page_count: int, pages_per_task: int = PAGES_PER_TASK) -> List[Tuple[int, int]]:
+    """[(start, end), ...] zero-based, end exclusive"""
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+
+def extract_page_range(pdf_path: str, start: int, end: int, ocr_dpi: int = OCR_DPI,
+                       min_text_chars: int = MIN_TEXT_CHARS) -> List[Dict]:
+    """
+    Text of pages [start, end) of a PDF; runs in a worker process
+
+    Returns:
+        [{'page': 1-based page number, 'text': str, 'ocr': bool}, ...]
+    """
+    from PyPDF2 import PdfReader
+
+    pages = []
+    with open(pdf_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        reader = PdfReader(data)
+        for index in range(start, end):
+            try:
+                text = reader.pages[index].extract_text() or ''
+            except Exception as e:
+                logger.warning(f"Text layer extraction failed on page {index + 1}: {e}")
+                text = ''
+
+            used_ocr = False
+            if len(text.strip()) < min_text_chars:
+                text = _ocr_page(pdf_path, index + 1, ocr_dpi) or text
+                used_ocr = True
+
+            pages.append({'page': index + 1, 'text': text, 'ocr': used_ocr})
+    return pages
+
+
+def _ocr_page(pdf_path: str, page_number: int, dpi: int) -> str:
+    from pdf2image import convert_from_path
+    import pytesseract
+
+    try:
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+        return pytesseract.image_to_string(images[0]) if images else ''
+    except Exception as e:
+        logger.warning(f"OCR failed on page {page_number}: {e}")
+        return ''
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    from PyPDF2 import PdfReader
+
+    with open(pdf_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return len(PdfReader(data).pages)
+
+
+def extract_file_pages(file_path: str, file_type: str) -> List[Dict]:
+    """
+    Text of a stored document of any supported type, in the shape returned by
+    extract_page_range (non-PDF files are a single page)
+    """
+    if file_type == 'pdf':
+        return extract_page_range(file_path, 0, pdf_page_count(file_path))
+
+    if file_type == 'docx':
+        from docx import Document
+        text = '\n'.join(paragraph.text for paragraph in Document(file_path).paragraphs)
+    else:
+        with open(file_path, 'rb') as f:
+            text = f.read().decode('utf-8', errors='replace')
+    return [{'page': 1, 'text': text, 'ocr': False}]
+
+
+class TokenChunker:
+    """Splits page text into overlapping token windows (tiktoken, or ~4 chars per token without it)"""
+
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            self._encoding = None
+
+    def chunk(self, text: str) -> List[Tuple[str, int]]:
+        """[(chunk_text, token_count), ...]"""
+        text = text.strip()
+        if not text:
+            return []
+
+        step = self.chunk_tokens - self.overlap_tokens
+        if self._encoding is None:
+            chars, char_step = self.chunk_tokens * 4, step * 4
+            return [(text[i:i + chars], len(text[i:i + chars]) // 4)
+                    for i in range(0, max(len(text) - self.overlap_tokens * 4, 1), char_step)]
+
+        tokens = self._encoding.encode(text)
+        chunks = []
+        for i in range(0, max(len(tokens) - self.overlap_tokens, 1), step):
+            window = tokens[i:i + self.chunk_tokens]
+            chunks.append((self._encoding.decode(window), len(window)))
+        return chunks
+
+
+class PageExtractionPipeline:
+    """Parallel page-range extraction that streams chunks and progress to the database"""
+
+    def __init__(self, get_db_connection_func: Callable, max_workers: Optional[int] = None,
+                 pages_per_task: int = PAGES_PER_TASK, chunker: Optional[TokenChunker] = None):
+        self.get_db_connection = get_db_connection_func
+        self.max_workers = max_workers or int(os.environ.get('EXTRACTION_WORKERS', os.cpu_count() or 2))
+        self.pages_per_task = pages_per_task
+        self.chunker = chunker or TokenChunker()
+
+    def process_pdf(self, doc_id: int, org_id: int, job_id: Optional[str], storage_url: str,
+                    storage=None, progress_range: Tuple[int, int] = (0, 100)) -> Dict:
+        """
+        Extract and chunk a stored PDF
+
+        Args:
+            progress_range: Share of processing_jobs.progress this step covers,
+                e.g. (0, 80) when embedding follows
+
+        Returns:
+            {'pages': int, 'ocr_pages': int, 'chunks': int}
+        """
+        if storage is None:
+            from object_storage import create_storage
+            storage = create_storage()
+
+        with storage.open_local_path(storage_url) as pdf_path:
+            summary = self.process_pdf_path(doc_id, job_id, pdf_path, progress_range)
+
+        # Keyword search reads document_chunks, so cached searches are stale now
+        from search_cache import bump_search_generation
+        bump_search_generation(org_id)
+        return summary
+
+    def process_pdf_path(self, doc_id: int, job_id: Optional[str], pdf_path: str,
+                         progress_range: Tuple[int, int] = (0, 100)) -> Dict:
+        page_count = pdf_page_count(pdf_path)
+        ranges = plan_page_ranges(page_count, self.pages_per_task)
+
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            summary = {'pages': page_count, 'ocr_pages': 0, 'chunks': 0}
+            finished: Dict[int, List[Dict]] = {}
+            next_range = 0
+            pages_done = 0
+            last_progress = None
+            replaced = False
+
+            with self._executor() as executor:
+                futures = {
+                    executor.submit(extract_page_range, pdf_path, start, end): position
+                    for position, (start, end) in enumerate(ranges)
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    position = futures[future]
+                    pages = future.result()
+                    finished[position] = pages
+                    pages_done += len(pages)
+                    summary['ocr_pages'] += sum(1 for page in pages if page['ocr'])
+
+                    # Write every range that is now contiguous with what's already stored
+                    while next_range in finished:
+                        if not replaced:
+                            # Re-processing replaces the previous chunks; the delete commits
+                            # with the first range so search never sees the document empty
+                            self._delete_chunks(cursor, doc_id)
+                            replaced = True
+                        summary['chunks'] += self._write_chunks(cursor, doc_id, finished.pop(next_range), summary['chunks'])
+                        next_range += 1
+
+                    low, high = progress_range
+                    progress = low + (high - low) * pages_done // max(page_count, 1)
+                    if job_id and progress != last_progress:
+                        cursor.execute('''
+                            UPDATE processing_jobs
+                            SET progress = %s, status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+                            WHERE job_id = %s
+                        ''', (progress, job_id))
+                        last_progress = progress
+                    conn.commit()
+
+            if not replaced:
+                self._delete_chunks(cursor, doc_id)
+                conn.commit()
+
+            logger.info(f"Extracted document {doc_id}: {summary}")
+            return summary
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _delete_chunks(self, cursor, doc_id: int):
+        cursor.execute('DELETE FROM document_chunks WHERE document_id = %s', (doc_id,))
+
+    def _write_chunks(self, cursor, doc_id: int, pages: List[Dict], first_index: int) -> int:
+        rows = []
+        for page in pages:
+            for text, token_count in self.chunker.chunk(page['text']):
+                rows.append((
+                    doc_id, text, first_index + len(rows), token_count,
+                    json.dumps({'page': page['page'], 'ocr': page['ocr']}), chunk_hash(text)
+                ))
+        if rows:
+            execute_values(cursor, '''
+                INSERT INTO document_chunks (document_id, chunk_text, chunk_index, token_count, metadata_json, content_hash)
+                VALUES %s
+            ''', rows)
+        return len(rows)
+
+    def _executor(self) -> concurrent.futures.Executor:
+        if multiprocessing.current_process().daemon:
+            # Daemonic (Celery prefork) workers cannot have children
+            return concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
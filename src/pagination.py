@@ -0,0 +1,34 @@
+"""
+Keyset Pagination Cursors
+
+Every paginated endpoint hands out the same opaque cursor: the sort key of
+the last row on the page, JSON-encoded and base64url'd without padding.
+Datetimes are stored as ISO strings; Postgres parses them back when they are
+compared with a timestamp column.
+
+Usage:
+    next_cursor = encode_page_cursor(last['upload_date'], last['id'])
+    after = decode_page_cursor(request.args.get('cursor'))  # None when missing or malformed
+"""
+
+import base64
+import json
+from typing import List, Optional
+
+
+def encode_page_cursor(*values) -> str:
+    """Encode keyset pagination values (last row's sort key) into an opaque URL-safe cursor"""
+    payload = json.dumps(list(values), default=lambda v: v.isoformat() if hasattr(v, 'isoformat') else str(v))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_cursor(token: Optional[str]) -> Optional[List]:
+    """Decode a cursor produced by encode_page_cursor, returning None if missing or malformed"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except ValueError:
+        return None
+    return values if isinstance(values, list) else None
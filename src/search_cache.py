@@ -0,0 +1,142 @@
+"""
+Search Result Cache
+
+Caches complete document search responses per organization. Entries are keyed
+by (org_id, normalized query, top_k, doc_type, min_score, mode) plus the
+organization's corpus generation; bumping the generation whenever documents
+are uploaded, deleted, reclassified or finish processing makes every older
+entry unreachable, so no explicit invalidation scan is needed.
+
+With REDIS_URL set, generations and entries are shared by all workers. Without
+Redis the cache is per process and entries also expire after a short TTL,
+since other workers cannot bump this process's generation.
+
+The key - generation included - is taken before the search runs and the
+response is stored under that same key, so a search that overlaps a corpus
+change is cached under the old generation and never served afterwards.
+
+Usage:
+    cache = SearchResultCache()
+    key = cache.key(org_id, query, top_k=10, doc_type=None, min_score=0.7, mode='semantic')
+    response = cache.get(key)
+    if response is None:
+        response = run_search(...)
+        cache.set(key, response)
+    cache.bump_generation(org_id)  # after the org's corpus changes
+
+Background workers call bump_search_generation(org_id) when they finish
+writing chunks, vectors or classifications; page_extraction and
+embedding_batcher do so after their writes. With Redis this reaches every web
+worker.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class SearchResultCache:
+    """Generation-invalidated cache of search responses"""
+
+    def __init__(self, redis_url: Optional[str] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds or int(os.environ.get('SEARCH_CACHE_TTL', 3600))
+        self.local_ttl_seconds = min(self.ttl_seconds, 60)
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+        self._redis = None
+        redis_url = redis_url or os.environ.get('REDIS_URL')
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.from_url(redis_url)
+            except Exception as e:
+                logger.warning(f"Search cache running without Redis: {e}")
+
+    def generation(self, org_id: int) -> int:
+        """Current corpus generation for an organization"""
+        if self._redis is not None:
+            try:
+                return int(self._redis.get(f"search_gen:{org_id}") or 0)
+            except Exception as e:
+                logger.warning(f"Redis read failed for search generation: {e}")
+        with self._lock:
+            return self._generations.get(org_id, 0)
+
+    def bump_generation(self, org_id: int) -> None:
+        """Invalidate all cached searches of an organization"""
+        with self._lock:
+            self._generations[org_id] = self._generations.get(org_id, 0) + 1
+        if self._redis is not None:
+            try:
+                self._redis.incr(f"search_gen:{org_id}")
+            except Exception as e:
+                logger.warning(f"Redis write failed for search generation: {e}")
+
+    def key(self, org_id: int, query: str, **params) -> str:
+        """Cache key of a search at the organization's current generation"""
+        material = json.dumps([normalize_query(query), sorted(params.items())], default=str)
+        digest = hashlib.sha256(material.encode('utf-8')).hexdigest()
+        return f"search:{org_id}:{self.generation(org_id)}:{digest}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return response
+                del self._entries[key]
+
+        if self._redis is None:
+            return None
+        try:
+            raw = self._redis.get(key)
+        except Exception as e:
+            logger.warning(f"Redis read failed for search cache: {e}")
+            return None
+        if raw is None:
+            return None
+
+        response = json.loads(raw)
+        self._remember(key, response)
+        return response
+
+    def set(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a response under the key taken before the search ran"""
+        self._remember(key, response)
+        if self._redis is not None:
+            try:
+                self._redis.set(key, json.dumps(response), ex=self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Redis write failed for search cache: {e}")
+
+    def _remember(self, key: str, response: Dict[str, Any]) -> None:
+        ttl = self.ttl_seconds if self._redis is not None else self.local_ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def bump_search_generation(org_id: int) -> None:
+    """Invalidate an organization's cached searches from a worker outside the web app"""
+    try:
+        SearchResultCache().bump_generation(org_id)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate search cache for org {org_id}: {e}")
@@ -0,0 +1,125 @@
+"""
+Process-wide Service Registry
+
+Owns the knowledge-base services (vector store, embedding service, RAG
+pipeline, chat orchestrator, ...) for the life of a worker process, so
+requests reuse their API clients, HTTP connection pools and index handles
+instead of building new ones every time.
+
+- Services are built lazily on first use from registered factories; a
+  factory receives the registry and can get() the services it depends on
+- The registry is fork-aware: API clients, sockets and locks inherited from
+  a parent process are not safe to use, so a forked child (gunicorn
+  --preload, Celery prefork) drops every instance and rebuilds on demand.
+  Detection uses os.register_at_fork, with a pid check as a fallback
+- warm_up() builds the services ahead of the first request; a registry that
+  was warmed before a fork warms itself up again in the child
+
+Usage:
+    registry = ServiceRegistry()
+    registry.register('vector_store', lambda services: create_vector_store())
+    registry.register('rag_pipeline', lambda services: RAGPipeline(services.get('vector_store'), ...))
+    registry.warm_up_async()
+    vector_store = registry.get('vector_store')
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get('SERVICE_WARMUP', 'true').lower() == 'true'
+
+
+class ServiceRegistry:
+    """Lazily built, per-process service instances that are rebuilt after fork"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[['ServiceRegistry'], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        # Re-entrant: a factory may get() its dependencies while the lock is held
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._warmed = False
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, name: str, factory: Callable[['ServiceRegistry'], Any]) -> None:
+        """Add (or replace) the factory of a service; an existing instance is dropped"""
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """The process's instance of a service, built on first use"""
+        if self._pid != os.getpid():
+            self._after_fork()
+
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown service: {name}")
+                started = time.time()
+                instance = self._factories[name](self)
+                self._instances[name] = instance
+                logger.info(f"Service {name} ready in {time.time() - started:.2f}s (pid {self._pid})")
+            return instance
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """Drop one instance (or all) so it is rebuilt on next use, e.g. after a configuration change"""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def status(self) -> Dict[str, str]:
+        """{service: 'ready' | 'not_started'} for the current process"""
+        if self._pid != os.getpid():
+            self._after_fork()
+        return {name: 'ready' if name in self._instances else 'not_started' for name in self._factories}
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Build services now instead of on the first request
+
+        A service that fails to build is reported and left to be retried lazily.
+
+        Returns:
+            {service: 'ready' | 'error: ...'}
+        """
+        self._warmed = True
+        results = {}
+        for name in list(names or self._factories):
+            try:
+                self.get(name)
+                results[name] = 'ready'
+            except Exception as e:
+                logger.warning(f"Warm-up of {name} failed, it will be built on first use: {e}")
+                results[name] = f'error: {e}'
+        return results
+
+    def warm_up_async(self, names: Optional[Iterable[str]] = None) -> Optional[threading.Thread]:
+        """warm_up() in a daemon thread, so process start-up is not delayed"""
+        if not WARMUP_ENABLED:
+            return None
+        thread = threading.Thread(target=self.warm_up, args=(names,), name='service-warmup')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _after_fork(self) -> None:
+        # Runs in the child only; nothing inherited from the parent is reused
+        self._lock = threading.RLock()
+        self._instances = {}
+        self._pid = os.getpid()
+        if self._warmed:
+            self.warm_up_async()
@@ -0,0 +1,222 @@
+"""
+Smart Folder Aggregates
+
+Folder sidebars (by team, project, type, date and person) read per-org
+document counts from folder_counts instead of grouping every document on
+each request, and documents are listed one folder and one page at a time.
+
+folder_counts is recomputed for an organization when it is stale: triggers on
+documents and document_classifications bump folder_count_state.version on
+every change (including writes made by the Celery classification tasks), and
+a read that finds version > refreshed_version starts a refresh. Reads serve
+the current counts while a background thread recounts, and an organization
+is recounted at most once per FOLDER_REFRESH_INTERVAL seconds, so a burst of
+classifications doesn't turn every sidebar request into a full recount. Only
+an organization that was never counted is refreshed inline.
+
+Usage:
+    folders = get_folder_summaries(conn, org_id, 'team', get_db_connection)
+    page = list_folder_documents(cursor, org_id, 'team', 'Engineering', limit=50, page_cursor=None)
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from pagination import decode_page_cursor, encode_page_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+REFRESH_LOCK_CLASS = 4402  # pg_advisory_xact_lock(REFRESH_LOCK_CLASS, org_id)
+FOLDER_REFRESH_INTERVAL = int(os.environ.get('FOLDER_REFRESH_INTERVAL', 10))
+
+_refreshing = set()  # org ids with a background refresh running in this process
+_refreshing_lock = threading.Lock()
+
+_CLASSIFIED = 'INNER JOIN document_classifications dc ON dc.document_id = d.id'
+
+# view -> request parameter / legacy response key, folder expression and joins
+FOLDER_VIEWS = {
+    'team': {
+        'param': 'team',
+        'expression': "COALESCE(dc.team, 'Uncategorized')",
+        'join': 'LEFT JOIN document_classifications dc ON dc.document_id = d.id',
+        'where': '',
+        'match': "COALESCE(dc.team, 'Uncategorized') = %s",
+    },
+    'project': {
+        'param': 'project',
+        'expression': "COALESCE(dc.project, 'Uncategorized')",
+        'join': 'LEFT JOIN document_classifications dc ON dc.document_id = d.id',
+        'where': '',
+        'match': "COALESCE(dc.project, 'Uncategorized') = %s",
+    },
+    'type': {
+        'param': 'doc_type',
+        'expression': 'dc.doc_type',
+        'join': _CLASSIFIED,
+        'where': 'AND dc.doc_type IS NOT NULL',
+        'match': 'dc.doc_type = %s',
+    },
+    'date': {
+        'param': 'time_period',
+        'expression': 'dc.time_period',
+        'join': _CLASSIFIED,
+        'where': 'AND dc.time_period IS NOT NULL',
+        'match': 'dc.time_period = %s',
+        'descending': True,
+    },
+    'person': {
+        'param': 'person',
+        'expression': 'person',
+        'join': _CLASSIFIED + ' CROSS JOIN LATERAL jsonb_array_elements_text(dc.mentioned_people) AS person',
+        'where': '',
+        'match': 'dc.mentioned_people ? %s',
+        'list_join': _CLASSIFIED,
+    },
+}
+
+
+def refresh_folder_counts(cursor, org_id: int) -> None:
+    """Recompute every folder count of an organization; the caller commits"""
+    # Serializes concurrent refreshes without blocking the triggers that bump the version
+    cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', (REFRESH_LOCK_CLASS, org_id))
+    cursor.execute('''
+        INSERT INTO folder_count_state (organization_id) VALUES (%s)
+        ON CONFLICT (organization_id) DO NOTHING
+    ''', (org_id,))
+    # Read before counting: a change committed meanwhile leaves the counts stale, never wrong
+    cursor.execute('SELECT version FROM folder_count_state WHERE organization_id = %s', (org_id,))
+    version = cursor.fetchone()['version']
+
+    cursor.execute('DELETE FROM folder_counts WHERE organization_id = %s', (org_id,))
+    for view, spec in FOLDER_VIEWS.items():
+        cursor.execute(f'''
+            INSERT INTO folder_counts (organization_id, view_type, folder, document_count)
+            SELECT %s, %s, {spec['expression']}, COUNT(DISTINCT d.id)
+            FROM documents d
+            {spec['join']}
+            WHERE d.organization_id = %s
+              AND d.is_deleted = FALSE
+              {spec['where']}
+            GROUP BY {spec['expression']}
+        ''', (org_id, view, org_id))
+
+    cursor.execute('''
+        UPDATE folder_count_state SET refreshed_version = %s, refreshed_at = CURRENT_TIMESTAMP
+        WHERE organization_id = %s
+    ''', (version, org_id))
+
+
+def refresh_folder_counts_async(get_db_connection_func: Callable, org_id: int) -> None:
+    """Refresh an organization's counts in a background thread, unless this process already is"""
+    with _refreshing_lock:
+        if org_id in _refreshing:
+            return
+        _refreshing.add(org_id)
+
+    def run():
+        conn = get_db_connection_func()
+        try:
+            refresh_folder_counts(conn.cursor(), org_id)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"Folder count refresh failed for org {org_id}: {e}")
+        finally:
+            conn.close()
+            with _refreshing_lock:
+                _refreshing.discard(org_id)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_folder_summaries(conn, org_id: int, view: str,
+                         get_db_connection_func: Optional[Callable] = None) -> List[Dict]:
+    """
+    [{'name', 'document_count'}, ...] for one view
+
+    Stale counts are refreshed at most every FOLDER_REFRESH_INTERVAL seconds,
+    in the background when get_db_connection_func is given (inline otherwise
+    and for an organization that has never been counted).
+    """
+    spec = FOLDER_VIEWS[view]
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT version, refreshed_version,
+               COALESCE(refreshed_at <= CURRENT_TIMESTAMP - make_interval(secs => %s), TRUE) AS refresh_due
+        FROM folder_count_state WHERE organization_id = %s
+    ''', (FOLDER_REFRESH_INTERVAL, org_id))
+    state = cursor.fetchone()
+    if state is None or state['refreshed_version'] is None:
+        refresh_folder_counts(cursor, org_id)
+        conn.commit()
+    elif state['version'] > state['refreshed_version'] and state['refresh_due']:
+        if get_db_connection_func is not None:
+            refresh_folder_counts_async(get_db_connection_func, org_id)
+        else:
+            refresh_folder_counts(cursor, org_id)
+            conn.commit()
+
+    cursor.execute(f'''
+        SELECT folder AS name, document_count
+        FROM folder_counts
+        WHERE organization_id = %s AND view_type = %s
+        ORDER BY folder {'DESC' if spec.get('descending') else 'ASC'}
+    ''', (org_id, view))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def decode_document_cursor(page_cursor: str):
+    """(upload_date, id) of the last document on the previous page; ValueError when malformed"""
+    values = decode_page_cursor(page_cursor)
+    try:
+        upload_date, doc_id = values
+        return datetime.fromisoformat(upload_date), int(doc_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid page cursor: {page_cursor!r}")
+
+
+def list_folder_documents(cursor, org_id: int, view: str, folder: str, limit: int = DEFAULT_PAGE_SIZE,
+                          page_cursor: Optional[str] = None) -> Dict:
+    """
+    One page of a folder's documents, newest first (keyset on upload_date, id)
+
+    Returns:
+        {'documents': [...], 'next_cursor': str or None}
+    """
+    spec = FOLDER_VIEWS[view]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = f'''
+        SELECT d.id, d.filename, d.file_type, d.file_size, d.upload_date, d.processing_status,
+               COALESCE(dc.doc_type, d.file_type) AS doc_type, dc.team, dc.project,
+               dc.confidentiality_level, dc.tags, dc.summary
+        FROM documents d
+        {spec.get('list_join', spec['join'])}
+        WHERE d.organization_id = %s
+          AND d.is_deleted = FALSE
+          AND {spec['match']}
+    '''
+    params = [org_id, folder]
+
+    if page_cursor:
+        upload_date, doc_id = decode_document_cursor(page_cursor)
+        query += ' AND (d.upload_date, d.id) < (%s, %s)'
+        params.extend([upload_date, doc_id])
+
+    query += ' ORDER BY d.upload_date DESC, d.id DESC LIMIT %s'
+    params.append(limit + 1)
+
+    cursor.execute(query, params)
+    documents = [dict(row) for row in cursor.fetchall()]
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_page_cursor(documents[-1]['upload_date'], documents[-1]['id'])
+    return {'documents': documents, 'next_cursor': next_cursor}
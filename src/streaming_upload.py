@@ -0,0 +1,190 @@
+"""
+Streaming Document Uploads
+
+Parses a multipart/form-data request body incrementally and pipes each file
+through size counting, SHA-256 hashing and type sniffing straight into an
+object storage writer. Nothing is spooled to disk and no file is held in
+memory beyond the sniffing window and one storage part.
+
+Usage:
+    files, failed = stream_multipart_files(request.stream, boundary, open_writer)
+    # files: [{'filename', 'file_type', 'file_size', 'content_hash', 'storage_key', 'storage_url'}, ...]
+"""
+
+import codecs
+import hashlib
+import logging
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FILE_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain',
+    'md': 'text/markdown',
+    'csv': 'text/csv',
+}
+MAX_FILE_SIZE = 50 * 1024 * 1024
+MAX_FILES = 10
+SNIFF_BYTES = 8192
+READ_SIZE = 64 * 1024
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """A single file failed validation; the rest of the upload continues"""
+
+
+def sniff_file_type(filename: str, head: bytes) -> str:
+    """
+    Validate the extension against the first bytes of the file
+
+    Returns:
+        file_type ('pdf', 'docx', 'txt', 'md' or 'csv')
+
+    Raises:
+        UploadRejected: unsupported extension or content that doesn't match it
+    """
+    file_type = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if file_type not in ALLOWED_FILE_TYPES:
+        raise UploadRejected(f"Unsupported file type. Allowed: {', '.join(ALLOWED_FILE_TYPES)}")
+
+    if not head:
+        raise UploadRejected('File is empty')
+
+    if file_type == 'pdf':
+        matches = head.startswith(b'%PDF-')
+    elif file_type == 'docx':
+        matches = head.startswith(b'PK\x03\x04')
+    else:
+        # Text formats: UTF-8 without NUL bytes (the window may end mid-character)
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+            matches = b'\x00' not in head
+        except UnicodeDecodeError:
+            matches = False
+
+    if not matches:
+        raise UploadRejected(f"File content does not look like a .{file_type} file")
+    return file_type
+
+
+class FileUploadPipe:
+    """Size + hash + sniff + storage write for one file part"""
+
+    def __init__(self, filename: str, open_writer: Callable, max_size: int = MAX_FILE_SIZE):
+        self.filename = filename
+        self.open_writer = open_writer
+        self.max_size = max_size
+
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.file_type = None
+        self._head = bytearray()
+        self._writer = None
+
+    def feed(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadRejected(f"File exceeds maximum size of {self.max_size // (1024 * 1024)}MB")
+        self.digest.update(data)
+
+        if self._writer is not None:
+            self._writer.write(data)
+            return
+
+        self._head += data
+        if len(self._head) >= SNIFF_BYTES:
+            self._start_writer()
+
+    def finish(self) -> Dict:
+        if self._writer is None:
+            self._start_writer()
+        storage_url = self._writer.close()
+        return {
+            'filename': self.filename,
+            'file_type': self.file_type,
+            'file_size': self.size,
+            'content_hash': self.digest.hexdigest(),
+            'storage_key': self._writer.key,
+            'storage_url': storage_url,
+        }
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.abort()
+
+    def _start_writer(self) -> None:
+        self.file_type = sniff_file_type(self.filename, bytes(self._head[:SNIFF_BYTES]))
+        self._writer = self.open_writer(self.filename, ALLOWED_FILE_TYPES[self.file_type])
+        self._writer.write(bytes(self._head))
+        self._head = bytearray()
+
+
+def stream_multipart_files(stream: BinaryIO, boundary: str, open_writer: Callable,
+                           max_files: int = MAX_FILES) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Stream every file part of a multipart body into storage
+
+    Args:
+        stream: Raw request body (request.stream)
+        boundary: multipart boundary from the Content-Type header
+        open_writer: open_writer(filename, content_type) -> writer with write/close/abort/key
+
+    Returns:
+        (uploaded files, failed files as {'filename', 'error'})
+    """
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=MAX_FIELD_SIZE)
+    uploaded, failed = [], []
+    file_count = 0
+    pipe: Optional[FileUploadPipe] = None
+    skipping = False  # discard the rest of a rejected file or a form field
+
+    def reject(filename: str, error: str) -> None:
+        failed.append({'filename': filename, 'error': error})
+
+    while True:
+        data = stream.read(READ_SIZE)
+        decoder.receive_data(data or None)
+
+        event = decoder.next_event()
+        while not isinstance(event, (Epilogue, NeedData)):
+            if isinstance(event, File):
+                pipe, skipping = None, True
+                if event.filename:
+                    file_count += 1
+                    if file_count > max_files:
+                        reject(event.filename, f'Maximum {max_files} files allowed per upload')
+                    else:
+                        pipe, skipping = FileUploadPipe(event.filename, open_writer), False
+            elif isinstance(event, Field):
+                pipe, skipping = None, True
+            elif isinstance(event, Data) and not skipping:
+                try:
+                    pipe.feed(event.data)
+                    if not event.more_data:
+                        uploaded.append(pipe.finish())
+                        pipe = None
+                except UploadRejected as e:
+                    pipe.abort()
+                    reject(pipe.filename, str(e))
+                    pipe, skipping = None, True
+                except Exception as e:
+                    logger.error(f"Error streaming {pipe.filename} to storage: {e}")
+                    pipe.abort()
+                    reject(pipe.filename, str(e))
+                    pipe, skipping = None, True
+            event = decoder.next_event()
+
+        if isinstance(event, Epilogue) or not data:
+            break
+
+    if pipe is not None:
+        # Body ended in the middle of a file
+        pipe.abort()
+        reject(pipe.filename, 'Upload was interrupted')
+
+    return uploaded, failed
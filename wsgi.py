@@ -15,11 +15,16 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 # Import Flask application from package
-from app import app, init_database
+from app import app, init_database, warm_up_services
 
 # Initialize the database when the app starts
 init_database()
 
+# Build vector store, embedding and chat services before the first request
+# (in the background; forked workers rebuild their own) and resume employee
+# embedding refreshes still queued from before the restart
+warm_up_services()
+
 # Create necessary directories
 os.makedirs('data', exist_ok=True)
 os.makedirs('logs', exist_ok=True)